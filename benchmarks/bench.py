@@ -0,0 +1,208 @@
+"""基准测试套件
+
+用generate.py生成的数据分别计时规则解析、classify_keywords、各process_stage*/save_stage*步骤和Excel读写，
+以及完整的process_workflow和process_workflow_single_pass。每一步重复多次取中位数，结果以JSON输出到stdout。
+指定--baseline时与之前保存的结果比较，有步骤比基准慢超过阈值时退出码为1。
+
+用法:
+    python benchmarks/bench.py --keywords 100000 --rules 20 --depth 4 --result-json bench.json
+    python benchmarks/bench.py --keywords 100000 --rules 20 --depth 4 --baseline bench.json --threshold 0.2
+"""
+import argparse
+import json
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+SRC_DIR = Path(__file__).resolve().parent.parent / 'src'
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+from generate import write_benchmark_files  # noqa: E402
+
+# 比基准慢但差值小于该秒数的步骤不算回退，避免毫秒级步骤的计时抖动
+MIN_REGRESSION_SECONDS = 0.05
+
+
+class Timer:
+    """按步骤名累计每一轮的耗时"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+
+    @contextmanager
+    def step(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples[name].append(time.perf_counter() - start)
+
+    def summary(self) -> Dict[str, dict]:
+        return {
+            name: {'median_seconds': round(statistics.median(samples), 4),
+                   'samples': [round(sample, 4) for sample in samples]}
+            for name, samples in self.samples.items()
+        }
+
+
+def _run_steps(timer: Timer, rules_file: Path, keywords_file: Path, output_dir: Path, workers: int):
+    """逐步执行一遍分阶段工作流，各步骤单独计时"""
+    import pandas as pd
+    from kw_cf import models
+    from kw_cf.excel_handler import ExcelHandler
+    from kw_cf.keyword_classifier import KeywordClassifier
+    from kw_cf.workflow_processor import WorkFlowProcessor
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    # Excel读写，每次新建ExcelHandler以免命中工作簿缓存
+    with timer.step('excel_read_workflow_rules'):
+        workflow_rules = ExcelHandler().read_workflow_rules(rules_file)
+    with timer.step('excel_read_keyword_file'):
+        keywords = ExcelHandler().read_keyword_file(keywords_file)
+    with timer.step('excel_iter_keyword_batches'):
+        for _ in ExcelHandler().iter_keyword_batches(keywords_file):
+            pass
+    keywords_df = pd.DataFrame({'关键词': keywords.data})
+    workbook_file = output_dir / 'excel_io.xlsx'
+    with timer.step('excel_write_workbook'):
+        ExcelHandler().write_workbook({'Sheet1': keywords_df}, workbook_file)
+    with timer.step('excel_read_workbook'):
+        ExcelHandler().read_workbook(workbook_file)
+
+    # 规则解析和分类：全部层级的规则一起解析，用第一级规则分类
+    with timer.step('rule_parsing'):
+        classifier = KeywordClassifier()
+        classifier.set_rules(models.SourceRules(data=[rule.rule for rule in workflow_rules.rules]))
+    classifier.set_rules(models.SourceRules(data=[rule.rule for rule in workflow_rules.get_rules_by_level(1).rules]))
+    with timer.step('classify_keywords'):
+        classifier.classify_keywords(keywords)
+
+    # 分阶段处理，与process_output_files_chain的步骤相同
+    processor = WorkFlowProcessor(max_workers=workers, output_dir=output_dir / '分阶段')
+    processor.workflow_rules = workflow_rules
+    max_level = workflow_rules.get_max_level()
+    with timer.step('process_stage1'):
+        stage1_result = processor.process_stage1(keywords, workflow_rules)
+    with timer.step('save_stage1_results'):
+        stage1_files = processor.save_stage1_results(stage1_result)
+    processor.process_result_file = stage1_files
+    if max_level >= 2:
+        with timer.step('process_stage2'):
+            stage2_results = processor.process_stage2(stage1_files, workflow_rules)
+        with timer.step('save_stage2_results'):
+            stage2_files = processor.save_stage2_results(stage1_files, stage2_results)
+    if max_level >= 3:
+        processor.process_result_classified_file = processor.excel_handler.read_stage_classified_sheet_name(stage1_files)
+        with timer.step('process_stage3'):
+            stage3_results = processor.process_stage3(stage2_files, workflow_rules)
+        with timer.step('save_stage3_results'):
+            processor.save_stage3_results(stage2_file=stage2_files, stage3_results=stage3_results)
+    for level in range(4, max_level + 1):
+        with timer.step(f'process_stage{level}'):
+            stage_result = processor.process_stage_high(level)
+        with timer.step(f'save_stage{level}_results'):
+            processor.save_stage_high_results(level, stage_result)
+
+    # 完整工作流
+    with timer.step('process_workflow'):
+        WorkFlowProcessor(max_workers=workers, output_dir=output_dir / '完整').process_workflow(rules_file, keywords_file)
+    with timer.step('process_workflow_single_pass'):
+        WorkFlowProcessor(max_workers=workers, output_dir=output_dir / '单次遍历').process_workflow_single_pass(
+            rules_file, keywords_file
+        )
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> dict:
+    """与基准逐步骤比较，ratio为当前耗时/基准耗时"""
+    steps = {}
+    regressions = []
+    for name, timing in results['timings'].items():
+        base_timing = baseline.get('timings', {}).get(name)
+        if base_timing is None:
+            continue
+        current, base = timing['median_seconds'], base_timing['median_seconds']
+        ratio = current / base if base else None
+        regressed = current - base > MIN_REGRESSION_SECONDS and current > base * (1 + threshold)
+        steps[name] = {'baseline_seconds': base, 'current_seconds': current,
+                       'ratio': round(ratio, 3) if ratio is not None else None, 'regressed': regressed}
+        if regressed:
+            regressions.append(name)
+    params_match = baseline.get('params') == results['params']
+    return {'threshold': threshold, 'params_match': params_match, 'regressions': regressions, 'steps': steps}
+
+
+def run(params: dict, repeat: int = 3, workers: int = 1, keep_dir: Path|None = None) -> dict:
+    from kw_cf.logger_config import configure_console_handler
+    configure_console_handler(level='WARNING', stream='stderr')
+
+    work_dir = keep_dir or Path(tempfile.mkdtemp(prefix='kw_cf_bench_'))
+    try:
+        started = time.perf_counter()
+        rules_file, keywords_file = write_benchmark_files(work_dir / '数据', **params)
+        generate_seconds = time.perf_counter() - started
+
+        timer = Timer()
+        for index in range(repeat):
+            _run_steps(timer, rules_file, keywords_file, work_dir / f'第{index + 1}轮', workers)
+    finally:
+        if keep_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': repeat,
+            'workers': workers,
+            'generate_seconds': round(generate_seconds, 4),
+        },
+        'params': params,
+        'timings': timer.summary(),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='关键词分类器基准测试')
+    parser.add_argument('--keywords', type=int, default=100000, help='关键词数')
+    parser.add_argument('--rules', type=int, default=20, help='第二级及以上每级的规则数')
+    parser.add_argument('--or-length', type=int, default=4, help="每条规则中'|'连接的词数")
+    parser.add_argument('--depth', type=int, default=4, help='工作流层级')
+    parser.add_argument('--outputs', type=int, default=4, help='结果文件数')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--keyword-format', default='xlsx', help='待分类文件格式')
+    parser.add_argument('--repeat', type=int, default=3, help='重复轮数，取中位数')
+    parser.add_argument('--workers', type=int, default=1, help='阶段2及以后的进程数')
+    parser.add_argument('--keep-dir', type=Path, default=None, help='保留生成的数据和结果文件的目录')
+    parser.add_argument('--result-json', type=Path, default=None, help='同时将JSON结果写入该文件，可作为之后的基准')
+    parser.add_argument('--baseline', type=Path, default=None, help='之前保存的JSON结果')
+    parser.add_argument('--threshold', type=float, default=0.2, help='比基准慢超过该比例视为回退，默认0.2')
+    args = parser.parse_args(argv)
+
+    params = {'keywords': args.keywords, 'rule_count': args.rules, 'or_length': args.or_length,
+              'depth': args.depth, 'outputs': args.outputs, 'seed': args.seed, 'keyword_format': args.keyword_format}
+    results = run(params, args.repeat, args.workers, args.keep_dir)
+    if args.baseline is not None:
+        baseline = json.loads(args.baseline.read_text(encoding='utf-8'))
+        results['comparison'] = compare(results, baseline, args.threshold)
+
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.result_json is not None:
+        args.result_json.write_text(text, encoding='utf-8')
+    print(text)
+    if args.baseline is not None and results['comparison']['regressions']:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
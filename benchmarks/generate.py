@@ -0,0 +1,151 @@
+"""基准测试数据生成器
+
+生成中文关键词语料和对应的工作流规则文件，关键词数、每级规则数、或列表长度和工作流层级均可配置。
+关键词由城市、课程、机构、意图、修饰词等词表组合而成，每一级规则使用不同的词表，
+因此各级分类都能逐层细分，近似真实的投放关键词分类。
+
+用法:
+    python benchmarks/generate.py 输出目录 [--keywords 100000] [--rules 20] [--or-length 4] [--depth 4]
+"""
+import argparse
+import random
+from pathlib import Path
+from typing import List, Tuple
+
+import pandas as pd
+
+RULES_FILE_NAME = '工作流规则_基准.xlsx'
+KEYWORDS_FILE_STEM = '待分类_基准'
+
+CITIES = ['北京', '上海', '广州', '深圳', '杭州', '成都', '重庆', '武汉', '西安', '南京', '天津', '苏州',
+          '长沙', '郑州', '青岛', '沈阳', '宁波', '东莞', '无锡', '厦门', '福州', '济南', '合肥', '昆明',
+          '大连', '哈尔滨', '佛山', '石家庄', '南宁', '长春', '南昌', '贵阳', '太原', '温州', '珠海', '烟台']
+COURSES = ['Python', 'Java', '前端', '大数据', '人工智能', '会计', '税务', '初级会计', '中级会计', '注册会计师',
+           '平面设计', 'UI设计', '室内设计', '视频剪辑', '摄影', '电商', '运营', '新媒体', '直播带货', '短视频',
+           '英语', '日语', '韩语', '雅思', '托福', '考研', '公务员', '教师资格证', '建造师', '消防工程师',
+           '人力资源', '心理咨询', '健康管理', '营养师', '化妆', '美甲', '烘焙', '西点', '厨师', '汽修']
+INSTITUTIONS = ['培训', '培训班', '培训机构', '课程', '学校', '网课', '辅导班', '速成班', '学习班', '训练营']
+INTENTS = ['价格', '多少钱', '收费', '费用', '学费', '哪家好', '排名', '口碑', '靠谱吗', '怎么样',
+           '报名', '报名入口', '地址', '电话', '在哪里', '免费', '试听', '零基础', '周末班', '晚班']
+MODIFIERS = ['2025', '成人', '大学生', '在职', '宝妈', '小白', '线上', '线下', '一对一', '小班']
+# 每一级规则依次使用的词表，层级超过词表数量时循环使用
+LEVEL_VOCABULARIES = [CITIES, COURSES, INTENTS, INSTITUTIONS, MODIFIERS]
+
+
+def generate_keywords(count: int, seed: int = 0) -> List[str]:
+    """生成count个不重复的关键词"""
+    rng = random.Random(seed)
+    keywords = set()
+    while len(keywords) < count:
+        parts = [
+            rng.choice(MODIFIERS) if rng.random() < 0.3 else '',
+            rng.choice(CITIES) if rng.random() < 0.8 else '',
+            rng.choice(COURSES),
+            rng.choice(INSTITUTIONS) if rng.random() < 0.9 else '',
+            rng.choice(INTENTS) if rng.random() < 0.85 else '',
+        ]
+        keyword = ''.join(parts)
+        if keyword in keywords:
+            # 组合用尽时追加编号，保证数量
+            keyword = f'{keyword}{len(keywords)}'
+        keywords.add(keyword)
+    keywords = sorted(keywords)
+    rng.shuffle(keywords)
+    return keywords
+
+
+def _or_rules(rng: random.Random, vocabulary: List[str], rule_count: int, or_length: int) -> List[str]:
+    """生成rule_count条'A|B|C'形式的规则，打乱后的词表依次轮流分配，词表不够时循环使用"""
+    words = list(vocabulary)
+    rng.shuffle(words)
+    rules = []
+    for index in range(rule_count):
+        terms = [words[(index * or_length + offset) % len(words)] for offset in range(or_length)]
+        rules.append('|'.join(dict.fromkeys(terms)))
+    return rules
+
+
+def generate_rule_sheets(rule_count: int = 20, or_length: int = 4, depth: int = 4, outputs: int = 4,
+                         seed: int = 0) -> List[Tuple[str, pd.DataFrame]]:
+    """生成工作流规则文件的各个sheet
+
+    Args:
+        rule_count: 第二级及以上每级的规则数
+        or_length: 每条规则中'|'连接的词数
+        depth: 工作流层级，即sheet数
+        outputs: 第一级规则数，即结果文件数
+        seed: 随机种子
+    """
+    rng = random.Random(seed)
+    sheets = []
+    output_names = [f'结果{index + 1}' for index in range(outputs)]
+    parent_rules: List[str] = []
+    for level in range(1, depth + 1):
+        vocabulary = LEVEL_VOCABULARIES[(level - 1) % len(LEVEL_VOCABULARIES)]
+        count = outputs if level == 1 else rule_count
+        rules = _or_rules(rng, vocabulary, count, or_length)
+        if level == 1:
+            df = pd.DataFrame({'分类规则': rules, '结果文件名称': output_names})
+        elif level == 2:
+            df = pd.DataFrame({
+                '分类规则': rules,
+                '结果文件名称': [output_names[index % outputs] for index in range(count)],
+                '分类sheet名称': [f'分类{index + 1}' for index in range(count)],
+            })
+        else:
+            df = pd.DataFrame({
+                '分类规则': rules,
+                '结果文件名称': '全',
+                '分类sheet名称': '全',
+                '分类标签': [f'阶段{level}标签{index + 1}' for index in range(count)],
+            })
+            if level > 3:
+                df['上层分类规则'] = [parent_rules[index % len(parent_rules)] for index in range(count)]
+        parent_rules = rules
+        sheets.append((f'Sheet{level}', df))
+    return sheets
+
+
+def write_benchmark_files(output_dir: Path, keywords: int = 100000, rule_count: int = 20, or_length: int = 4,
+                          depth: int = 4, outputs: int = 4, seed: int = 0,
+                          keyword_format: str = 'xlsx') -> Tuple[Path, Path]:
+    """写入规则文件和待分类文件，返回(规则文件路径, 待分类文件路径)"""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    rules_file = output_dir / RULES_FILE_NAME
+    with pd.ExcelWriter(rules_file) as writer:
+        for sheet_name, df in generate_rule_sheets(rule_count, or_length, depth, outputs, seed):
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
+
+    keywords_file = output_dir / f'{KEYWORDS_FILE_STEM}.{keyword_format}'
+    df = pd.DataFrame({'关键词': generate_keywords(keywords, seed)})
+    if keyword_format == 'xlsx':
+        df.to_excel(keywords_file, index=False)
+    elif keyword_format == 'parquet':
+        df.to_parquet(keywords_file, index=False)
+    else:
+        df.to_csv(keywords_file, index=False, sep='\t' if keyword_format.startswith('tsv') else ',')
+    return rules_file, keywords_file
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='生成基准测试用的关键词和工作流规则文件')
+    parser.add_argument('output_dir', type=Path, help='输出目录')
+    parser.add_argument('--keywords', type=int, default=100000, help='关键词数')
+    parser.add_argument('--rules', type=int, default=20, help='第二级及以上每级的规则数')
+    parser.add_argument('--or-length', type=int, default=4, help="每条规则中'|'连接的词数")
+    parser.add_argument('--depth', type=int, default=4, help='工作流层级')
+    parser.add_argument('--outputs', type=int, default=4, help='结果文件数')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--keyword-format', default='xlsx', choices=['xlsx', 'csv', 'csv.gz', 'tsv', 'tsv.gz', 'parquet'],
+                        help='待分类文件格式')
+    args = parser.parse_args(argv)
+    rules_file, keywords_file = write_benchmark_files(
+        args.output_dir, args.keywords, args.rules, args.or_length, args.depth, args.outputs, args.seed,
+        args.keyword_format
+    )
+    print(rules_file)
+    print(keywords_file)
+
+
+if __name__ == '__main__':
+    main()
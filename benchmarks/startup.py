@@ -0,0 +1,103 @@
+"""启动耗时预算检查
+
+在全新的子进程中多次测量启动耗时，取中位数与预算比较，结果以JSON输出到stdout。
+有超出预算的项目时退出码为1。
+
+用法:
+    python benchmarks/startup.py [--repeat 5] [--exe dist/kw_cf.exe] [--result-json startup.json]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / 'src'
+
+# 名称: (子进程中执行的代码, 预算秒数)
+# 代码在导入完成后打印自身计时，排除解释器本身的启动时间
+IMPORT_BUDGETS = {
+    # import kw_cf 只加载包本身，不加载pandas/pydantic/lark/tkinter
+    'import_kw_cf': ("import kw_cf", 0.05),
+    # 命令行入口，用于 python -m kw_cf run --help 等
+    'import_cli': ("import kw_cf.cli", 0.05),
+    # 完整导入处理器，主要是pandas的耗时
+    'import_workflow_processor': ("import kw_cf.workflow_processor", 2.0),
+    # 第一个KeywordClassifier，Lark解析表从缓存加载
+    'first_keyword_classifier': ("from kw_cf.keyword_classifier import KeywordClassifier", 0.02, "KeywordClassifier()"),
+}
+# 解释器启动加 python -m kw_cf run --help 的总耗时
+CLI_HELP_BUDGET = 0.5
+# 打包后的exe运行 run --help 的总耗时（包括PyInstaller解包）
+EXE_HELP_BUDGET = 5.0
+
+_TIMER = """
+import time, sys
+{setup}
+_start = time.perf_counter()
+{measured}
+sys.stdout.write(repr(time.perf_counter() - _start))
+"""
+
+
+def _time_code(setup: str, measured: str) -> float:
+    output = subprocess.run(
+        [sys.executable, '-c', _TIMER.format(setup=setup, measured=measured)],
+        cwd=SRC_DIR, capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def _time_command(command: list) -> float:
+    start = time.perf_counter()
+    subprocess.run(command, cwd=SRC_DIR, capture_output=True, check=True)
+    return time.perf_counter() - start
+
+
+def _result(samples: list, budget: float) -> dict:
+    median = statistics.median(samples)
+    return {'median_seconds': round(median, 4), 'budget_seconds': budget,
+            'samples': [round(sample, 4) for sample in samples], 'ok': median <= budget}
+
+
+def measure(repeat: int = 5, exe: Path = None) -> dict:
+    results = {}
+    for name, spec in IMPORT_BUDGETS.items():
+        if len(spec) == 2:
+            code, budget = spec
+            setup, measured = '', code
+        else:
+            setup, budget, measured = spec
+        results[name] = _result([_time_code(setup, measured) for _ in range(repeat)], budget)
+
+    # 先运行一次，保证Lark缓存和字节码已经生成
+    cli_command = [sys.executable, '-m', 'kw_cf', 'run', '--help']
+    _time_command(cli_command)
+    results['cli_help'] = _result([_time_command(cli_command) for _ in range(repeat)], CLI_HELP_BUDGET)
+
+    if exe is not None:
+        exe_command = [str(exe.resolve()), 'run', '--help']
+        _time_command(exe_command)
+        results['exe_help'] = _result([_time_command(exe_command) for _ in range(repeat)], EXE_HELP_BUDGET)
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='测量启动耗时并与预算比较')
+    parser.add_argument('--repeat', type=int, default=5, help='每项测量次数，取中位数')
+    parser.add_argument('--exe', type=Path, default=None, help='build_exe.py打包出的可执行文件')
+    parser.add_argument('--result-json', type=Path, default=None, help='同时将JSON结果写入该文件')
+    args = parser.parse_args(argv)
+
+    results = measure(args.repeat, args.exe)
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.result_json is not None:
+        args.result_json.write_text(text, encoding='utf-8')
+    print(text)
+    return 0 if all(result['ok'] for result in results.values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
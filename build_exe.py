@@ -1,7 +1,12 @@
-from src.kw_cf.main import main
+from src.kw_cf.cli import main
+import multiprocessing
+import sys
 
 
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    # 打包后的程序启动进程池子进程时需要
+    multiprocessing.freeze_support()
+    # 不带参数启动图形界面，tkinter和pandas都在界面模块中按需导入；run --help 可用于测量exe启动耗时
+    sys.exit(main(sys.argv[1:] or ['gui']))
@@ -1,8 +1,39 @@
-
 __version__ = "0.1.1"
 
-from .excel_handler import ExcelHandler
-from .keyword_classifier import KeywordClassifier
-from .workflow_processor import WorkFlowProcessor
-from .logger_config import add_ui_handler, remove_ui_handler, set_ui_handler_level
-from .models import UnclassifiedKeywords, SourceRules, WorkFlowRules
+import importlib
+
+# 公开对象按需导入，import kw_cf 时不加载pandas、pydantic、lark等重依赖
+_LAZY_ATTRS = {
+    'ExcelHandler': '.excel_handler',
+    'KeywordClassifier': '.keyword_classifier',
+    'WorkFlowProcessor': '.workflow_processor',
+    'WorkFlowTree': '.workflow_tree',
+    'AsyncClassifier': '.aio',
+    'CancellationToken': '.progress',
+    'WorkflowCancelled': '.progress',
+    'ProgressEvent': '.progress',
+    'add_ui_handler': '.logger_config',
+    'remove_ui_handler': '.logger_config',
+    'set_ui_handler_level': '.logger_config',
+    'UnclassifiedKeywords': '.models',
+    'SourceRules': '.models',
+    'WorkFlowRules': '.models',
+    # 图形界面入口函数，访问时才导入tkinter
+    'main': '.main',
+}
+
+# from kw_cf import * 不导入图形界面
+__all__ = [name for name in _LAZY_ATTRS if name != 'main']
+
+
+def __getattr__(name):
+    module_name = _LAZY_ATTRS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -1,7 +1,14 @@
-from .main import main
+import multiprocessing
+import sys
 
 
+def _main() -> int:
+    # 带参数时使用命令行入口（不导入tkinter），不带参数时保持原来的行为启动图形界面
+    from .cli import main as cli_main
+    return cli_main(sys.argv[1:] or ['gui'])
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    # 打包后的程序启动进程池子进程时需要
+    multiprocessing.freeze_support()
+    sys.exit(_main())
@@ -0,0 +1,171 @@
+"""asyncio分类接口
+
+分类是CPU密集的同步计算，直接在事件循环中调用会阻塞其他协程。AsyncClassifier把分类放到执行器中运行：
+
+    classifier = await AsyncClassifier.create(Path('工作流规则_1.xlsx'), max_concurrency=4)
+    rows = await classifier.classify_batch(keywords)
+    async for row in classifier.classify_stream(keyword_source):
+        ...
+
+规则只编译一次，所有并发请求共用；同时在执行器中运行的批次数不超过max_concurrency，
+超出的请求在信号量上等待，classify_stream在结果未取走时暂停读取输入，内存占用有上限。
+结果与输入一一对应、顺序相同，不去重，与batch_size无关；需要去重时由调用方在分类前处理。
+"""
+import asyncio
+import collections
+import contextlib
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, AsyncIterable, AsyncIterator, Deque, Dict, Iterable, List, Optional, Union
+
+from .progress import CancellationToken
+from .service import RuleSet, RuleSetStore
+
+# classify_batch、classify_stream拆分批次的默认关键词数
+DEFAULT_BATCH_SIZE = 1000
+
+# 进程执行器中每个子进程持有的规则集，由_init_worker编译一次
+_worker_rule_set: Optional[RuleSet] = None
+
+
+def _init_worker(rules_file: Path, case_sensitive: bool, separator: str):
+    global _worker_rule_set
+    _worker_rule_set = RuleSetStore(rules_file, case_sensitive=case_sensitive, separator=separator).current
+
+
+def _classify_in_worker(keywords: List[Any]) -> List[Dict[str, Any]]:
+    return _worker_rule_set.classify_each(keywords)
+
+
+class AsyncClassifier:
+    """在执行器中按已编译的工作流规则分类的asyncio接口
+
+    Args:
+        rules_file: 工作流规则文件
+        max_concurrency: 同时在执行器中运行的批次数上限
+        batch_size: 拆分批次的关键词数
+        use_processes: True时使用进程池，每个子进程在启动时编译一次规则，可利用多核；
+            False（默认）使用线程池，计算仍受GIL限制，但不会阻塞事件循环，且可以用reload()更新规则
+    """
+
+    def __init__(self, rules_file: Path, max_concurrency: int = 4, batch_size: int = DEFAULT_BATCH_SIZE,
+                 use_processes: bool = False, case_sensitive: bool = False, separator: str = '&'):
+        if max_concurrency < 1:
+            raise ValueError('max_concurrency必须大于0')
+        self.rules_file = Path(rules_file)
+        self.max_concurrency = max_concurrency
+        self.batch_size = batch_size
+        self.use_processes = use_processes
+        self.case_sensitive = case_sensitive
+        self.separator = separator
+        self.store: Optional[RuleSetStore] = None
+        self.executor: Executor
+        if use_processes:
+            self.executor = ProcessPoolExecutor(max_workers=max_concurrency, initializer=_init_worker,
+                                                initargs=(self.rules_file, case_sensitive, separator))
+        else:
+            self.store = RuleSetStore(self.rules_file, case_sensitive=case_sensitive, separator=separator)
+            self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='kw_cf-classify')
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @classmethod
+    async def create(cls, rules_file: Path, **kwargs) -> 'AsyncClassifier':
+        """在线程中读取和编译规则后返回，不阻塞事件循环"""
+        return await asyncio.to_thread(cls, rules_file, **kwargs)
+
+    async def _run_batch(self, keywords: List[Any]) -> List[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        async with self._semaphore:
+            if self.store is None:
+                return await loop.run_in_executor(self.executor, _classify_in_worker, keywords)
+            # 每个批次开始时取一次当前规则集，reload不影响已开始的批次
+            return await loop.run_in_executor(self.executor, self.store.current.classify_each, keywords)
+
+    async def classify_batch(self, keywords: List[Any]) -> List[Dict[str, Any]]:
+        """分类一批关键词，超过batch_size时拆分后并发分类，结果与输入一一对应
+
+        Returns:
+            每个关键词一个字典，键为 关键词（清除不可见字符和首尾空格后）、结果文件名称、分类sheet名称、阶段1...阶段N；
+            空白关键词的各阶段为None
+        """
+        keywords = list(keywords)
+        batches = [keywords[start:start + self.batch_size] for start in range(0, len(keywords), self.batch_size)]
+        results = await asyncio.gather(*(self._run_batch(batch) for batch in batches))
+        return [row for rows in results for row in rows]
+
+    async def classify_stream(self, keywords: Union[Iterable[Any], AsyncIterable[Any]],
+                              batch_size: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        """逐个返回分类结果，输入可以是普通或异步可迭代对象
+
+        按batch_size分批提交，最多max_concurrency个批次同时处理，每个输入一个结果，按输入顺序返回；
+        调用方未取走结果时不再读取输入。
+        """
+        batch_size = batch_size or self.batch_size
+        pending: Deque[asyncio.Task] = collections.deque()
+        try:
+            async for batch in _iter_batches(keywords, batch_size):
+                if len(pending) >= self.max_concurrency:
+                    for row in await pending.popleft():
+                        yield row
+                pending.append(asyncio.ensure_future(self._run_batch(batch)))
+            while pending:
+                for row in await pending.popleft():
+                    yield row
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def reload(self, force: bool = False) -> bool:
+        """在线程中重新加载规则文件（仅线程池模式），返回是否替换了规则"""
+        if self.store is None:
+            raise RuntimeError('进程池模式下规则在子进程启动时编译，需要重新创建AsyncClassifier')
+        return await asyncio.to_thread(self.store.reload, force)
+
+    async def close(self):
+        await asyncio.to_thread(self.executor.shutdown, True)
+
+    async def __aenter__(self) -> 'AsyncClassifier':
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+
+async def _iter_batches(keywords: Union[Iterable[Any], AsyncIterable[Any]], batch_size: int) -> AsyncIterator[List[Any]]:
+    batch = []
+    if isinstance(keywords, AsyncIterable):
+        async for keyword in keywords:
+            batch.append(keyword)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    else:
+        for keyword in keywords:
+            batch.append(keyword)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+async def process_workflow(rules_file: Path, classification_file: Path, single_pass: bool = False,
+                           **processor_kwargs) -> Dict[str, Any]:
+    """在线程中运行完整工作流并等待结果
+
+    等待的任务被取消时通过CancellationToken通知处理器在下一个检查点停止，处理器停止后再抛出CancelledError，
+    未写完的结果文件会被丢弃。processor_kwargs传给WorkFlowProcessor。
+    """
+    from .workflow_processor import WorkFlowProcessor
+
+    cancel_token = processor_kwargs.pop('cancel_token', None) or CancellationToken()
+    processor = WorkFlowProcessor(cancel_token=cancel_token, **processor_kwargs)
+    method = processor.process_workflow_single_pass if single_pass else processor.process_workflow
+    future = asyncio.get_running_loop().run_in_executor(None, method, rules_file, classification_file)
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        cancel_token.cancel()
+        with contextlib.suppress(Exception):
+            await future
+        raise
@@ -0,0 +1,246 @@
+"""命令行入口，不依赖tkinter，可在无图形界面的服务器或定时任务中运行
+
+用法:
+    python -m kw_cf run -r 工作流规则_1.xlsx -k 待分类_1.xlsx [待分类_2.csv ...] -o 工作流结果
+    python -m kw_cf serve -r 工作流规则_1.xlsx [--port 8765]
+    zcat keywords.jsonl.gz | python -m kw_cf classify -r 工作流规则_1.xlsx > classified.jsonl
+    python -m kw_cf store -k 待分类_1.csv [-o 待分类_1.kwstore]
+    python -m kw_cf gui
+
+run的结果以一行JSON输出到stdout，日志输出到stderr。classify从stdin逐行读取关键词，逐行输出JSON到stdout。
+退出码：0 全部成功，1 有待分类文件处理失败，2 参数错误或输入文件不存在。
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='kw_cf', description='基于工作流的关键词分类器')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='无界面运行完整工作流')
+    run_parser.add_argument('-r', '--rules', required=True, type=Path, help='工作流规则文件，工作流规则_*.xlsx')
+    run_parser.add_argument('-k', '--keywords', required=True, nargs='+', type=Path,
+                            help='待分类文件，可指定多个，待分类_*.xlsx/csv/tsv/parquet')
+    run_parser.add_argument('-o', '--output-dir', type=Path, default=Path('工作流结果'),
+                            help='结果目录，指定多个待分类文件时每个文件的结果放在以其文件名命名的子目录中')
+    run_parser.add_argument('--case-sensitive', action='store_true', help='规则匹配区分大小写')
+    run_parser.add_argument('--separator', default='&', help='分隔符，默认&')
+    run_parser.add_argument('--workers', type=int, default=None, help='进程数，默认CPU核数，1为顺序处理；多个待分类文件时为并行处理的文件数，否则为阶段2及以后或单次遍历分类的进程数')
+    run_parser.add_argument('--output-format', default='xlsx', help='结果格式：xlsx/csv/csv.gz/tsv/tsv.gz/parquet，默认xlsx')
+    run_parser.add_argument('--chunk-size', type=int, default=None, help='第一阶段分块读取的关键词数')
+    run_parser.add_argument('--single-pass', action='store_true', help='使用单次遍历处理')
+    run_parser.add_argument('--keyword-store', action='store_true',
+                            help='单次遍历处理，关键词先转存为内存映射的关键词库，按编号分类，适合千万级关键词；.kwstore输入总是如此处理')
+    run_parser.add_argument('--log-level', default='WARNING', choices=LOG_LEVELS, help='stderr日志级别，默认WARNING')
+    run_parser.add_argument('--result-json', type=Path, default=None, help='同时将JSON结果写入该文件')
+    run_parser.add_argument('--metrics', type=Path, default=None, help='将各阶段、分组、读取、分类、写入的耗时汇总写入该JSON文件')
+    run_parser.add_argument('--trace', type=Path, default=None, help='将耗时区间写入该Chrome trace文件，可在Perfetto中按时间轴查看')
+    run_parser.add_argument('--progress', action='store_true', help='将进度事件逐行以JSON输出到stderr')
+
+    serve_parser = subparsers.add_parser('serve', help='启动本地HTTP分类服务，规则常驻内存并在文件修改后自动重新加载')
+    serve_parser.add_argument('-r', '--rules', required=True, type=Path, help='工作流规则文件，工作流规则_*.xlsx')
+    serve_parser.add_argument('--host', default='127.0.0.1', help='监听地址，默认127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8765, help='监听端口，默认8765，0为自动分配')
+    serve_parser.add_argument('--case-sensitive', action='store_true', help='规则匹配区分大小写')
+    serve_parser.add_argument('--separator', default='&', help='分隔符，默认&')
+    serve_parser.add_argument('--reload-interval', type=float, default=1.0, help='检查规则文件修改的间隔秒数，0为不自动重新加载')
+    serve_parser.add_argument('--log-level', default='INFO', choices=LOG_LEVELS, help='stderr日志级别，默认INFO')
+
+    classify_parser = subparsers.add_parser('classify', help='从stdin逐行读取关键词（文本或JSON），逐行输出JSON分类结果到stdout')
+    classify_parser.add_argument('-r', '--rules', required=True, type=Path, help='工作流规则文件，工作流规则_*.xlsx')
+    classify_parser.add_argument('--keyword-field', default='关键词', help='输入为JSON对象时的关键词字段，默认"关键词"')
+    classify_parser.add_argument('--batch-size', type=int, default=1000, help='每批分类并写出的行数，默认1000')
+    classify_parser.add_argument('--case-sensitive', action='store_true', help='规则匹配区分大小写')
+    classify_parser.add_argument('--separator', default='&', help='分隔符，默认&')
+    classify_parser.add_argument('--log-level', default='WARNING', choices=LOG_LEVELS, help='stderr日志级别，默认WARNING')
+
+    store_parser = subparsers.add_parser('store', help='将待分类文件转存为内存映射的关键词库（.kwstore），可作为run的待分类文件重复使用')
+    store_parser.add_argument('-k', '--keywords', required=True, type=Path, help='待分类文件，待分类_*.xlsx/csv/tsv/parquet')
+    store_parser.add_argument('-o', '--output', type=Path, default=None, help='关键词库文件，默认为待分类文件旁的同名.kwstore文件')
+    store_parser.add_argument('--log-level', default='WARNING', choices=LOG_LEVELS, help='stderr日志级别，默认WARNING')
+
+    subparsers.add_parser('gui', help='启动图形界面')
+    return parser
+
+
+def _emit(payload: dict, result_json: Optional[Path] = None):
+    text = json.dumps(payload, ensure_ascii=False, default=str)
+    if result_json is not None:
+        result_json.parent.mkdir(parents=True, exist_ok=True)
+        result_json.write_text(text, encoding='utf-8')
+    print(text, flush=True)
+
+
+def _print_progress(event: dict):
+    print(json.dumps(event, ensure_ascii=False), file=sys.stderr, flush=True)
+
+
+def run(args: argparse.Namespace) -> int:
+    # 日志输出到stderr，保证stdout只有JSON结果
+    from .logger_config import configure_console_handler
+    configure_console_handler(level=args.log_level, stream='stderr')
+
+    missing_files = [str(path) for path in [args.rules, *args.keywords] if not path.exists()]
+    if missing_files:
+        _emit({'status': 'error', 'error': f"文件不存在: {', '.join(missing_files)}", 'files': []}, args.result_json)
+        return EXIT_USAGE
+
+    # 参数检查通过后再导入pandas等依赖
+    from .excel_handler import OUTPUT_FORMATS
+    from .keyword_classifier import KeywordClassifier
+    from .tracing import Tracer
+    from .workflow_processor import WorkFlowProcessor
+
+    if args.output_format not in OUTPUT_FORMATS:
+        _emit({'status': 'error', 'error': f"不支持的输出格式: {args.output_format}，可选: {', '.join(OUTPUT_FORMATS)}",
+               'files': []}, args.result_json)
+        return EXIT_USAGE
+    # 多个待分类文件共用一个Tracer，导出到同一时间轴
+    tracer = Tracer(enabled=args.metrics is not None or args.trace is not None)
+    processor_kwargs = {'max_workers': args.workers, 'output_format': args.output_format, 'tracer': tracer}
+    if args.chunk_size is not None:
+        processor_kwargs['chunk_size'] = args.chunk_size
+    if args.keyword_store:
+        processor_kwargs['keyword_store'] = True
+    if args.progress:
+        processor_kwargs['progress_callback'] = _print_progress
+
+    # 规则文件只读取、编译一次，多个待分类文件共用
+    try:
+        processor = WorkFlowProcessor(
+            keyword_classifier=KeywordClassifier(case_sensitive=args.case_sensitive, separator=args.separator),
+            output_dir=args.output_dir,
+            **processor_kwargs
+        )
+        files = processor.process_workflow_batch(args.rules, args.keywords, single_pass=args.single_pass)
+    except Exception as e:
+        _emit({'status': 'error', 'error': str(e), 'files': []}, args.result_json)
+        return EXIT_FAILED
+
+    if args.metrics is not None:
+        tracer.export_metrics(args.metrics)
+    if args.trace is not None:
+        tracer.export_chrome_trace(args.trace)
+
+    failed = [entry for entry in files if entry['status'] != 'ok']
+    _emit({'status': 'error' if failed else 'ok', 'files': files}, args.result_json)
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+def serve(args: argparse.Namespace) -> int:
+    from .logger_config import configure_console_handler
+    configure_console_handler(level=args.log_level, stream='stderr')
+    if not args.rules.exists():
+        _emit({'status': 'error', 'error': f'文件不存在: {args.rules}'})
+        return EXIT_USAGE
+
+    from .service import create_server
+    try:
+        server = create_server(args.rules, host=args.host, port=args.port, case_sensitive=args.case_sensitive,
+                               separator=args.separator, reload_interval=args.reload_interval)
+    except Exception as e:
+        _emit({'status': 'error', 'error': str(e)})
+        return EXIT_FAILED
+    # 启动后输出一行JSON，端口为0时调用方可从中取得实际地址
+    _emit({'status': 'serving', 'url': server.url, **server.store.current.info()})
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return EXIT_OK
+
+
+def classify(args: argparse.Namespace) -> int:
+    """流式过滤模式：stdout只输出结果行，错误和统计输出到stderr；有无法解析的行时退出码为1"""
+    from .logger_config import configure_console_handler
+    configure_console_handler(level=args.log_level, stream='stderr')
+    if not args.rules.exists():
+        print(json.dumps({'status': 'error', 'error': f'文件不存在: {args.rules}'}, ensure_ascii=False), file=sys.stderr)
+        return EXIT_USAGE
+
+    from .excel_handler import ExcelHandler
+    from .keyword_classifier import KeywordClassifier
+    from .stream import LineClassifier
+    from .workflow_tree import WorkFlowTree
+    try:
+        workflow_rules = ExcelHandler(cache_size=0).read_workflow_rules(args.rules)
+        tree = WorkFlowTree(workflow_rules, KeywordClassifier(case_sensitive=args.case_sensitive, separator=args.separator))
+    except Exception as e:
+        print(json.dumps({'status': 'error', 'error': str(e)}, ensure_ascii=False), file=sys.stderr)
+        return EXIT_FAILED
+
+    # 管道中统一按UTF-8读写，不受控制台编码影响
+    stdin = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8-sig', errors='replace', newline='')
+    stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', newline='\n', write_through=False)
+    line_classifier = LineClassifier(tree, keyword_field=args.keyword_field, batch_size=args.batch_size)
+    try:
+        for lines in line_classifier.classify_lines(stdin):
+            stdout.writelines(lines)
+            stdout.flush()
+    except BrokenPipeError:
+        # 下游提前关闭（如 | head），丢弃未写出的结果正常退出
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return EXIT_OK
+    print(json.dumps({'status': 'ok' if not line_classifier.lines_skipped else 'error',
+                      'lines_read': line_classifier.lines_read, 'lines_written': line_classifier.lines_written,
+                      'lines_skipped': line_classifier.lines_skipped}, ensure_ascii=False), file=sys.stderr)
+    return EXIT_FAILED if line_classifier.lines_skipped else EXIT_OK
+
+
+def store(args: argparse.Namespace) -> int:
+    from .logger_config import configure_console_handler
+    configure_console_handler(level=args.log_level, stream='stderr')
+    if not args.keywords.exists():
+        _emit({'status': 'error', 'error': f'文件不存在: {args.keywords}'})
+        return EXIT_USAGE
+
+    from .keyword_store import KeywordStore
+    started = time.perf_counter()
+    try:
+        with KeywordStore.from_keyword_file(args.keywords, args.output) as keyword_store:
+            payload = {'status': 'ok', 'file_path': str(keyword_store.file_path), 'keyword_count': len(keyword_store),
+                       'bytes': keyword_store.nbytes}
+    except Exception as e:
+        _emit({'status': 'error', 'error': str(e)})
+        return EXIT_FAILED
+    payload['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+    _emit(payload)
+    return EXIT_OK
+
+
+def gui() -> int:
+    from .main import main as gui_main
+    gui_main()
+    return EXIT_OK
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.command == 'gui':
+        return gui()
+    if args.command == 'serve':
+        return serve(args)
+    if args.command == 'classify':
+        return classify(args)
+    if args.command == 'store':
+        return store(args)
+    return run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,18 +1,574 @@
 import pandas as pd
 import datetime
+import gzip
+import importlib.util
+import json
+import os
+import uuid
+import zipfile
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
 from pathlib import Path
 from .models import WorkFlowRule,WorkFlowRules,UnclassifiedKeywords
-from typing import  Dict,Optional,Callable
+from typing import  Any,Dict,Iterable,Iterator,List,Optional,Callable,Tuple
 from .logger_config import logger
+from .tracing import Tracer
+
+# Excel单个sheet最大行数（含表头）
+EXCEL_MAX_ROWS = 1048576
+# Excel sheet名称最大长度
+EXCEL_MAX_SHEET_NAME_LENGTH = 31
+# 超过行数上限的sheet拆分为 名称、名称_2、名称_3… 多个分片sheet，分片清单保存在工作簿旁的json文件中
+SHARD_MANIFEST_SUFFIX = '.shards.json'
+# xlsx中workbook.xml的命名空间
+_SPREADSHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+# 可选的读取引擎，auto表示已安装python-calamine时使用calamine，否则使用openpyxl
+READER_ENGINES = ('auto', 'calamine', 'openpyxl')
+
+
+def resolve_reader_engine(engine: str = 'auto') -> str:
+    """将读取引擎名称解析为pandas可用的engine"""
+    if engine not in READER_ENGINES:
+        raise ValueError(f"不支持的读取引擎: {engine}，可选: {', '.join(READER_ENGINES)}")
+    calamine_available = importlib.util.find_spec('python_calamine') is not None
+    if engine == 'auto':
+        return 'calamine' if calamine_available else 'openpyxl'
+    if engine == 'calamine' and not calamine_available:
+        raise ValueError("读取引擎calamine需要安装python-calamine: pip install python-calamine")
+    return engine
+
+
+# 新建工作簿时的流式写入引擎，auto表示已安装xlsxwriter时使用xlsxwriter(constant_memory)，否则使用openpyxl(write_only)
+WRITER_ENGINES = ('auto', 'xlsxwriter', 'openpyxl')
+# 流式写入时每次转换的行数
+WRITE_CHUNK_SIZE = 50000
+# 分块读取待分类文件时每批的关键词数
+KEYWORD_BATCH_SIZE = 100000
+# 每个ExcelHandler缓存已解析工作簿占用内存的上限（字节），超出时按最近最少使用淘汰
+WORKBOOK_CACHE_BYTES = 256 * 1024 * 1024
+
+
+def resolve_writer_engine(engine: str = 'auto') -> str:
+    """将写入引擎名称解析为实际使用的引擎"""
+    if engine not in WRITER_ENGINES:
+        raise ValueError(f"不支持的写入引擎: {engine}，可选: {', '.join(WRITER_ENGINES)}")
+    xlsxwriter_available = importlib.util.find_spec('xlsxwriter') is not None
+    if engine == 'auto':
+        return 'xlsxwriter' if xlsxwriter_available else 'openpyxl'
+    if engine == 'xlsxwriter' and not xlsxwriter_available:
+        raise ValueError("写入引擎xlsxwriter需要安装xlsxwriter: pip install xlsxwriter")
+    return engine
+
+
+def _iter_sheet_chunks(data: pd.DataFrame|Iterable[pd.DataFrame], chunk_size: int) -> Iterator[pd.DataFrame]:
+    """将DataFrame切分为分块，分块迭代器原样返回"""
+    if not isinstance(data, pd.DataFrame):
+        yield from data
+        return
+    if data.empty:
+        yield data
+        return
+    for start in range(0, len(data), chunk_size):
+        yield data.iloc[start:start + chunk_size]
+
+
+# 支持的表格格式，按扩展名识别。Excel为多sheet的单个文件；
+# 其余格式的"工作簿"是以该扩展名结尾的目录（如 结果.csv/、结果.parquet/），每个sheet一个文件
+TABLE_FORMATS = {
+    '.xlsx': 'excel',
+    '.xlsm': 'excel',
+    '.xls': 'excel',
+    '.csv': 'csv',
+    '.csv.gz': 'csv',
+    '.tsv': 'tsv',
+    '.tsv.gz': 'tsv',
+    '.parquet': 'parquet',
+}
+# 工作流结果可选的输出格式
+OUTPUT_FORMATS = ('xlsx', 'csv', 'csv.gz', 'tsv', 'tsv.gz', 'parquet')
+_TEXT_SEPARATORS = {'csv': ',', 'tsv': '\t'}
+
+
+def table_suffix(file_path: Path) -> str:
+    """返回文件的表格扩展名（含.gz），不支持的扩展名抛出ValueError"""
+    name = Path(file_path).name.lower()
+    for suffix in sorted(TABLE_FORMATS, key=len, reverse=True):
+        if name.endswith(suffix):
+            return suffix
+    raise ValueError(f"不支持的文件格式: {Path(file_path).name}，支持: {', '.join(TABLE_FORMATS)}")
+
+
+def table_format(file_path: Path) -> str:
+    """按扩展名返回excel/csv/tsv/parquet"""
+    return TABLE_FORMATS[table_suffix(file_path)]
+
+
+def _iter_frame_rows(df: pd.DataFrame) -> Iterator[tuple]:
+    """逐行返回python原生值，空值转换为None"""
+    values = df.astype(object)
+    values = values.where(values.notna(), None)
+    return values.itertuples(index=False, name=None)
+
+
+# xlsxwriter的写入选项：逐行写入，字符串原样写入，不转换为链接或公式
+_XLSXWRITER_OPTIONS = {
+    'constant_memory': True,
+    'strings_to_urls': False,
+    'strings_to_formulas': False,
+    'nan_inf_to_errors': True,
+}
+
+
+def _temporary_path(file_path: Path) -> Path:
+    """同目录下的临时文件路径，以.开头，不会被识别为sheet文件"""
+    file_path = Path(file_path)
+    return file_path.with_name(f'.{file_path.name}.{uuid.uuid4().hex[:8]}.tmp')
+
+
+def _commit_temporary(temp_path: Path, file_path: Path):
+    """写入完成后原子替换正式文件，读取方只会看到旧文件或完整的新文件"""
+    if temp_path.exists():
+        os.replace(temp_path, file_path)
+
+
+def _discard_temporary(temp_path: Path):
+    if temp_path.exists():
+        temp_path.unlink()
+
+
+class _TableFileWriter:
+    """csv/tsv(.gz)/parquet单个文件的分块写入
+
+    先写入同目录的临时文件，close时替换为正式文件，abort时删除临时文件。
+    """
+
+    def __init__(self, file_path: Path):
+        self.file_path = Path(file_path)
+        self.file_format = table_format(self.file_path)
+        if self.file_format == 'excel':
+            raise ValueError(f"Excel文件请使用write_workbook或open_sheet_writer写入: {self.file_path.name}")
+        self._temp_path = _temporary_path(self.file_path)
+        self._handle = None
+        self._parquet_writer = None
+        self._header = True
+        if self.file_format in _TEXT_SEPARATORS:
+            opener = gzip.open if self.file_path.name.lower().endswith('.gz') else open
+            self._handle = opener(self._temp_path, 'wt', encoding='utf-8', newline='')
+
+    def write(self, chunk: pd.DataFrame):
+        if self.file_format == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            schema = self._parquet_writer.schema if self._parquet_writer is not None else None
+            table = pa.Table.from_pandas(chunk, preserve_index=False, schema=schema)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self._temp_path, table.schema)
+            self._parquet_writer.write_table(table)
+        else:
+            chunk.to_csv(self._handle, sep=_TEXT_SEPARATORS[self.file_format], index=False, header=self._header)
+            self._header = False
+
+    def _close_handles(self):
+        if self._handle is not None:
+            self._handle.close()
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+
+    def close(self):
+        self._close_handles()
+        _commit_temporary(self._temp_path, self.file_path)
+
+    def abort(self):
+        """放弃写入，正式文件保持原样"""
+        self._close_handles()
+        _discard_temporary(self._temp_path)
+
+
+def shard_manifest_path(file_path: Path) -> Path:
+    """工作簿分片清单的路径，如 结果.xlsx -> 结果.xlsx.shards.json"""
+    file_path = Path(file_path)
+    return file_path.with_name(file_path.name + SHARD_MANIFEST_SUFFIX)
+
+
+def _shard_sheet_name(sheet_name: str, index: int) -> str:
+    """第index个分片的sheet名称，第1个分片沿用原名称"""
+    if index == 1:
+        return sheet_name
+    suffix = f'_{index}'
+    return sheet_name[:EXCEL_MAX_SHEET_NAME_LENGTH - len(suffix)] + suffix
+
+
+class _ExcelWorkbookWriter:
+    """逐行写入新的Excel工作簿，超过行数上限时自动续写到下一个分片sheet
+
+    xlsxwriter使用constant_memory模式，openpyxl使用write_only模式，依次写入每个sheet。
+    先写入同目录的临时文件，关闭时替换为正式文件；如有sheet被拆分，写入分片清单，否则删除旧的分片清单。
+    abort时删除临时文件，正式文件保持原样。
+    """
+
+    def __init__(self, output_file: Path, writer_engine: str, max_rows: int = EXCEL_MAX_ROWS):
+        self.output_file = Path(output_file)
+        self.writer_engine = writer_engine
+        self.max_rows = max_rows
+        # Dict[逻辑sheet名称,{'shards':[分片sheet名称],'rows':[各分片数据行数]}]
+        self.shards: Dict[str,Dict[str,List]] = {}
+        self._sheet_name = None
+        self._header = None
+        self._worksheet = None
+        self._row_index = 0
+        self._temp_path = _temporary_path(self.output_file)
+        if writer_engine == 'xlsxwriter':
+            import xlsxwriter
+            self._workbook = xlsxwriter.Workbook(str(self._temp_path), _XLSXWRITER_OPTIONS)
+        else:
+            import openpyxl
+            self._workbook = openpyxl.Workbook(write_only=True)
+
+    def add_sheet(self, sheet_name: str):
+        """开始写入一个新的逻辑sheet"""
+        self._sheet_name = sheet_name
+        self._header = None
+        self.shards[sheet_name] = {'shards': [], 'rows': []}
+        self._new_worksheet()
+
+    def _new_worksheet(self):
+        shard = self.shards[self._sheet_name]
+        worksheet_name = _shard_sheet_name(self._sheet_name, len(shard['shards']) + 1)
+        if self.writer_engine == 'xlsxwriter':
+            self._worksheet = self._workbook.add_worksheet(worksheet_name)
+        else:
+            self._worksheet = self._workbook.create_sheet(worksheet_name)
+        shard['shards'].append(worksheet_name)
+        shard['rows'].append(0)
+        self._row_index = 0
+        if self._header is not None:
+            self._write_row(self._header)
+
+    def _write_row(self, row):
+        if self.writer_engine == 'xlsxwriter':
+            self._worksheet.write_row(self._row_index, 0, row)
+        else:
+            self._worksheet.append(row)
+        self._row_index += 1
+
+    def write(self, chunk: pd.DataFrame):
+        """向当前逻辑sheet追加一个分块，表头取自第一个分块"""
+        if self._header is None:
+            self._header = [str(col) for col in chunk.columns]
+            self._write_row(self._header)
+        rows = self.shards[self._sheet_name]['rows']
+        for row in _iter_frame_rows(chunk):
+            if self._row_index >= self.max_rows:
+                logger.info('sheet %s 超过%d行，续写到分片sheet', self._sheet_name, self.max_rows)
+                self._new_worksheet()
+            self._write_row(row)
+            rows[-1] += 1
+
+    def close(self):
+        if self.writer_engine == 'xlsxwriter':
+            self._workbook.close()
+        else:
+            self._workbook.save(self._temp_path)
+        manifest_path = shard_manifest_path(self.output_file)
+        sharded = {name: shard for name, shard in self.shards.items() if len(shard['shards']) > 1}
+        if sharded:
+            manifest_temp_path = _temporary_path(manifest_path)
+            with open(manifest_temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'workbook': self.output_file.name, 'max_rows': self.max_rows, 'sheets': sharded},
+                          f, ensure_ascii=False, indent=2)
+            _commit_temporary(manifest_temp_path, manifest_path)
+        elif manifest_path.exists():
+            manifest_path.unlink()
+        _commit_temporary(self._temp_path, self.output_file)
+
+    def abort(self):
+        """放弃写入；两种引擎在close前都不会写出工作簿，只需删除可能残留的临时文件"""
+        self._workbook = None
+        _discard_temporary(self._temp_path)
+
+
+class SheetWriter:
+    """单sheet新工作簿的增量写入器，表头取自第一次写入的分块
+
+    Excel使用xlsxwriter(constant_memory)或openpyxl(write_only)逐行写入；
+    其余格式写入目录工作簿中的单个sheet文件。内存占用只与每次写入的分块大小有关。
+    """
+
+    def __init__(self, excel_handler: 'ExcelHandler', output_file: Path, sheet_name: str = 'Sheet1'):
+        self.excel_handler = excel_handler
+        self.output_file = Path(output_file)
+        self.sheet_name = sheet_name
+        self.rows_written = 0
+        self._writer:_TableFileWriter|_ExcelWorkbookWriter
+        if table_format(self.output_file) != 'excel':
+            self.output_file.mkdir(parents=True, exist_ok=True)
+            self._writer = _TableFileWriter(self.output_file / f'{sheet_name}{table_suffix(self.output_file)}')
+        else:
+            self.output_file.parent.mkdir(parents=True, exist_ok=True)
+            self._writer = _ExcelWorkbookWriter(self.output_file, excel_handler.writer_engine, excel_handler.max_sheet_rows)
+            self._writer.add_sheet(sheet_name)
+
+    def write(self, chunk: pd.DataFrame):
+        """追加一个分块，列顺序需与第一个分块一致"""
+        with self.excel_handler.tracer.span('write_chunk', 'write', file=self.output_file.name, rows=len(chunk)):
+            self._writer.write(chunk)
+        self.rows_written += len(chunk)
+
+    def close(self):
+        with self.excel_handler.tracer.span('close_workbook', 'write', file=self.output_file.name,
+                                            total_rows=self.rows_written) as span_args:
+            self._writer.close()
+            span_args['bytes_written'] = self.excel_handler.workbook_size(self.output_file)
+        self.excel_handler.invalidate(self.output_file)
+
+    def abort(self):
+        """放弃写入，不生成结果文件（已存在的同名文件保持原样）"""
+        self._writer.abort()
+        self.excel_handler.invalidate(self.output_file)
+
+    def __enter__(self) -> 'SheetWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
 
 class ExcelHandler:
-    def __init__(self,error_callback:Optional[Callable]=None):
+    def __init__(self,error_callback:Optional[Callable]=None,cache_size:int=8,engine:str='auto',writer_engine:str='auto',
+                 tracer:Optional[Tracer]=None,cache_bytes:int=WORKBOOK_CACHE_BYTES):
+        """
+        Args:
+            error_callback: 错误回调
+            cache_size: 缓存已解析工作簿的数量，0为不缓存
+            cache_bytes: 缓存的DataFrame合计占用内存的上限（字节），单个超过上限的工作簿不缓存
+            engine: 读取引擎，auto/calamine/openpyxl，auto在安装了python-calamine时使用calamine
+            writer_engine: 写入引擎，auto/xlsxwriter/openpyxl，auto在安装了xlsxwriter时使用xlsxwriter
+            tracer: 记录读写耗时的Tracer，None为不记录；WorkFlowProcessor会设置为处理器的Tracer
+        """
         self.error_callback:Optional[Callable] = error_callback
+        self.tracer:Tracer = tracer if tracer is not None else Tracer(enabled=False)
+        self.engine:str = resolve_reader_engine(engine)
+        self.writer_engine:str = resolve_writer_engine(writer_engine)
+        # 单个sheet的最大行数（含表头），超过时拆分为多个分片sheet
+        self.max_sheet_rows:int = EXCEL_MAX_ROWS
+        self.cache_size = cache_size
+        self.cache_bytes = cache_bytes
+        # Dict[file_path,(文件签名,Dict[sheet_name,pd.DataFrame],占用字节数)]，文件签名见_file_signature
+        self._workbook_cache:OrderedDict[Path,Tuple[tuple,Dict[str,pd.DataFrame],int]] = OrderedDict()
+        self._cached_bytes = 0
+
+    def config(self) -> Dict[str, Any]:
+        """在子进程中重建同样设置的ExcelHandler所需的全部参数，见from_config；新增设置时在这里一并加入"""
+        return {
+            'cache_size': self.cache_size,
+            'cache_bytes': self.cache_bytes,
+            'engine': self.engine,
+            'writer_engine': self.writer_engine,
+            'max_sheet_rows': self.max_sheet_rows,
+        }
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], error_callback: Optional[Callable] = None) -> 'ExcelHandler':
+        """按config()的结果创建ExcelHandler，tracer由WorkFlowProcessor设置"""
+        excel_handler = cls(error_callback, cache_size=config['cache_size'], engine=config['engine'],
+                            writer_engine=config['writer_engine'], cache_bytes=config['cache_bytes'])
+        excel_handler.max_sheet_rows = config['max_sheet_rows']
+        return excel_handler
+
+    @staticmethod
+    def _file_signature(file_path: Path) -> tuple:
+        if file_path.is_dir():
+            # 目录格式的工作簿以其中每个sheet文件的修改时间和大小为准
+            return tuple((path.name, path.stat().st_mtime_ns, path.stat().st_size) for path in sorted(file_path.iterdir()))
+        stat = file_path.stat()
+        return (stat.st_mtime_ns, stat.st_size)
+
+    @staticmethod
+    def workbook_size(file_path: Path) -> int:
+        """工作簿占用的字节数，目录格式为其中全部文件之和"""
+        file_path = Path(file_path)
+        if file_path.is_dir():
+            return sum(path.stat().st_size for path in file_path.iterdir() if path.is_file())
+        return file_path.stat().st_size
+
+    def _sheet_files(self, workbook_dir: Path) -> Dict[str,Path]:
+        """目录格式工作簿中的sheet文件，Sheet1在前，其余按名称排序"""
+        suffix = table_suffix(workbook_dir)
+        sheet_files = {}
+        for path in sorted(workbook_dir.iterdir(), key=lambda path: (path.name != f'Sheet1{suffix}', path.name)):
+            # 以.开头的是未完成写入的临时文件
+            if path.is_file() and path.name.lower().endswith(suffix) and not path.name.startswith('.'):
+                sheet_files[path.name[:-len(suffix)]] = path
+        return sheet_files
+
+    def read_table(self, file_path: Path) -> pd.DataFrame:
+        """按扩展名读取单个表格文件，Excel读取第一个sheet
+        
+        csv/tsv全部按字符串读取，只有空单元格视为空值，避免关键词被转换为数字或NaN
+        """
+        file_path = Path(file_path)
+        file_format = table_format(file_path)
+        if file_format == 'excel':
+            return pd.read_excel(file_path, engine=self.engine)
+        if file_format == 'parquet':
+            return pd.read_parquet(file_path)
+        return pd.read_csv(file_path, sep=_TEXT_SEPARATORS[file_format], dtype=str, keep_default_na=False,
+                           na_values=[''], encoding='utf-8-sig', compression='infer')
+
+    def write_table(self, data: pd.DataFrame|Iterable[pd.DataFrame], file_path: Path,
+                    chunk_size: int = WRITE_CHUNK_SIZE) -> Path:
+        """按扩展名将一个sheet写入csv/tsv(.gz)或parquet文件，分块逐块写入"""
+        writer = _TableFileWriter(file_path)
+        try:
+            for chunk in _iter_sheet_chunks(data, chunk_size):
+                writer.write(chunk)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close()
+        return writer.file_path
+
+    def open_sheet_writer(self, output_file: Path, sheet_name: str = 'Sheet1') -> 'SheetWriter':
+        """打开单sheet新工作簿的增量写入器，多次write分块，close后文件完成"""
+        return SheetWriter(self, output_file, sheet_name)
+
+    def _get_cached_workbook(self, file_path: Path) -> Optional[Dict[str,pd.DataFrame]]:
+        """文件修改时间和大小均未变化时返回缓存的全部sheet"""
+        cached = self._workbook_cache.get(file_path)
+        if cached is None:
+            return None
+        signature, sheets, _ = cached
+        if signature != self._file_signature(file_path):
+            self._evict(file_path)
+            return None
+        self._workbook_cache.move_to_end(file_path)
+        return sheets
+
+    def _cache_workbook(self, file_path: Path, sheets: Dict[str,pd.DataFrame]):
+        """缓存解析结果，按数量和占用内存两个上限淘汰最早使用的工作簿"""
+        if self.cache_size <= 0:
+            return
+        nbytes = sum(int(df.memory_usage(index=True, deep=True).sum()) for df in sheets.values() if df is not None)
+        if nbytes > self.cache_bytes:
+            logger.debug('工作簿%s解析后占用%d字节，超过缓存上限，不缓存', file_path, nbytes)
+            return
+        self._evict(file_path)
+        self._workbook_cache[file_path] = (self._file_signature(file_path), sheets, nbytes)
+        self._cached_bytes += nbytes
+        while len(self._workbook_cache) > self.cache_size or self._cached_bytes > self.cache_bytes:
+            _, (_, _, evicted_bytes) = self._workbook_cache.popitem(last=False)
+            self._cached_bytes -= evicted_bytes
+
+    def _evict(self, file_path: Path):
+        cached = self._workbook_cache.pop(file_path, None)
+        if cached is not None:
+            self._cached_bytes -= cached[2]
+
+    def invalidate(self, file_path: Path|None = None):
+        """清除指定文件的缓存，file_path为None时清除全部缓存"""
+        if file_path is None:
+            self._workbook_cache.clear()
+            self._cached_bytes = 0
+        else:
+            self._evict(Path(file_path).resolve())
+
+    def read_workbook(self, file_path: Path, sheet_names: List[str]|None = None,
+                      columns: List[str]|None = None) -> Dict[str,pd.DataFrame]:
+        """一次解析读取工作簿的全部sheet，并按文件修改时间缓存
+        
+        Args:
+            file_path: Excel文件路径
+            sheet_names: 需要的sheet，None为全部sheet
+            columns: 需要的列，sheet中不存在的列忽略，None为全部列
+            
+        Returns:
+            Dict[sheet_name,pd.DataFrame]，按工作簿中的sheet顺序
+        """
+        file_path = Path(file_path).resolve()
+        sheets = self._get_cached_workbook(file_path)
+        if sheets is None:
+            logger.debug('解析工作簿:%s,engine:%s', file_path, self.engine)
+            with self.tracer.span('read_workbook', 'read', file=file_path.name, engine=self.engine) as span_args:
+                if file_path.is_dir():
+                    sheets = {sheet_name: self.read_table(path) for sheet_name, path in self._sheet_files(file_path).items()}
+                else:
+                    sheets = self._merge_shards(pd.read_excel(file_path, sheet_name=None, engine=self.engine),
+                                                self._read_shard_manifest(file_path))
+                span_args['sheets'] = len(sheets)
+                span_args['rows'] = sum(len(df) for df in sheets.values() if df is not None)
+            self._cache_workbook(file_path, sheets)
+        result = {}
+        for sheet_name, df in sheets.items():
+            if sheet_names is not None and sheet_name not in sheet_names:
+                continue
+            # 返回副本，调用方修改不影响缓存
+            if columns is None:
+                result[sheet_name] = df.copy()
+            else:
+                result[sheet_name] = df[[col for col in columns if col in df.columns]].copy()
+        if sheet_names is not None:
+            missing_sheets = [sheet_name for sheet_name in sheet_names if sheet_name not in result]
+            if missing_sheets:
+                raise ValueError(f"工作簿 '{file_path.name}' 中不存在sheet: {', '.join(missing_sheets)}")
+        return result
+
+    def list_sheet_names(self, file_path: Path) -> List[str]:
+        """只读取xlsx中的workbook.xml获取sheet名称，不解析单元格"""
+        file_path = Path(file_path).resolve()
+        sheets = self._get_cached_workbook(file_path)
+        if sheets is not None:
+            return list(sheets.keys())
+        if file_path.is_dir():
+            return list(self._sheet_files(file_path).keys())
+        try:
+            with zipfile.ZipFile(file_path) as archive:
+                root = ET.fromstring(archive.read('xl/workbook.xml'))
+            sheet_names = [sheet.get('name') for sheet in root.iter(f'{_SPREADSHEET_NS}sheet')]
+        except (zipfile.BadZipFile, KeyError):
+            # 非xlsx格式时退回pandas
+            sheet_names = list(pd.ExcelFile(file_path, engine=self.engine).sheet_names)
+        return list(self._merge_shards(dict.fromkeys(sheet_names), self._read_shard_manifest(file_path)).keys())
+
+    @staticmethod
+    def _read_shard_manifest(file_path: Path) -> Dict[str,List[str]]:
+        """读取分片清单，返回Dict[逻辑sheet名称,[分片sheet名称]]，没有分片时为空"""
+        manifest_path = shard_manifest_path(file_path)
+        if not manifest_path.exists():
+            return {}
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        return {sheet_name: shard['shards'] for sheet_name, shard in manifest.get('sheets', {}).items()}
+
+    @staticmethod
+    def _merge_shards(sheets: Dict[str,Optional[pd.DataFrame]], shards: Dict[str,List[str]]) -> Dict[str,Optional[pd.DataFrame]]:
+        """将分片sheet按顺序合并为一个逻辑sheet，位置与第一个分片相同"""
+        if not shards:
+            return sheets
+        first_shards = {shard_names[0]: sheet_name for sheet_name, shard_names in shards.items()}
+        other_shards = {name for shard_names in shards.values() for name in shard_names[1:]}
+        result = {}
+        for name, df in sheets.items():
+            if name in other_shards:
+                continue
+            if name in first_shards:
+                sheet_name = first_shards[name]
+                if df is None:
+                    result[sheet_name] = None
+                else:
+                    result[sheet_name] = pd.concat([sheets[shard] for shard in shards[sheet_name] if shard in sheets],
+                                                   ignore_index=True)
+            else:
+                result[name] = df
+        return result
+
     def read_rules(self, file_path: Path):
         """从Excel文件中读取分词规则，并进行去重"""
         try:
             # 默认读取分词规则sheet的分词规则列
-            df = pd.read_excel(file_path, sheet_name='分词规则')
+            df = pd.read_excel(file_path, sheet_name='分词规则', engine=self.engine)
             
             # 检查是否存在分词规则列
             if '分词规则' in df.columns:
@@ -27,7 +583,7 @@ class ExcelHandler:
     def read_keywords(self, file_path: Path):
         """从Excel文件中读取关键词，并进行去重"""
         try:
-            df = pd.read_excel(file_path)
+            df = self.read_table(file_path)
             
             # 使用第一列作为关键词列
             keywords = df.iloc[:, 0].dropna().astype(str).tolist()
@@ -61,13 +617,13 @@ class ExcelHandler:
                 output_dir = output_file.parent
                 # 创建目录
                 output_dir.mkdir(parents=True, exist_ok=True)
-                logger.debug(f"已创建或确认输出目录: {output_dir.absolute()}")
+                logger.debug("已创建或确认输出目录: %s", output_dir.absolute())
             except PermissionError:
                 # 权限错误时，使用用户目录作为备选
                 user_dir = Path.home()
                 current_time = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
                 output_file = user_dir / f"关键词分类结果_{current_time}.xlsx"
-                logger.warning(f"无法创建原目录，将保存到用户目录: {output_file}")
+                logger.warning("无法创建原目录，将保存到用户目录: %s", output_file)
             except Exception as e:
                 # 其他错误时，保存到当前目录
                 current_time = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -75,13 +631,78 @@ class ExcelHandler:
                 logger.error(f"创建目录时出错: {str(e)}，将保存到当前目录: {output_file}")
             
             # 保存到Excel
-            result_df.to_excel(output_file, index=False, sheet_name=sheet_name)
+            self.write_workbook({sheet_name or 'Sheet1': result_df}, output_file)
             
             return output_file
         except Exception as e:
             raise Exception(f"保存结果失败: {str(e)}")
 
 
+    def save_sheets(self, sheets: Dict[str,pd.DataFrame], output_file: Path) -> Path:
+        """将多个sheet一次性写入新的Excel文件
+        
+        Args:
+            sheets: Dict[sheet_name,pd.DataFrame]，按字典顺序写入
+            output_file: 输出文件路径
+            
+        Returns:
+            输出文件路径
+        """
+        try:
+            output_file = Path(output_file)
+            output_file.parent.mkdir(parents=True, exist_ok=True)
+            return self.write_workbook(sheets, output_file)
+        except Exception as e:
+            raise Exception(f"保存结果失败: {str(e)}")
+
+    def write_workbook(self, sheets: Dict[str,pd.DataFrame|Iterable[pd.DataFrame]], output_file: Path,
+                       chunk_size: int = WRITE_CHUNK_SIZE) -> Path:
+        """流式写入新工作簿，已存在的文件会被覆盖
+        
+        逐行写入，xlsxwriter使用constant_memory模式，openpyxl使用write_only模式，
+        内存占用与行数无关。需要修改已有工作簿时，读取全部sheet后整体重写，不使用追加模式重新打开。
+        
+        Args:
+            sheets: Dict[sheet_name,pd.DataFrame或分块DataFrame的迭代器]，按字典顺序写入，表头取自第一个分块
+            output_file: 输出文件路径
+            chunk_size: DataFrame每次转换为行的行数
+            
+        Returns:
+            输出文件路径
+        """
+        output_file = Path(output_file)
+        logger.debug('写入工作簿:%s,engine:%s', output_file, self.writer_engine)
+        with self.tracer.span('write_workbook', 'write', file=output_file.name, sheets=len(sheets),
+                              engine=self.writer_engine) as span_args:
+            if table_format(output_file) != 'excel':
+                self._write_sheet_files(sheets, output_file, chunk_size)
+            else:
+                writer = _ExcelWorkbookWriter(output_file, self.writer_engine, self.max_sheet_rows)
+                try:
+                    for sheet_name, data in sheets.items():
+                        writer.add_sheet(sheet_name)
+                        for chunk in _iter_sheet_chunks(data, chunk_size):
+                            writer.write(chunk)
+                except BaseException:
+                    writer.abort()
+                    raise
+                writer.close()
+            span_args['rows'] = sum(len(data) for data in sheets.values() if isinstance(data, pd.DataFrame))
+            span_args['bytes_written'] = self.workbook_size(output_file)
+        self.invalidate(output_file)
+        return output_file
+
+    def _write_sheet_files(self, sheets: Dict[str,pd.DataFrame|Iterable[pd.DataFrame]], workbook_dir: Path, chunk_size: int):
+        """目录格式的工作簿：每个sheet写为一个文件，并删除不再存在的sheet文件"""
+        suffix = table_suffix(workbook_dir)
+        workbook_dir.mkdir(parents=True, exist_ok=True)
+        stale_files = self._sheet_files(workbook_dir)
+        for sheet_name, data in sheets.items():
+            self.write_table(data, workbook_dir / f'{sheet_name}{suffix}', chunk_size)
+            stale_files.pop(sheet_name, None)
+        for path in stale_files.values():
+            path.unlink()
+
     def read_workflow_rules(self, file_path: Path) -> WorkFlowRules:
         """读取工作流规则文件
         
@@ -97,17 +718,15 @@ class ExcelHandler:
             if not file_name.startswith("工作流规则_"):
                 raise ValueError(f"工作流规则文件名必须以'工作流规则_'开头，当前文件名: {file_name}")
             
-            # 读取Excel文件的所有sheet
-            excel_file = pd.ExcelFile(file_path)
-            sheet_names = excel_file.sheet_names
+            # 一次解析读取Excel文件的所有sheet
+            sheets = self.read_workbook(file_path)
             
             # 检查是否至少有Sheet1
-            if 'Sheet1' not in sheet_names:
+            if 'Sheet1' not in sheets:
                 raise ValueError("工作流规则文件必须包含Sheet1")
             rules_data = []
             # 遍历所有sheet，读取规则
-            for i, sheet_name in enumerate(sheet_names):
-                df = pd.read_excel(file_path, sheet_name=sheet_name)
+            for i, (sheet_name, df) in enumerate(sheets.items()):
                 # 检查sheet是否有数据
                 if df.empty:
                     continue
@@ -138,6 +757,9 @@ class ExcelHandler:
                     if i > 0 and '分类sheet名称' in df.columns:
                         rule_data['classified_sheet_name'] = row['分类sheet名称']
                     
+                    if i > 1 and '分类标签' in df.columns:
+                        rule_data['rule_tag'] = row['分类标签']
+                    
                     if i > 2 and '上层分类规则' in df.columns:
                         rule_data['parent_rule'] = row['上层分类规则']
                     rules_data.append(WorkFlowRule(**rule_data))
@@ -161,8 +783,8 @@ class ExcelHandler:
             if not file_name.startswith("待分类_"):
                 raise ValueError(f"待分类文件名必须以'待分类_'开头，当前文件名: {file_name}")
             
-            # 读取Excel文件
-            df = pd.read_excel(file_path)
+            # 按扩展名读取Excel/csv/tsv/parquet文件
+            df = self.read_table(file_path)
             
             # 检查是否包含关键词列
             if '关键词' not in df.columns:
@@ -173,23 +795,89 @@ class ExcelHandler:
             return UnclassifiedKeywords(data=keywords)
         except Exception as e:
             raise Exception(f"读取待分类文件失败: {str(e)}")
-    def read_stage_results(self, file_path: Path) -> Dict[str,pd.DataFrame]:
+    def iter_keyword_batches(self, file_path: Path, batch_size: int = KEYWORD_BATCH_SIZE) -> Iterator[List[str]]:
+        """分块读取待分类文件的'关键词'列，每次返回不超过batch_size个关键词
+        
+        与read_keyword_file的命名和列要求相同，但不把整个文件读入内存；
+        返回原始文本，预处理与去重由调用方通过UnclassifiedKeywords完成。
+        
+        Args:
+            file_path: 待分类文件路径，xlsx/csv/tsv(.gz)/parquet
+            batch_size: 每批关键词数
+            
+        Yields:
+            List[str]: 一批关键词
+        """
+        file_path = Path(file_path)
+        if not file_path.name.startswith("待分类_"):
+            raise ValueError(f"待分类文件名必须以'待分类_'开头，当前文件名: {file_path.name}")
+        file_format = table_format(file_path)
+        if file_format in _TEXT_SEPARATORS:
+            read_kwargs = dict(sep=_TEXT_SEPARATORS[file_format], dtype=str, keep_default_na=False, na_values=[''],
+                               encoding='utf-8-sig', compression='infer')
+            if '关键词' not in pd.read_csv(file_path, nrows=0, **read_kwargs).columns:
+                raise ValueError("待分类文件必须包含'关键词'列")
+            with pd.read_csv(file_path, usecols=['关键词'], chunksize=batch_size, **read_kwargs) as reader:
+                for chunk in reader:
+                    yield chunk['关键词'].dropna().tolist()
+        elif file_format == 'parquet':
+            import pyarrow.parquet as pq
+            parquet_file = pq.ParquetFile(file_path)
+            if '关键词' not in parquet_file.schema_arrow.names:
+                raise ValueError("待分类文件必须包含'关键词'列")
+            for batch in parquet_file.iter_batches(batch_size=batch_size, columns=['关键词']):
+                yield [str(value) for value in batch.column(0).to_pylist() if value is not None]
+        else:
+            yield from self._iter_excel_keyword_batches(file_path, batch_size)
+
+    def _iter_excel_keyword_batches(self, file_path: Path, batch_size: int) -> Iterator[List[str]]:
+        """逐行读取第一个sheet，calamine按行迭代，openpyxl使用read_only模式"""
+        if self.engine == 'calamine':
+            from python_calamine import CalamineWorkbook
+            rows = CalamineWorkbook.from_path(str(file_path)).get_sheet_by_index(0).iter_rows()
+            workbook = None
+        else:
+            import openpyxl
+            workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+        try:
+            header = next(rows, None)
+            if header is None or '关键词' not in header:
+                raise ValueError("待分类文件必须包含'关键词'列")
+            keyword_index = list(header).index('关键词')
+            batch = []
+            for row in rows:
+                if keyword_index >= len(row):
+                    continue
+                value = row[keyword_index]
+                if value is None or value == '':
+                    continue
+                # 与pandas一致，整数值的浮点数按整数转换为文本
+                if isinstance(value, float) and value.is_integer():
+                    value = int(value)
+                batch.append(str(value))
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+        finally:
+            if workbook is not None:
+                workbook.close()
+
+    def read_stage_results(self, file_path: Path, columns: List[str]|None = None) -> Dict[str,pd.DataFrame]:
         """读取分类结果文件
         
         Args:
             file_path: 分类结果文件路径
+            columns: 需要的列，如['关键词','阶段3']，None为全部列
             
         Returns:
             Dict[str:pd.DataFrame]classified_sheet_name:pd.DataFrame
         """
         try:
-            # 读取Excel文件的所有sheet
-            excel_file = pd.ExcelFile(file_path)
-            sheet_names = excel_file.sheet_names
             result = {}
-            
-            for sheet_name in sheet_names:
-                df = pd.read_excel(file_path, sheet_name=sheet_name)
+            for sheet_name, df in self.read_workbook(file_path, columns=columns).items():
                 if df.empty:
                     continue
                 if '关键词' not in df.columns:
@@ -211,9 +899,8 @@ class ExcelHandler:
         try:
             result = {}
             for output_name,file_path in file_path.items():
-                # 读取Excel文件的所有sheet
-                excel_file = pd.ExcelFile(file_path)
-                sheet_names = list(excel_file.sheet_names)
+                # 只读取sheet名称，不解析单元格
+                sheet_names = self.list_sheet_names(file_path)
                 result[output_name] = {'file_path':file_path, 'classified_sheet_name':sheet_names}
             return result
         except Exception as e:
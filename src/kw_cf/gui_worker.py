@@ -0,0 +1,63 @@
+"""图形界面的后台处理进程，不导入tkinter
+
+分类是CPU密集的处理，在界面进程的线程中运行会占住GIL，使Tk事件循环卡住。界面在子进程中运行run_workflow，
+子进程通过有界的multiprocessing队列发回消息，消息为(类型, 内容)：
+    ('log', (级别, 文本))       日志
+    ('progress', ProgressEvent)  进度，队列已满时丢弃
+    ('done', 结果目录)
+    ('error', 错误信息)
+    ('cancelled', None)
+"""
+import queue
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+# 界面进程和处理进程之间的消息队列长度，界面取出消息跟不上时处理进程的日志会等待
+MESSAGE_QUEUE_SIZE = 1000
+# 日志等待队列空位的最长秒数，超时后丢弃该条日志
+LOG_PUT_TIMEOUT = 5.0
+
+
+def put_message(message_queue: Any, message: Tuple[str, Any], block: bool = True, timeout: Optional[float] = None) -> bool:
+    """向消息队列放入一条消息，队列已满（超时或非阻塞）时丢弃并返回False"""
+    try:
+        message_queue.put(message, block=block, timeout=timeout)
+        return True
+    except queue.Full:
+        return False
+
+
+def run_workflow(rules_path: Path, keywords_path: Path, case_sensitive: bool, separator: str,
+                 log_level: int, message_queue: Any, cancel_event: Any):
+    """处理进程入口：运行完整工作流，日志、进度和结果通过message_queue发回界面进程
+
+    Args:
+        log_level: 发回界面的日志级别
+        message_queue: multiprocessing队列
+        cancel_event: multiprocessing.Event，界面设置后工作流在下一个检查点取消
+    """
+    from .logger_config import add_ui_handler
+    from .progress import CancellationToken, WorkflowCancelled
+    from .workflow_processor import WorkFlowProcessor
+
+    add_ui_handler(lambda level, message: put_message(message_queue, ('log', (level, message)), timeout=LOG_PUT_TIMEOUT),
+                   level=log_level)
+    try:
+        processor = WorkFlowProcessor(
+            error_callback=lambda message: put_message(message_queue, ('log', ('ERROR', message)), timeout=LOG_PUT_TIMEOUT),
+            progress_callback=lambda event: put_message(message_queue, ('progress', event), block=False),
+            cancel_token=CancellationToken(cancel_event)
+        )
+        processor.classifier.case_sensitive = case_sensitive
+        processor.classifier.separator = separator
+
+        put_message(message_queue, ('log', ('INFO', '正在处理工作流...这可能需要一些时间，请耐心等待')))
+        result = processor.process_workflow(rules_path, keywords_path)
+        if result:
+            put_message(message_queue, ('done', str(processor.output_dir)))
+        else:
+            put_message(message_queue, ('error', '处理失败，请查看错误信息'))
+    except WorkflowCancelled:
+        put_message(message_queue, ('cancelled', None))
+    except Exception as e:
+        put_message(message_queue, ('error', f'处理过程中发生错误: {e}'))
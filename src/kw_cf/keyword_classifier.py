@@ -1,9 +1,46 @@
 from lark import Lark, Transformer, v_args
 from typing import Optional, Callable
+from functools import lru_cache
 from .logger_config import logger
 from .models import UnclassifiedKeywords, SourceRules,ClassifiedWord
 
 
+RULE_GRAMMAR = r"""
+    ?start: expr
+    
+    ?expr: or_expr
+    
+    ?or_expr: and_expr
+           | or_expr "|" and_expr -> or_op
+    
+    ?and_expr: atom
+            | and_expr "+" atom -> and_op
+    
+    ?atom: exact
+         | term_exclude
+         | term
+         | "(" expr ")" -> group
+    
+    term_exclude: WORD "<" expr ">" -> term_exclude_match
+    
+    exact: "[" WORD "]" -> exact_match
+    exclude: "<" expr ">" -> exclude_match
+    term: WORD -> simple_term
+    
+    WORD: /[^\[\]<>|+()\s]+/
+    
+    %import common.WS
+    %ignore WS
+"""
+
+
+@lru_cache(maxsize=None)
+def _get_parser() -> Lark:
+    """构建LALR解析器，cache=True时Lark把解析表序列化到临时目录，
+    之后的进程（包括进程池子进程和重新启动的exe）直接加载，不再重新生成"""
+    return Lark(RULE_GRAMMAR, parser="lalr", cache=True)
+
+
 class KeywordClassifier:
     def __init__(self, case_sensitive=False, separator="&",error_callback:Optional[Callable]=None):
         self.rules = []
@@ -14,35 +51,8 @@ class KeywordClassifier:
         self.parser = self._create_parser()
 
     def _create_parser(self):
-        """创建Lark解析器"""
-        grammar = r"""
-            ?start: expr
-            
-            ?expr: or_expr
-            
-            ?or_expr: and_expr
-                   | or_expr "|" and_expr -> or_op
-            
-            ?and_expr: atom
-                    | and_expr "+" atom -> and_op
-            
-            ?atom: exact
-                 | term_exclude
-                 | term
-                 | "(" expr ")" -> group
-            
-            term_exclude: WORD "<" expr ">" -> term_exclude_match
-            
-            exact: "[" WORD "]" -> exact_match
-            exclude: "<" expr ">" -> exclude_match
-            term: WORD -> simple_term
-            
-            WORD: /[^\[\]<>|+()\s]+/
-            
-            %import common.WS
-            %ignore WS
-        """
-        return Lark(grammar, parser="lalr")
+        """获取Lark解析器，进程内所有分类器共用同一个"""
+        return _get_parser()
 
     @v_args(inline=True)
     class RuleTransformer(Transformer):
@@ -154,7 +164,7 @@ class KeywordClassifier:
                         break
                 except Exception as e:
                     logger.debug(
-                        f"应用规则 '{rule_text}' 到关键词 '{keyword}' 时出错: {str(e)}"
+                        "应用规则 '%s' 到关键词 '%s' 时出错: %s", rule_text, keyword, e
                     )
 
             # 添加结果
@@ -0,0 +1,217 @@
+"""内存映射的关键词库
+
+千万级关键词以Python str保存在列表、DataFrame和pydantic模型中，每个关键词约有100字节的额外开销，
+且每个阶段各保存一份。关键词库把全部关键词写入一个文件：UTF-8字节缓冲区加偏移数组，
+打开时用mmap映射，按编号读取，只有正在处理的一批关键词会解码为str；
+多个进程打开同一个文件时共用操作系统的页缓存，不需要复制。
+同样的布局也可以放在multiprocessing.shared_memory中（build_shared），供进程池子进程按名称映射。
+
+文件格式（小端，偏移数组按本机字节序映射，只支持x86、ARM等小端平台）:
+    头部    8字节魔数 KWCFKS01，关键词数n，数据区起始位置，偏移数组起始位置（各8字节）
+    数据区  全部关键词的UTF-8字节，首尾相接
+    偏移    n+1个uint64，第i个关键词为数据区[offsets[i]:offsets[i+1]]
+"""
+import mmap
+import struct
+from array import array
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from . import models
+from .excel_handler import ExcelHandler, _commit_temporary, _discard_temporary, _temporary_path
+
+KEYWORD_STORE_SUFFIX = '.kwstore'
+MAGIC = b'KWCFKS01'
+# 魔数、关键词数、数据区起始位置、偏移数组起始位置
+HEADER = struct.Struct('<8sQQQ')
+
+# 关键词库的来源：('file', 文件路径) 或 ('shared_memory', 共享内存名称)
+StoreSource = Tuple[str, str]
+
+
+def is_keyword_store(file_path: Path) -> bool:
+    return Path(file_path).name.endswith(KEYWORD_STORE_SUFFIX)
+
+
+class KeywordStore:
+    """只读的内存映射关键词库，按编号（写入顺序，从0开始）读取关键词
+
+    可以被pickle：传给子进程的只有来源（文件路径或共享内存名称），子进程重新映射同一块内存。
+
+    Example:
+        with KeywordStore.from_keyword_file(Path('待分类_1.xlsx'), Path('待分类_1.kwstore')) as store:
+            for start, keywords in store.iter_batches(100000):
+                ...
+    """
+
+    def __init__(self, file_path: Optional[Path] = None, shared_memory_name: Optional[str] = None):
+        """按文件路径或共享内存名称打开关键词库"""
+        self.file_path = Path(file_path) if file_path is not None else None
+        self._mmap: Optional[mmap.mmap] = None
+        self._shared_memory: Optional[shared_memory.SharedMemory] = None
+        # build_shared创建的共享内存在close时释放
+        self._owns_shared_memory = False
+        if self.file_path is not None:
+            with open(self.file_path, 'rb') as file:
+                self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            buffer = memoryview(self._mmap)
+        elif shared_memory_name is not None:
+            self._shared_memory = shared_memory.SharedMemory(name=shared_memory_name)
+            buffer = self._shared_memory.buf[:]
+        else:
+            raise ValueError('需要指定关键词库文件路径或共享内存名称')
+        magic, count, data_offset, offsets_offset = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            buffer.release()
+            self._close_buffer()
+            raise ValueError(f'不是关键词库: {self.file_path or shared_memory_name}')
+        self._count = count
+        self._offsets = buffer[offsets_offset:offsets_offset + 8 * (count + 1)].cast('Q')
+        self._data = buffer[data_offset:data_offset + self._offsets[count]]
+        buffer.release()
+
+    @property
+    def source(self) -> StoreSource:
+        """子进程用open(source)重新打开同一个关键词库"""
+        if self.file_path is not None:
+            return ('file', str(self.file_path))
+        return ('shared_memory', self._shared_memory.name)
+
+    @classmethod
+    def open(cls, source: StoreSource) -> 'KeywordStore':
+        kind, location = source
+        if kind == 'file':
+            return cls(Path(location))
+        return cls(shared_memory_name=location)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> str:
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('关键词编号超出范围')
+        return str(self._data[self._offsets[index]:self._offsets[index + 1]], 'utf-8')
+
+    def keywords(self, start: int = 0, stop: Optional[int] = None) -> List[str]:
+        """编号在[start,stop)内的关键词"""
+        stop = self._count if stop is None else min(stop, self._count)
+        data, offsets = self._data, self._offsets
+        return [str(data[offsets[index]:offsets[index + 1]], 'utf-8') for index in range(start, stop)]
+
+    def take(self, indices: Iterable[int]) -> List[str]:
+        """按编号列表读取关键词，编号可以是numpy整数数组"""
+        data, offsets = self._data, self._offsets
+        return [str(data[offsets[index]:offsets[index + 1]], 'utf-8') for index in map(int, indices)]
+
+    def iter_batches(self, batch_size: int, start: int = 0, stop: Optional[int] = None) -> Iterator[Tuple[int, List[str]]]:
+        """逐批返回 (本批第一个关键词的编号, 关键词列表)"""
+        stop = self._count if stop is None else min(stop, self._count)
+        for batch_start in range(start, stop, batch_size):
+            yield batch_start, self.keywords(batch_start, min(batch_start + batch_size, stop))
+
+    @property
+    def nbytes(self) -> int:
+        """数据区字节数"""
+        return len(self._data)
+
+    def close(self):
+        self._offsets.release()
+        self._data.release()
+        self._close_buffer()
+
+    def _close_buffer(self):
+        if self._mmap is not None:
+            self._mmap.close()
+        if self._shared_memory is not None:
+            self._shared_memory.close()
+            if self._owns_shared_memory:
+                self._shared_memory.unlink()
+
+    def __enter__(self) -> 'KeywordStore':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __reduce__(self):
+        return (KeywordStore.open, (self.source,))
+
+    @classmethod
+    def build(cls, file_path: Path, batches: Iterable[Sequence[str]], deduplicate: bool = True,
+              error_callback: Optional[Callable] = None) -> 'KeywordStore':
+        """逐批写入关键词并打开关键词库
+
+        deduplicate为True时与UnclassifiedKeywords一致：清除不可见字符、去除首尾空格和空值、跨批次保序去重
+        （去重需要保留已出现关键词的集合，只在构建时占用）。先写入同目录的临时文件，完成后原子替换。
+        """
+        file_path = Path(file_path)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = _temporary_path(file_path)
+        offsets = array('Q', [0])
+        seen_keywords = set()
+        try:
+            with open(temp_path, 'wb') as file:
+                file.write(bytes(HEADER.size))
+                position = 0
+                for batch in batches:
+                    if deduplicate:
+                        keywords = models.UnclassifiedKeywords(data=list(batch), error_callback=error_callback).data
+                        batch = [keyword for keyword in keywords if keyword not in seen_keywords]
+                        seen_keywords.update(batch)
+                    encoded = [keyword.encode('utf-8') for keyword in batch]
+                    for item in encoded:
+                        position += len(item)
+                        offsets.append(position)
+                    file.write(b''.join(encoded))
+                # 偏移数组按8字节对齐
+                offsets_offset = HEADER.size + position
+                padding = -offsets_offset % 8
+                file.write(bytes(padding))
+                offsets_offset += padding
+                offsets.tofile(file)
+                file.seek(0)
+                file.write(HEADER.pack(MAGIC, len(offsets) - 1, HEADER.size, offsets_offset))
+        except BaseException:
+            _discard_temporary(temp_path)
+            raise
+        _commit_temporary(temp_path, file_path)
+        return cls(file_path)
+
+    @classmethod
+    def build_shared(cls, keywords: Sequence[str]) -> 'KeywordStore':
+        """将已预处理的关键词按同样的布局写入新建的共享内存，close时释放共享内存"""
+        encoded = [keyword.encode('utf-8') for keyword in keywords]
+        offsets = array('Q', [0])
+        position = 0
+        for item in encoded:
+            position += len(item)
+            offsets.append(position)
+        offsets_offset = HEADER.size + position
+        offsets_offset += -offsets_offset % 8
+        size = offsets_offset + offsets.itemsize * len(offsets)
+        memory = shared_memory.SharedMemory(create=True, size=size)
+        try:
+            HEADER.pack_into(memory.buf, 0, MAGIC, len(encoded), HEADER.size, offsets_offset)
+            memory.buf[HEADER.size:HEADER.size + position] = b''.join(encoded)
+            memory.buf[offsets_offset:size] = offsets.tobytes()
+            store = cls(shared_memory_name=memory.name)
+        finally:
+            memory.close()
+        store._owns_shared_memory = True
+        return store
+
+    @classmethod
+    def from_keyword_file(cls, classification_file: Path, file_path: Optional[Path] = None,
+                          excel_handler: Optional[ExcelHandler] = None, batch_size: int = 100000,
+                          error_callback: Optional[Callable] = None) -> 'KeywordStore':
+        """分块读取待分类文件的'关键词'列写入关键词库，file_path默认为待分类文件旁的同名.kwstore文件"""
+        classification_file = Path(classification_file)
+        if file_path is None:
+            file_path = classification_file.with_name(classification_file.name.split('.', 1)[0] + KEYWORD_STORE_SUFFIX)
+        excel_handler = excel_handler or ExcelHandler(cache_size=0)
+        return cls.build(file_path, excel_handler.iter_keyword_batches(classification_file, batch_size),
+                         error_callback=error_callback)
+
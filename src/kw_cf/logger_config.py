@@ -1,14 +1,39 @@
 import logging
+import os
 import sys
-from typing import Callable, Optional, Dict, Any
+import threading
+import time
+from typing import Callable, Optional, Dict, Any, Tuple
 
 # 创建根日志器
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
+
+# 控制台处理器的输出流和级别可由环境变量指定，进程池子进程继承同样的设置
+LOG_STREAM_ENV = 'KW_CF_LOG_STREAM'
+LOG_LEVEL_ENV = 'KW_CF_LOG_LEVEL'
+# 默认日志级别，需要排查问题时通过环境变量或configure_console_handler改为DEBUG
+DEFAULT_LOG_LEVEL = logging.INFO
+
+
+
+def _env_log_level() -> Tuple[int, Optional[str]]:
+    """读取环境变量中的日志级别，不区分大小写，也可以是数字；无法识别时返回默认级别和原始值"""
+    value = os.environ.get(LOG_LEVEL_ENV)
+    if value is None or not value.strip():
+        return DEFAULT_LOG_LEVEL, None
+    name = value.strip().upper()
+    if name.isdigit():
+        return int(name), None
+    level = logging.getLevelName(name)
+    if isinstance(level, int):
+        return level, None
+    return DEFAULT_LOG_LEVEL, value
+
 
 # 创建控制台处理器
-console_handler = logging.StreamHandler(sys.stdout)
-console_handler.setLevel(logging.DEBUG)
+console_handler = logging.StreamHandler(sys.stderr if os.environ.get(LOG_STREAM_ENV) == 'stderr' else sys.stdout)
+_console_level, _invalid_env_level = _env_log_level()
+console_handler.setLevel(_console_level)
 
 # 创建日志格式
 formatter = logging.Formatter(
@@ -18,6 +43,66 @@ console_handler.setFormatter(formatter)
 
 # 添加处理器到日志器
 logger.addHandler(console_handler)
+if _invalid_env_level is not None:
+    logger.warning('环境变量%s的日志级别无法识别: %r，使用默认级别%s',
+                   LOG_LEVEL_ENV, _invalid_env_level, logging.getLevelName(DEFAULT_LOG_LEVEL))
+
+
+class RepeatedMessageFilter(logging.Filter):
+    """限制重复日志的频率
+
+    按日志模板（record.msg，使用%s延迟格式化时各分组的模板相同）计数，
+    每个模板在interval秒内最多通过burst条，其余丢弃；下一个时间窗口的第一条日志附带被省略的条数。
+    只限制DEBUG和INFO，WARNING及以上的日志全部保留。
+    """
+
+    # 记录的模板数上限，超过时清空，避免逐条拼接的日志让计数表无限增长
+    MAX_TEMPLATES = 1024
+
+    def __init__(self, burst: int = 20, interval: float = 10.0):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        # Dict[(级别,模板),[窗口开始时间,本窗口通过数,本窗口省略数]]
+        self._windows: Dict[Tuple[int, Any], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.burst <= 0:
+            return True
+        key = (record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            if len(self._windows) >= self.MAX_TEMPLATES and key not in self._windows:
+                self._windows.clear()
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window is not None else 0
+                self._windows[key] = [now, 1, 0]
+                if suppressed:
+                    record.msg = f'{record.msg}（此前{self.interval:g}秒内省略了{suppressed}条相同日志）'
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+
+# 逐分组、逐批次的重复日志按模板限频
+repeated_message_filter = RepeatedMessageFilter()
+logger.addFilter(repeated_message_filter)
+
+
+def _sync_logger_level():
+    """日志器级别取各处理器级别的最小值
+
+    低于该级别的logger.debug等调用在isEnabledFor处直接返回，不创建LogRecord、不格式化参数。
+    """
+    logger.setLevel(min((handler.level for handler in logger.handlers), default=DEFAULT_LOG_LEVEL))
+
+
+_sync_logger_level()
 
 # UI日志处理器类
 class UILogHandler(logging.Handler):
@@ -63,6 +148,7 @@ def add_ui_handler(callback: Callable[[str, str], None], name: str = "default",
     handler = UILogHandler(callback, level)
     logger.addHandler(handler)
     ui_handlers[name] = handler
+    _sync_logger_level()
     return handler
 
 def remove_ui_handler(name: str = "default") -> bool:
@@ -77,6 +163,7 @@ def remove_ui_handler(name: str = "default") -> bool:
     if name in ui_handlers:
         logger.removeHandler(ui_handlers[name])
         del ui_handlers[name]
+        _sync_logger_level()
         return True
     return False
 
@@ -92,9 +179,25 @@ def set_ui_handler_level(level, name: str = "default") -> bool:
     """
     if name in ui_handlers:
         ui_handlers[name].set_level(level)
+        _sync_logger_level()
         return True
     return False
 
+def configure_console_handler(level=None, stream: Optional[str] = None):
+    """设置控制台日志的级别和输出流，并写入环境变量，使之后启动的子进程保持一致
+    
+    Args:
+        level: 日志级别，如'INFO'
+        stream: 'stdout'或'stderr'，命令行模式下日志输出到stderr，stdout只输出结果
+    """
+    if level is not None:
+        console_handler.setLevel(level.upper() if isinstance(level, str) else level)
+        os.environ[LOG_LEVEL_ENV] = logging.getLevelName(console_handler.level)
+    if stream is not None:
+        console_handler.setStream(sys.stderr if stream == 'stderr' else sys.stdout)
+        os.environ[LOG_STREAM_ENV] = stream
+    _sync_logger_level()
+
 def get_logger(name=None):
     """获取日志器"""
     return logging.getLogger(name) if name else logger
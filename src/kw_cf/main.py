@@ -1,12 +1,20 @@
-from .workflow_processor import WorkFlowProcessor
 from pathlib import Path
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox, scrolledtext
-import threading
+import multiprocessing
+import queue
 import re
 import logging
+from .gui_worker import MESSAGE_QUEUE_SIZE, put_message, run_workflow
 from .logger_config import add_ui_handler, remove_ui_handler, set_ui_handler_level
 
+# 每次刷新界面最多取出的消息数，避免大量日志时一次刷新占用过久
+QUEUE_BATCH_SIZE = 200
+# 关闭窗口时等待处理进程响应取消的秒数
+CANCEL_JOIN_TIMEOUT = 10.0
+# 收到结果消息后等待处理进程退出的秒数
+FINISH_JOIN_TIMEOUT = 2.0
+
 class KeywordClassifierGUI:
     def __init__(self, root):
         self.root = root
@@ -21,15 +29,21 @@ class KeywordClassifierGUI:
         
         self.create_widgets()
         
-        # 用于存储处理器实例
-        self.processor = None
+        # 处理在子进程中运行，界面进程只负责显示；统一使用spawn，与Windows打包后的行为一致
+        self.mp_context = multiprocessing.get_context('spawn')
+        self.worker = None
+        self.cancel_event = None
         
-        # 用于存储日志信息
-        self.log_queue = []
+        # 有界的日志、进度消息队列，处理进程和界面进程的日志都放入该队列
+        self.log_queue = self.mp_context.Queue(maxsize=MESSAGE_QUEUE_SIZE)
         
         # 设置UI日志处理器
         self.ui_handler = add_ui_handler(self.log_callback, level=logging.INFO)
         
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        # 开始定时从队列更新日志
+        self.root.after(100, self.update_log_from_queue)
+        
     def create_widgets(self):
         # 创建主框架
         main_frame = ttk.Frame(self.root, padding="10")
@@ -78,9 +92,20 @@ class KeywordClassifierGUI:
         button_frame = ttk.Frame(main_frame)
         button_frame.pack(fill=tk.X, pady=10)
         
-        ttk.Button(button_frame, text="开始处理", command=self.start_processing).pack(side=tk.LEFT, padx=5)
+        self.start_button = ttk.Button(button_frame, text="开始处理", command=self.start_processing)
+        self.start_button.pack(side=tk.LEFT, padx=5)
+        self.cancel_button = ttk.Button(button_frame, text="取消处理", command=self.cancel_processing, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="清空日志", command=self.clear_log).pack(side=tk.LEFT, padx=5)
         
+        # 进度区域
+        progress_frame = ttk.Frame(main_frame)
+        progress_frame.pack(fill=tk.X, pady=5)
+        self.progress_bar = ttk.Progressbar(progress_frame, mode="determinate", maximum=100)
+        self.progress_bar.pack(fill=tk.X)
+        self.status_var = tk.StringVar(value="")
+        ttk.Label(progress_frame, textvariable=self.status_var).pack(anchor=tk.W)
+        
         # 日志区域
         log_frame = ttk.LabelFrame(main_frame, text="处理日志", padding="10")
         log_frame.pack(fill=tk.BOTH, expand=True, pady=5)
@@ -95,7 +120,8 @@ class KeywordClassifierGUI:
             self.rules_path_var.set(filename)
     
     def browse_keywords_file(self):
-        filename = filedialog.askopenfilename(filetypes=[("Excel 文件", "*.xlsx"), ("所有文件", "*.*")])
+        filename = filedialog.askopenfilename(filetypes=[("Excel 文件", "*.xlsx"), ("CSV/TSV 文件", "*.csv *.tsv *.csv.gz *.tsv.gz"),
+                                                         ("Parquet 文件", "*.parquet"), ("所有文件", "*.*")])
         if filename:
             self.keywords_path_var.set(filename)
     
@@ -117,18 +143,14 @@ class KeywordClassifierGUI:
         self.log_text.see(tk.END)
         self.log_text.config(state=tk.DISABLED)
     
-    def error_callback(self, error_message):
-        # 这个回调函数会被传递给WorkFlowProcessor
-        self.log_queue.append(("ERROR", error_message))
-        
     def log_callback(self, level, message):
-        """处理来自日志系统的消息
+        """处理来自界面进程日志系统的消息，队列已满时丢弃
         
         Args:
             level: 日志级别
             message: 日志消息
         """
-        self.log_queue.append((level, message))
+        put_message(self.log_queue, ("log", (level, message)), block=False)
     
     def on_log_level_change(self, event=None):
         """当日志级别变更时调用"""
@@ -143,11 +165,39 @@ class KeywordClassifierGUI:
         level = level_map.get(level_str, logging.INFO)
         set_ui_handler_level(level)
         self.log_message(f"日志级别已设置为: {level_str}")
+        if self.worker is not None:
+            self.log_message("正在运行的处理使用开始处理时的日志级别，下次处理时生效")
     
     def update_log_from_queue(self):
-        if self.log_queue:
+        """每次最多取出QUEUE_BATCH_SIZE条消息，日志一次性插入文本框，进度只显示最新一条"""
+        messages = self.read_queue(QUEUE_BATCH_SIZE)
+        self.handle_messages(messages)
+        
+        # 处理进程异常退出（未发回结果消息）时恢复界面
+        if self.worker is not None and len(messages) < QUEUE_BATCH_SIZE and not self.worker.is_alive():
+            # 进程可能在上面读取队列之后才写入结果消息并退出，退出后消息已全部写入队列，再全部读取一次
+            self.handle_messages(self.read_queue())
+            if self.worker is not None:
+                self.on_worker_finished("error", f"处理进程异常退出，退出码: {self.worker.exitcode}")
+        
+        # 继续更新日志，队列中还有消息时尽快再取
+        self.root.after(10 if len(messages) == QUEUE_BATCH_SIZE else 100, self.update_log_from_queue)
+    
+    def read_queue(self, limit=None):
+        """取出队列中的消息，最多limit条，None为取到队列为空"""
+        messages = []
+        while limit is None or len(messages) < limit:
+            try:
+                messages.append(self.log_queue.get_nowait())
+            except queue.Empty:
+                break
+        return messages
+    
+    def handle_messages(self, messages):
+        logs = [content for message_type, content in messages if message_type == "log"]
+        if logs:
             self.log_text.config(state=tk.NORMAL)
-            for log_type, message in self.log_queue:
+            for log_type, message in logs:
                 if log_type == "ERROR" or log_type == "CRITICAL":
                     self.log_text.insert(tk.END, f"{message}\n", "error")
                 elif log_type == "WARNING":
@@ -158,10 +208,78 @@ class KeywordClassifierGUI:
                     self.log_text.insert(tk.END, f"{message}\n", "info")
             self.log_text.see(tk.END)
             self.log_text.config(state=tk.DISABLED)
-            self.log_queue.clear()
         
-        # 继续更新日志
-        self.root.after(100, self.update_log_from_queue)
+        progress_events = [content for message_type, content in messages if message_type == "progress"]
+        if progress_events:
+            self.show_progress(progress_events[-1])
+        
+        for message_type, content in messages:
+            if message_type in ("done", "error", "cancelled"):
+                self.on_worker_finished(message_type, content)
+    
+    def show_progress(self, event):
+        """显示阶段进度和预计剩余时间"""
+        if event["stage"] == "done":
+            self.progress_bar["value"] = 100
+            self.status_var.set("处理完成")
+            return
+        if event["keywords_total"]:
+            fraction = event["keywords_processed"] / event["keywords_total"]
+        elif event["groups_total"]:
+            fraction = event["groups_done"] / event["groups_total"]
+        else:
+            fraction = 0
+        self.progress_bar["value"] = min(fraction, 1) * 100
+        status = f"{event['stage']}（层级{event['level']}）"
+        if event["group"]:
+            status += f" {event['group']}"
+        if event["eta_seconds"] is not None:
+            status += f"，预计剩余 {event['eta_seconds']:.0f} 秒"
+        self.status_var.set(status)
+    
+    def on_worker_finished(self, status, content):
+        """处理进程结束：回收进程，恢复按钮，提示结果"""
+        if self.worker is None:
+            return
+        # 结果消息已收到，进程应很快退出；超时未退出则终止，不阻塞界面
+        self.worker.join(FINISH_JOIN_TIMEOUT)
+        if self.worker.is_alive():
+            self.worker.terminate()
+        self.worker = None
+        self.cancel_event = None
+        self.start_button.config(state=tk.NORMAL)
+        self.cancel_button.config(state=tk.DISABLED)
+        if status == "done":
+            self.log_message("处理完成！")
+            self.log_message(f"结果已保存到: {content}")
+            messagebox.showinfo("成功", f"处理完成！结果已保存到: {content}")
+        elif status == "cancelled":
+            self.status_var.set("已取消")
+            self.log_message("处理已取消")
+        else:
+            self.status_var.set("处理失败")
+            self.log_text.config(state=tk.NORMAL)
+            self.log_text.insert(tk.END, f"{content}\n", "error")
+            self.log_text.see(tk.END)
+            self.log_text.config(state=tk.DISABLED)
+            messagebox.showerror("错误", content)
+    
+    def cancel_processing(self):
+        """通知处理进程在下一个检查点停止，未写完的结果文件会被丢弃"""
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+            self.cancel_button.config(state=tk.DISABLED)
+            self.status_var.set("正在取消...")
+    
+    def on_close(self):
+        """关闭窗口时先取消正在运行的处理，超时未退出则终止处理进程"""
+        if self.worker is not None:
+            self.cancel_event.set()
+            self.worker.join(CANCEL_JOIN_TIMEOUT)
+            if self.worker.is_alive():
+                self.worker.terminate()
+        remove_ui_handler()
+        self.root.destroy()
     
     def clear_log(self):
         self.log_text.config(state=tk.NORMAL)
@@ -169,6 +287,9 @@ class KeywordClassifierGUI:
         self.log_text.config(state=tk.DISABLED)
     
     def start_processing(self):
+        if self.worker is not None:
+            return
+        
         # 获取用户输入
         rules_path_str = self.rules_path_var.get()
         keywords_path_str = self.keywords_path_var.get()
@@ -219,41 +340,19 @@ class KeywordClassifierGUI:
         self.log_message(f"大小写敏感: {'是' if case_sensitive else '否'}")
         self.log_message(f"分隔符: {separator}")
         
-        # 在新线程中运行处理过程
-        threading.Thread(target=self.process_workflow, args=(rules_path, keywords_path, case_sensitive, separator)).start()
-        
-        # 开始更新日志
-        self.update_log_from_queue()
-    
-    def process_workflow(self, rules_path, keywords_path, case_sensitive, separator):
-        try:
-            # 创建处理器实例
-            self.processor = WorkFlowProcessor(error_callback=self.error_callback)
-            
-            # 设置关键词分类器的参数
-            self.processor.classifier.case_sensitive = case_sensitive
-            self.processor.classifier.separator = separator
-            
-            # 记录处理开始
-            self.log_queue.append(("INFO", "正在处理工作流...这可能需要一些时间，请耐心等待"))
-            
-            # 处理工作流
-            result = self.processor.process_workflow(rules_path, keywords_path)
-            
-            # 记录处理完成
-            if result:
-                self.log_queue.append(("INFO", "处理完成！"))
-                self.log_queue.append(("INFO", f"结果已保存到: {self.processor.output_dir}"))
-                
-                # 在主线程中显示成功消息
-                self.root.after(0, lambda: messagebox.showinfo("成功", f"处理完成！结果已保存到: {self.processor.output_dir}"))
-            else:
-                self.log_queue.append(("ERROR", "处理失败，请查看错误信息"))
-        except Exception as e:
-            msg_err = f"处理过程中发生错误: {str(e)}"
-            self.log_queue.append(("ERROR", msg_err))
-            # 在主线程中显示错误消息
-            self.root.after(0, lambda: messagebox.showerror("错误", msg_err))
+        # 在子进程中运行处理过程，界面进程的事件循环不受分类计算影响
+        self.progress_bar["value"] = 0
+        self.status_var.set("")
+        self.cancel_event = self.mp_context.Event()
+        self.worker = self.mp_context.Process(
+            target=run_workflow,
+            args=(rules_path, keywords_path, case_sensitive, separator, self.ui_handler.level,
+                  self.log_queue, self.cancel_event),
+            name="kw_cf-workflow"
+        )
+        self.worker.start()
+        self.start_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.NORMAL)
 
 def main():
     root = tk.Tk()
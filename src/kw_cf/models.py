@@ -1,7 +1,11 @@
-from pydantic import BaseModel, field_validator, Field,ValidationInfo,model_validator
+import re
+
+from pydantic import BaseModel, field_validator, Field,ValidationInfo,model_validator,PrivateAttr
 from .logger_config import logger
 
-from typing import List, Optional, Callable, Any,Literal,Dict
+from typing import List, Optional, Callable, Any,Literal,Dict,ClassVar
+import numpy as np
+import pandas as pd
 
 
 __all__ = [
@@ -12,10 +16,16 @@ __all__ = [
     'WorkFlowRules',
     'ClassifiedKeyword',
     'UnMatchedKeyword',
-    'ClassifiedResult'
+    'ClassifiedResult',
+    'WorkFlowPlanGroup',
+    'WorkFlowPlan'
 ]
 
 
+# 与_preprocess_text中invisible_chars相同的字符，绝大多数关键词不含这些字符，先整体检查一次
+_INVISIBLE_PATTERN = re.compile('[\u200b-\u200f\u202a-\u202e\u2060-\u2064\ufeff]')
+
+
 def _preprocess_text(text, error_callback=None):
     """预处理文本，清除不可见的干扰字符
     Args:
@@ -27,6 +37,8 @@ def _preprocess_text(text, error_callback=None):
 
     if not text:
         return text
+    if isinstance(text, str) and _INVISIBLE_PATTERN.search(text) is None:
+        return text
 
     # 定义需要清除的不可见字符列表
 
@@ -428,58 +440,124 @@ class UnMatchedKeyword(BaseModel):
     rule_tag_columon:None = Field(None,description="容错，防止groupby报错")
 
 class ClassifiedResult(BaseModel):
-    classified_keywords: List[ClassifiedKeyword] = Field(..., description="分类结果")
-    unclassified_keywords: List[UnMatchedKeyword] = Field(..., description="未分类关键词")
-    
-    def group_by_output_name(self,match_type:Literal['match','unmatch']='match') -> dict[str, List[ClassifiedKeyword]]:
-        """按输出文件名聚类"""
-        result = {}
-        data = None
+    '''
+    分类结果，按列存储
+
+    args:
+        classified:分类成功的关键词，列为 CLASSIFIED_COLUMNS
+        unclassified:未分类关键词，列为 UNCLASSIFIED_COLUMNS
+
+    兼容按对象列表构造：ClassifiedResult(classified_keywords=[...],unclassified_keywords=[...])；
+    classified_keywords/unclassified_keywords 属性按需生成对象列表。
+    聚类和筛选基于一次哈希分组得到的行索引，结果缓存在实例上。
+    '''
+    CLASSIFIED_COLUMNS: ClassVar[List[str]] = list(ClassifiedKeyword.model_fields.keys())
+    UNCLASSIFIED_COLUMNS: ClassVar[List[str]] = list(UnMatchedKeyword.model_fields.keys())
+    GROUP_BY_FIELDS: ClassVar[Dict[str, List[str]]] = {
+        "output_name": ["output_name"],
+        "sheet": ["output_name", "classified_sheet_name"],
+        "parent_rule": ["output_name", "classified_sheet_name", "parent_rule"],
+    }
+    # 聚类键为空时的默认值，与原对象列表实现保持一致
+    GROUP_BY_DEFAULTS: ClassVar[Dict[str, str]] = {
+        "classified_sheet_name": "默认sheet",
+        "parent_rule": "无父规则",
+    }
+
+    classified: pd.DataFrame = Field(..., description="分类结果")
+    unclassified: pd.DataFrame = Field(..., description="未分类关键词")
+    _index_cache: Dict[tuple, Dict[Any, np.ndarray]] = PrivateAttr(default_factory=dict)
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @model_validator(mode='before')
+    @classmethod
+    def from_keyword_lists(cls, data: Any) -> Any:
+        """兼容 classified_keywords/unclassified_keywords 对象列表的构造方式"""
+        if not isinstance(data, dict):
+            return data
+        data = dict(data)
+        if 'classified' not in data:
+            data['classified'] = cls._models_to_frame(data.pop('classified_keywords', []), cls.CLASSIFIED_COLUMNS)
+        if 'unclassified' not in data:
+            data['unclassified'] = cls._models_to_frame(data.pop('unclassified_keywords', []), cls.UNCLASSIFIED_COLUMNS)
+        return data
+
+    def __repr_args__(self):
+        # 只显示行数，避免日志中格式化整张表
+        yield 'classified', f'<{len(self.classified)} rows>'
+        yield 'unclassified', f'<{len(self.unclassified)} rows>'
+
+    @staticmethod
+    def _models_to_frame(items: List[BaseModel], columns: List[str]) -> pd.DataFrame:
+        rows = [item.model_dump() if isinstance(item, BaseModel) else dict(item) for item in items]
+        return pd.DataFrame(rows, columns=columns)
+
+    @classmethod
+    def from_frames(cls, classified: pd.DataFrame, unclassified: pd.DataFrame) -> 'ClassifiedResult':
+        """直接由列式数据构造，缺失列补空值，不逐行校验"""
+        if list(classified.columns) != cls.CLASSIFIED_COLUMNS:
+            classified = classified.reindex(columns=cls.CLASSIFIED_COLUMNS)
+        if list(unclassified.columns) != cls.UNCLASSIFIED_COLUMNS:
+            unclassified = unclassified.reindex(columns=cls.UNCLASSIFIED_COLUMNS)
+        return cls(classified=classified, unclassified=unclassified)
+
+    def _get_frame(self, match_type: Literal['match','unmatch']) -> pd.DataFrame:
         if match_type == 'match':
-            data = self.classified_keywords
+            return self.classified
         elif match_type == 'unmatch':
-            data = self.unclassified_keywords
-        for keyword in data:
-            if keyword.output_name not in result:
-                result[keyword.output_name] = []
-            result[keyword.output_name].append(keyword)
-        return result
+            return self.unclassified
+        raise ValueError(f"不支持的匹配类型: {match_type}")
+
+    @staticmethod
+    def _frame_to_models(df: pd.DataFrame, model: type[BaseModel]) -> List[BaseModel]:
+        records = df.astype(object).where(df.notna(), None).to_dict('records')
+        return [model(**record) for record in records]
+
+    @property
+    def classified_keywords(self) -> List[ClassifiedKeyword]:
+        return self._frame_to_models(self.classified, ClassifiedKeyword)
+
+    @property
+    def unclassified_keywords(self) -> List[UnMatchedKeyword]:
+        return self._frame_to_models(self.unclassified, UnMatchedKeyword)
+
+    def _group_indices(self, fields: tuple, match_type: Literal['match','unmatch'], fill_defaults: bool) -> Dict[Any, np.ndarray]:
+        """一次哈希分组得到 键 -> 行号 的索引并缓存"""
+        cache_key = (match_type, fields, fill_defaults)
+        if cache_key not in self._index_cache:
+            df = self._get_frame(match_type)
+            if df.empty or any(field not in df.columns for field in fields):
+                self._index_cache[cache_key] = {}
+            else:
+                keys = df[list(fields)]
+                if fill_defaults:
+                    keys = keys.astype(object).fillna({field: self.GROUP_BY_DEFAULTS[field] for field in fields if field in self.GROUP_BY_DEFAULTS})
+                by = list(fields) if len(fields) > 1 else fields[0]
+                self._index_cache[cache_key] = keys.groupby(by, sort=False, dropna=True).indices
+        return self._index_cache[cache_key]
+
+    def group_frames(self, group_by: Literal['output_name','sheet','parent_rule'] = "output_name",
+                     match_type: Literal['match','unmatch'] = 'match') -> Dict[str|tuple, pd.DataFrame]:
+        """按聚类方式返回 键 -> DataFrame，不生成逐行对象"""
+        if group_by not in self.GROUP_BY_FIELDS:
+            raise ValueError(f"不支持的聚类方式: {group_by}，支持的聚类方式: {list(self.GROUP_BY_FIELDS.keys())}")
+        df = self._get_frame(match_type)
+        indices = self._group_indices(tuple(self.GROUP_BY_FIELDS[group_by]), match_type, True)
+        return {key: df.take(rows) for key, rows in indices.items()}
+
+    def group_by_output_name(self,match_type:Literal['match','unmatch']='match') -> dict[str, List[ClassifiedKeyword]]:
+        """按输出文件名聚类"""
+        return self.get_grouped_keywords("output_name", match_type)
     
     def group_by_output_name_and_sheet(self,match_type:Literal['match','unmatch']='match') -> dict[tuple[str, str], List[ClassifiedKeyword]]:
         """按输出文件名和sheet名聚类"""
-        result = {}
-        data = None
-        if match_type == 'match':
-            data = self.classified_keywords
-        elif match_type == 'unmatch':
-            data = self.unclassified_keywords
-        for keyword in data:
-            key = (keyword.output_name, keyword.classified_sheet_name or "默认sheet")
-            if key not in result:
-                result[key] = []
-            result[key].append(keyword)
-        return result
+        return self.get_grouped_keywords("sheet", match_type)
     
     def group_by_output_name_sheet_and_parent(self,match_type:Literal['match','unmatch']='match') -> dict[tuple[str, str, str], List[ClassifiedKeyword]]:
         """按输出文件名、sheet名和父规则聚类"""
-        result = {}
-        data = None
-        if match_type == 'match':
-            data = self.classified_keywords
-        elif match_type == 'unmatch':
-            data = self.unclassified_keywords
-        
-        
-        for keyword in data:
-            key = (
-                keyword.output_name, 
-                keyword.classified_sheet_name or "默认sheet",
-                keyword.parent_rule or "无父规则"
-            )
-            if key not in result:
-                result[key] = []
-            result[key].append(keyword)
-        return result
+        return self.get_grouped_keywords("parent_rule", match_type)
     
     def get_grouped_keywords(self, group_by: Literal['output_name','sheet','parent_rule'] = "output_name",match_type:Literal['match','unmatch']='match') -> dict[str|tuple,List[ClassifiedKeyword|UnMatchedKeyword]]:
         """获取聚类结果
@@ -490,17 +568,23 @@ class ClassifiedResult(BaseModel):
                 - sheet: 按输出文件名和sheet名聚类
                 - parent_rule: 按输出文件名、sheet名和父规则聚类
         """
-        group_methods = {
-            "output_name": self.group_by_output_name,
-            "sheet": self.group_by_output_name_and_sheet,
-            "parent_rule": self.group_by_output_name_sheet_and_parent
-        }
-        
-        if group_by not in group_methods:
-            raise ValueError(f"不支持的聚类方式: {group_by}，支持的聚类方式: {list(group_methods.keys())}")
-            
-        return group_methods[group_by](match_type)
-    
+        model = ClassifiedKeyword if match_type == 'match' else UnMatchedKeyword
+        return {key: self._frame_to_models(df, model) for key, df in self.group_frames(group_by, match_type).items()}
+
+    def _filter_rows(self, conditions: Dict[str, Any], match_type: Literal['match','unmatch'], require_all: bool) -> np.ndarray:
+        """按 字段 == 期望值 条件返回行号，条件为空时返回全部行"""
+        df = self._get_frame(match_type)
+        if not conditions:
+            return np.arange(len(df))
+        if require_all:
+            fields = tuple(conditions.keys())
+            key = tuple(conditions.values()) if len(fields) > 1 else next(iter(conditions.values()))
+            return self._group_indices(fields, match_type, False).get(key, np.array([], dtype=np.intp))
+        row_sets = [
+            self._group_indices((field,), match_type, False).get(expected, np.array([], dtype=np.intp))
+            for field, expected in conditions.items()
+        ]
+        return np.unique(np.concatenate(row_sets))
     
     def filter(
         self,
@@ -508,7 +592,7 @@ class ClassifiedResult(BaseModel):
         classified_conditions: Optional[Dict[str, Any]] = None,
         unclassified_conditions: Optional[Dict[str, Any]] = None,
         require_all: bool = True
-    ) -> Optional['ClassifiedResult']:
+    ) -> 'ClassifiedResult':
         """
         根据条件筛选分类结果
         
@@ -518,34 +602,13 @@ class ClassifiedResult(BaseModel):
             require_all: 是否要求所有条件都满足 (AND 操作)，False 表示满足任一条件即可 (OR 操作)
             
         Returns:
-            新的 ClassifiedResult 实例，包含筛选后的结果
+            新的 ClassifiedResult 实例，包含筛选后的结果；没有满足条件的行时为空结果，不返回None
         """
-        def matches(item: BaseModel, conditions: Dict[str, Any]) -> bool:
-            if not conditions:
-                return True
-                
-            comparisons = []
-            for field, expected in conditions.items():
-                actual = getattr(item, field, None)
-                if actual is not None and actual == expected:
-                    comparisons.append(True)
-                else:
-                    comparisons.append(False)
-            
-            return all(comparisons) if require_all else any(comparisons)
-
-        filtered_classified = [
-            kw for kw in self.classified_keywords 
-            if matches(kw, classified_conditions or {})
-        ]
-        
-        filtered_unclassified = [
-            kw for kw in self.unclassified_keywords 
-            if matches(kw, unclassified_conditions or {})
-        ]
+        classified_rows = self._filter_rows(classified_conditions or {}, 'match', require_all)
+        unclassified_rows = self._filter_rows(unclassified_conditions or {}, 'unmatch', require_all)
         return ClassifiedResult(
-            classified_keywords=filtered_classified,
-            unclassified_keywords=filtered_unclassified
+            classified=self.classified.take(classified_rows),
+            unclassified=self.unclassified.take(unclassified_rows)
         )
 
 class StageSaveResult(BaseModel):
@@ -561,4 +624,58 @@ class StageSaveResult(BaseModel):
     status:Literal["success", "fail", "warning"] = Field(...,description="处理结果")# 处理结果
     next_stage:int = Field(...,ge=1,description="下一个阶段名称")# 下一个阶段名称
     file_path:Dict = Field(...,description="文件路径")# 文件路径
-    message:str|None = Field(None,description="错误信息")# 错误信息
\ No newline at end of file
+    message:str|None = Field(None,description="错误信息")# 错误信息
+
+class WorkFlowPlanGroup(BaseModel):
+    '''
+    args:
+        level:工作流层级
+        output_name:输出文件名称，第一阶段为None
+        classified_sheet_name:分类sheet名称，第三阶段及以上有效
+        parent_rule:父级规则，第四阶段及以上有效
+        keyword_count:预计参与分类的关键词数量
+        sample_keyword_count:抽样中参与分类的关键词数量
+        rule_count:参与匹配的规则数量
+        estimated_seconds:按抽样耗时推算的分类耗时(秒)
+        projected_outputs:预计输出规模，第一阶段为{输出文件:行数}，第二阶段为{sheet:行数}，更高阶段为{匹配规则:关键词数}
+        oversized_outputs:预计超出Excel行数上限的输出
+    '''
+    level:int = Field(...,ge=1,description="工作流层级")
+    output_name:str|None = Field(None,description="输出文件名称")
+    classified_sheet_name:str|None = Field(None,description="分类sheet名称")
+    parent_rule:str|None = Field(None,description="父级规则")
+    keyword_count:int = Field(...,ge=0,description="预计参与分类的关键词数量")
+    sample_keyword_count:int = Field(...,ge=0,description="抽样中参与分类的关键词数量")
+    rule_count:int = Field(...,ge=0,description="参与匹配的规则数量")
+    estimated_seconds:float = Field(...,ge=0,description="预计分类耗时(秒)")
+    projected_outputs:Dict[str,int] = Field(default_factory=dict,description="预计输出规模")
+    oversized_outputs:List[str] = Field(default_factory=list,description="预计超出Excel行数上限的输出")
+
+class WorkFlowPlan(BaseModel):
+    '''
+    args:
+        total_keywords:待分类关键词总数
+        sample_size:抽样关键词数量
+        max_level:最大工作流层级
+        max_excel_rows:Excel单个sheet可写入的数据行数上限
+        groups:各层级各分组的执行计划
+    '''
+    total_keywords:int = Field(...,ge=0,description="待分类关键词总数")
+    sample_size:int = Field(...,ge=0,description="抽样关键词数量")
+    max_level:int = Field(...,ge=1,description="最大工作流层级")
+    max_excel_rows:int = Field(...,ge=1,description="Excel单个sheet数据行数上限")
+    groups:List[WorkFlowPlanGroup] = Field(default_factory=list,description="执行计划分组")
+
+    @property
+    def estimated_seconds(self)->float:
+        """预计总分类耗时(秒)"""
+        return sum(group.estimated_seconds for group in self.groups)
+
+    @property
+    def oversized_groups(self)->List[WorkFlowPlanGroup]:
+        """预计会超出Excel行数上限的分组"""
+        return [group for group in self.groups if group.oversized_outputs]
+
+    def get_groups_by_level(self, level:int)->List[WorkFlowPlanGroup]:
+        """获取指定层级的执行计划分组"""
+        return [group for group in self.groups if group.level == level]
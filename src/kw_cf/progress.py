@@ -0,0 +1,130 @@
+import threading
+import time
+from typing import Any, Callable, List, Optional, TypedDict
+
+from .logger_config import logger
+
+
+class WorkflowCancelled(Exception):
+    """工作流被CancellationToken取消"""
+
+
+class CancellationToken:
+    """协作式取消标记
+
+    处理器在分块、分组、阶段之间检查标记，取消后抛出WorkflowCancelled；正在写入的结果文件会被丢弃，
+    已完成的结果文件保持上一次完整写入的内容。默认使用threading.Event，
+    跨进程取消时可传入multiprocessing.Event或Manager().Event()。
+    """
+
+    def __init__(self, event: Any = None):
+        self.event = event if event is not None else threading.Event()
+
+    def cancel(self):
+        self.event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.event.is_set()
+
+    def raise_if_cancelled(self):
+        if self.event.is_set():
+            raise WorkflowCancelled('工作流已取消')
+
+
+class ProgressEvent(TypedDict):
+    stage: str                          # 如 stage1、stage2、save_stage2、single_pass、done
+    level: int                          # 工作流层级
+    group: Optional[str]                # 当前分组（批次、输出文件、sheet、父规则），阶段开始时为None
+    keywords_processed: int             # 本阶段已处理的关键词数
+    keywords_total: Optional[int]       # 本阶段关键词总数，未知时为None
+    groups_done: int                    # 本阶段已完成的分组数
+    groups_total: Optional[int]         # 本阶段分组总数，未知时为None
+    throughput: Optional[float]         # 本阶段每秒处理的关键词数
+    eta_seconds: Optional[float]        # 本阶段预计剩余秒数，总数未知时为None
+    elapsed_seconds: float              # 从工作流开始的秒数
+    message: str
+
+
+class ProgressReporter:
+    """汇总阶段内的进度并通知回调，同时负责检查取消标记
+
+    回调在处理线程（或进程）中同步调用，抛出的异常只记录日志，不影响处理。
+    """
+
+    def __init__(self, callbacks: Optional[List[Callable[[ProgressEvent], None]]] = None,
+                 cancel_token: Optional[CancellationToken] = None):
+        self.callbacks: List[Callable[[ProgressEvent], None]] = list(callbacks or [])
+        self.cancel_token = cancel_token
+        self._workflow_start = time.perf_counter()
+        self._stage_start = self._workflow_start
+        self._stage = ''
+        self._level = 0
+        self._keywords_processed = 0
+        self._keywords_total: Optional[int] = None
+        self._groups_done = 0
+        self._groups_total: Optional[int] = None
+
+    def check_cancelled(self):
+        if self.cancel_token is not None:
+            self.cancel_token.raise_if_cancelled()
+
+    def start_workflow(self):
+        self._workflow_start = time.perf_counter()
+
+    def start_stage(self, stage: str, level: int, keywords_total: Optional[int] = None,
+                    groups_total: Optional[int] = None, message: str = ''):
+        """开始新阶段，计数清零"""
+        self.check_cancelled()
+        self._stage = stage
+        self._level = level
+        self._stage_start = time.perf_counter()
+        self._keywords_processed = 0
+        self._keywords_total = keywords_total
+        self._groups_done = 0
+        self._groups_total = groups_total
+        self._emit(None, message)
+
+    def advance(self, keywords: int = 0, groups: int = 1, group: Optional[str] = None, message: str = ''):
+        """本阶段完成了groups个分组、keywords个关键词"""
+        self._keywords_processed += keywords
+        self._groups_done += groups
+        self._emit(group, message)
+
+    def finish(self, message: str = ''):
+        self._stage = 'done'
+        self._emit(None, message)
+
+    def _eta(self, elapsed: float) -> Optional[float]:
+        # 关键词总数已知时按关键词比例估算，否则按分组比例估算
+        if self._keywords_total and self._keywords_processed:
+            done, total = self._keywords_processed, self._keywords_total
+        elif self._groups_total and self._groups_done:
+            done, total = self._groups_done, self._groups_total
+        else:
+            return None
+        return max(elapsed * (total - done) / done, 0.0)
+
+    def _emit(self, group: Optional[str], message: str):
+        if not self.callbacks:
+            return
+        now = time.perf_counter()
+        stage_elapsed = now - self._stage_start
+        event: ProgressEvent = {
+            'stage': self._stage,
+            'level': self._level,
+            'group': group,
+            'keywords_processed': self._keywords_processed,
+            'keywords_total': self._keywords_total,
+            'groups_done': self._groups_done,
+            'groups_total': self._groups_total,
+            'throughput': round(self._keywords_processed / stage_elapsed, 1) if stage_elapsed > 0 else None,
+            'eta_seconds': self._eta(stage_elapsed),
+            'elapsed_seconds': round(now - self._workflow_start, 3),
+            'message': message,
+        }
+        for callback in self.callbacks:
+            try:
+                callback(event)
+            except Exception as e:
+                logger.warning('进度回调出错: %s', e)
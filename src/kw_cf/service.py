@@ -0,0 +1,239 @@
+"""本地HTTP分类服务
+
+服务启动时读取工作流规则文件并编译为WorkFlowTree常驻内存，之后每个请求直接用已编译的规则分类，
+不再重复读取Excel和解析规则。规则文件修改后在后台重新编译，编译完成后整体替换，
+处理中的请求继续使用替换前的规则，不会出现新旧规则混用；新文件读取或解析失败时保留原规则。
+
+接口（请求和响应均为JSON）:
+    GET  /health    服务状态、规则版本、规则数、最近一次重新加载的错误
+    POST /classify  {"keywords": ["..."]} -> {"version": 1, "columns": [...], "results": [{"关键词": ..., "阶段1": ...}]}
+                    keywords中有非字符串（null、数字、对象）时返回400
+    POST /reload    立即重新读取规则文件
+
+只使用标准库http.server，默认只监听127.0.0.1。
+"""
+import json
+import math
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import models
+from .excel_handler import ExcelHandler
+from .keyword_classifier import KeywordClassifier
+from .logger_config import logger
+from .workflow_tree import WorkFlowTree
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# 检查规则文件是否修改的间隔秒数
+DEFAULT_RELOAD_INTERVAL = 1.0
+# 单个请求的关键词数和请求体字节数上限
+MAX_BATCH_KEYWORDS = 100000
+MAX_BODY_BYTES = 64 * 1024 * 1024
+
+
+def _is_missing(value: Any) -> bool:
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+class RuleSet:
+    """一次加载的已编译规则，加载后不再修改"""
+
+    def __init__(self, version: int, rules_file: Path, signature: tuple, tree: WorkFlowTree):
+        self.version = version
+        self.rules_file = rules_file
+        self.signature = signature
+        self.tree = tree
+        self.loaded_at = time.time()
+
+    def classify(self, keywords: List[Any]) -> List[Dict[str, Any]]:
+        """关键词与工作流一致地预处理（清除不可见字符、去除空值、保序去重）后沿分类树分类
+
+        None和NaN视为空值去除，不会被转换为字符串"None"、"nan"分类
+        """
+        data = models.UnclassifiedKeywords(data=[keyword for keyword in keywords if not _is_missing(keyword)]).data
+        columns = self.tree.columns
+        return [dict(zip(columns, self.tree.classify_keyword(keyword))) for keyword in data]
+
+    def classify_each(self, keywords: List[Any]) -> List[Dict[str, Any]]:
+        """逐个分类，不去重，结果与输入一一对应、顺序相同；None和空白关键词的各阶段为None"""
+        columns = self.tree.columns
+        return [dict(zip(columns, self.tree.classify_text('' if keyword is None else str(keyword))))
+                for keyword in keywords]
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            'version': self.version,
+            'rules_file': str(self.rules_file),
+            'loaded_at': self.loaded_at,
+            'max_level': self.tree.max_level,
+            'rule_count': len(self.tree.workflow_rules.rules),
+            'parse_errors': self.tree.parse_errors,
+        }
+
+
+class RuleSetStore:
+    """持有当前规则集，规则文件修改时重新编译并整体替换
+
+    读取current不加锁：替换是一次引用赋值，每个请求开始时取一次引用，整个请求使用同一个规则集。
+    """
+
+    def __init__(self, rules_file: Path, case_sensitive: bool = False, separator: str = '&',
+                 excel_handler: Optional[ExcelHandler] = None):
+        self.rules_file = Path(rules_file)
+        self.case_sensitive = case_sensitive
+        self.separator = separator
+        # 规则集常驻内存，不需要再缓存工作簿
+        self.excel_handler = excel_handler or ExcelHandler(cache_size=0)
+        self.last_error: Optional[str] = None
+        self._failed_signature: Optional[tuple] = None
+        self._lock = threading.Lock()
+        self.current: RuleSet = self._load(version=1)
+
+    def _load(self, version: int) -> RuleSet:
+        signature = ExcelHandler._file_signature(self.rules_file)
+        workflow_rules = self.excel_handler.read_workflow_rules(self.rules_file)
+        classifier = KeywordClassifier(case_sensitive=self.case_sensitive, separator=self.separator)
+        rule_set = RuleSet(version, self.rules_file, signature, WorkFlowTree(workflow_rules, classifier))
+        logger.info('已加载规则文件:%s,版本:%d,规则数:%d', self.rules_file, version, len(workflow_rules.rules))
+        return rule_set
+
+    def reload(self, force: bool = False) -> bool:
+        """规则文件修改过（或force）时重新加载，返回是否替换了规则集
+
+        读取或解析失败时保留当前规则集并记录last_error，同一个失败的文件版本不重复尝试。
+        """
+        with self._lock:
+            try:
+                signature = ExcelHandler._file_signature(self.rules_file)
+            except OSError as e:
+                self.last_error = f'无法读取规则文件: {e}'
+                return False
+            if not force and signature in (self.current.signature, self._failed_signature):
+                return False
+            try:
+                rule_set = self._load(self.current.version + 1)
+            except Exception as e:
+                self._failed_signature = signature
+                self.last_error = f'重新加载规则文件失败，继续使用版本{self.current.version}: {e}'
+                logger.warning(self.last_error)
+                return False
+            self.current = rule_set
+            self._failed_signature = None
+            self.last_error = None
+            return True
+
+    def watch(self, stop_event: threading.Event, interval: float = DEFAULT_RELOAD_INTERVAL):
+        """每interval秒检查一次规则文件，直到stop_event被设置"""
+        while not stop_event.wait(interval):
+            self.reload()
+
+
+class ClassificationRequestHandler(BaseHTTPRequestHandler):
+    server: 'ClassificationServer'
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.debug('%s - %s', self.address_string(), format % args)
+
+    def _send_json(self, status: HTTPStatus, payload: Dict[str, Any]):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY_BYTES:
+            return None, f'请求体超过{MAX_BODY_BYTES}字节'
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            return None, f'请求体不是有效的JSON: {e}'
+        if not isinstance(payload, dict):
+            return None, '请求体必须是JSON对象'
+        return payload, None
+
+    def do_GET(self):
+        if self.path != '/health':
+            self._send_json(HTTPStatus.NOT_FOUND, {'error': f'未知路径: {self.path}'})
+            return
+        store = self.server.store
+        self._send_json(HTTPStatus.OK, {'status': 'ok', **store.current.info(), 'last_error': store.last_error})
+
+    def do_POST(self):
+        if self.path == '/reload':
+            store = self.server.store
+            reloaded = store.reload(force=True)
+            status = HTTPStatus.OK if reloaded else HTTPStatus.INTERNAL_SERVER_ERROR
+            self._send_json(status, {'reloaded': reloaded, **store.current.info(), 'last_error': store.last_error})
+            return
+        if self.path != '/classify':
+            self._send_json(HTTPStatus.NOT_FOUND, {'error': f'未知路径: {self.path}'})
+            return
+        payload, error = self._read_json()
+        if error is not None:
+            self._send_json(HTTPStatus.BAD_REQUEST, {'error': error})
+            return
+        keywords = payload.get('keywords')
+        if not isinstance(keywords, list):
+            self._send_json(HTTPStatus.BAD_REQUEST, {'error': 'keywords必须是关键词列表'})
+            return
+        invalid = [index for index, keyword in enumerate(keywords) if not isinstance(keyword, str)]
+        if invalid:
+            self._send_json(HTTPStatus.BAD_REQUEST,
+                            {'error': f'keywords中的关键词必须是字符串，第{invalid[0]}个（从0开始）为{json.dumps(keywords[invalid[0]], ensure_ascii=False)}',
+                             'invalid_indexes': invalid[:100]})
+            return
+        if len(keywords) > MAX_BATCH_KEYWORDS:
+            self._send_json(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                            {'error': f'单次请求最多{MAX_BATCH_KEYWORDS}个关键词，当前{len(keywords)}个'})
+            return
+        rule_set = self.server.store.current
+        self._send_json(HTTPStatus.OK, {
+            'version': rule_set.version,
+            'columns': rule_set.tree.columns,
+            'results': rule_set.classify(keywords),
+        })
+
+
+class ClassificationServer(ThreadingHTTPServer):
+    """每个请求一个线程的分类服务，另有一个后台线程监视规则文件"""
+
+    daemon_threads = True
+
+    def __init__(self, store: RuleSetStore, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                 reload_interval: float = DEFAULT_RELOAD_INTERVAL):
+        super().__init__((host, port), ClassificationRequestHandler)
+        self.store = store
+        self._stop_watching = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        if reload_interval > 0:
+            self._watcher = threading.Thread(target=store.watch, args=(self._stop_watching, reload_interval),
+                                             name='kw_cf-rules-watcher', daemon=True)
+            self._watcher.start()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def server_close(self):
+        self._stop_watching.set()
+        if self._watcher is not None:
+            self._watcher.join()
+        super().server_close()
+
+
+def create_server(rules_file: Path, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                  case_sensitive: bool = False, separator: str = '&',
+                  reload_interval: float = DEFAULT_RELOAD_INTERVAL) -> ClassificationServer:
+    """加载规则并创建服务，port为0时由系统分配端口；调用serve_forever()开始处理请求"""
+    store = RuleSetStore(rules_file, case_sensitive=case_sensitive, separator=separator)
+    return ClassificationServer(store, host=host, port=port, reload_interval=reload_interval)
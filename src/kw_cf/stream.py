@@ -0,0 +1,91 @@
+"""JSON lines流式分类，用于Unix管道
+
+每行输入一个关键词，可以是:
+    纯文本            北京java培训
+    JSON字符串        "北京java培训"
+    JSON对象          {"关键词": "北京java培训", "id": 1}，关键词字段由keyword_field指定
+每行输出一个JSON对象：纯文本和JSON字符串输出 关键词、结果文件名称、分类sheet名称、阶段1...阶段N，
+JSON对象在原对象上追加分类字段。输入输出逐行对应，不去重；按批分类并写出，内存占用与输入大小无关。
+"""
+import json
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .logger_config import logger
+from .workflow_tree import WorkFlowTree
+
+DEFAULT_KEYWORD_FIELD = '关键词'
+DEFAULT_BATCH_SIZE = 1000
+
+
+def parse_line(line: str, keyword_field: str = DEFAULT_KEYWORD_FIELD) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """解析一行输入，返回 (关键词, 原JSON对象或None)
+
+    Raises:
+        ValueError: JSON无法解析、不是字符串或对象、对象缺少关键词字段
+    """
+    text = line.rstrip('\r\n')
+    if not text.lstrip().startswith(('{', '"')):
+        return text, None
+    value = json.loads(text)
+    if isinstance(value, str):
+        return value, None
+    if not isinstance(value, dict):
+        raise ValueError('JSON行必须是字符串或对象')
+    if keyword_field not in value:
+        raise ValueError(f'JSON对象缺少关键词字段: {keyword_field}')
+    return str(value[keyword_field]), value
+
+
+class LineClassifier:
+    """按批分类JSON lines输入
+
+    Args:
+        tree: 已编译的分类树
+        keyword_field: JSON对象中的关键词字段
+        batch_size: 每批的行数，每批输出一次
+        error_callback: 无法解析的行的回调，参数为(行号, 错误信息)；该行跳过，不输出
+    """
+
+    def __init__(self, tree: WorkFlowTree, keyword_field: str = DEFAULT_KEYWORD_FIELD,
+                 batch_size: int = DEFAULT_BATCH_SIZE, error_callback: Optional[Callable[[int, str], None]] = None):
+        self.tree = tree
+        self.keyword_field = keyword_field
+        self.batch_size = batch_size
+        self.error_callback = error_callback
+        self.lines_read = 0
+        self.lines_written = 0
+        self.lines_skipped = 0
+
+    def classify_record(self, keyword: str, record: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        result = dict(zip(self.tree.columns, self.tree.classify_text(keyword)))
+        if record is None:
+            return result
+        del result['关键词']
+        return {**record, **result}
+
+    def classify_batch(self, lines: List[str]) -> List[str]:
+        output = []
+        for line in lines:
+            self.lines_read += 1
+            try:
+                keyword, record = parse_line(line, self.keyword_field)
+            except ValueError as e:
+                self.lines_skipped += 1
+                logger.warning('第%d行无法解析，已跳过: %s', self.lines_read, e)
+                if self.error_callback:
+                    self.error_callback(self.lines_read, str(e))
+                continue
+            output.append(json.dumps(self.classify_record(keyword, record), ensure_ascii=False) + '\n')
+        self.lines_written += len(output)
+        return output
+
+    def classify_lines(self, lines: Iterable[str]) -> Iterator[List[str]]:
+        """逐批返回输出行（含换行符），每批最多batch_size行"""
+        batch = []
+        for line in lines:
+            batch.append(line)
+            if len(batch) >= self.batch_size:
+                yield self.classify_batch(batch)
+                batch = []
+        if batch:
+            yield self.classify_batch(batch)
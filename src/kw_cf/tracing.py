@@ -0,0 +1,129 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List
+
+# 汇总时按名称累加的数值参数
+SUMMED_ARGS = ('keyword_count', 'rule_count', 'matched_count', 'rows', 'bytes_written')
+
+
+class Tracer:
+    """记录工作流各阶段、分组、读取、分类、写入的耗时区间
+
+    每个区间保存为一个Chrome trace事件（ph='X'），可导出为trace文件在chrome://tracing或Perfetto中按时间轴查看，
+    也可按名称汇总为JSON指标。区间参数（关键词数、规则数、写入字节数等）在区间内通过yield的字典补充。
+    时间戳使用墙上时钟，进程池子进程的事件合并后与主进程在同一时间轴上。
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.events: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, category: str = 'workflow', **args) -> Iterator[Dict[str, Any]]:
+        """记录一个区间，返回的字典即区间参数，可在区间内追加
+
+        Example:
+            with tracer.span('classify', 'classify', level=2) as span_args:
+                ...
+                span_args['keyword_count'] = len(keywords)
+        """
+        if not self.enabled:
+            yield args
+            return
+        ts = time.time_ns() // 1000
+        start = time.perf_counter()
+        try:
+            yield args
+        except BaseException as e:
+            args['error'] = str(e)
+            raise
+        finally:
+            event = {
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': ts,
+                'dur': round((time.perf_counter() - start) * 1_000_000),
+                'pid': os.getpid(),
+                'tid': threading.get_native_id(),
+                'args': args,
+            }
+            with self._lock:
+                self.events.append(event)
+
+    def trace_iter(self, iterable: Iterable, name: str, category: str = 'read', **args) -> Iterator:
+        """逐个返回iterable的元素，每次取下一个元素的耗时记录为一个区间，元素的长度记为rows"""
+        iterator = iter(iterable)
+        index = 0
+        while True:
+            with self.span(name, category, index=index, **args) as span_args:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    span_args['exhausted'] = True
+                    return
+                if hasattr(item, '__len__'):
+                    span_args['rows'] = len(item)
+            yield item
+            index += 1
+
+    def extend(self, events: Iterable[Dict[str, Any]]):
+        """合并其他Tracer（如进程池子进程）记录的事件"""
+        with self._lock:
+            self.events.extend(events)
+
+    def clear(self):
+        with self._lock:
+            self.events.clear()
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """按区间名称汇总：次数、总耗时、最大耗时，以及关键词数、规则数、写入字节数等参数之和"""
+        summary: Dict[str, Dict[str, Any]] = {}
+        for event in sorted(self.events, key=lambda event: event['ts']):
+            item = summary.setdefault(event['name'], {
+                'category': event['cat'], 'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0
+            })
+            seconds = event['dur'] / 1_000_000
+            item['count'] += 1
+            item['total_seconds'] += seconds
+            item['max_seconds'] = max(item['max_seconds'], seconds)
+            for key in SUMMED_ARGS:
+                value = event['args'].get(key)
+                if isinstance(value, (int, float)):
+                    item[key] = item.get(key, 0) + value
+        for item in summary.values():
+            item['total_seconds'] = round(item['total_seconds'], 6)
+            item['max_seconds'] = round(item['max_seconds'], 6)
+        return summary
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """Chrome trace-event格式，每个进程附加一个进程名称元数据事件"""
+        main_pid = os.getpid()
+        pids = sorted({event['pid'] for event in self.events})
+        metadata = [
+            {'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0,
+             'args': {'name': 'kw_cf' if pid == main_pid else f'kw_cf worker {pid}'}}
+            for pid in pids
+        ]
+        return {'traceEvents': metadata + sorted(self.events, key=lambda event: event['ts']), 'displayTimeUnit': 'ms'}
+
+    def export_metrics(self, file_path: Path) -> Path:
+        """将汇总指标写入JSON文件"""
+        return _write_json(file_path, {'spans': self.summary()})
+
+    def export_chrome_trace(self, file_path: Path) -> Path:
+        """将全部区间写入Chrome trace-event JSON文件"""
+        return _write_json(file_path, self.chrome_trace())
+
+
+def _write_json(file_path: Path, payload: Dict[str, Any]) -> Path:
+    file_path = Path(file_path)
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    file_path.write_text(json.dumps(payload, ensure_ascii=False, default=str), encoding='utf-8')
+    return file_path
+
@@ -0,0 +1,119 @@
+"""进程池分类的共享内存传输
+
+进程池直接传递关键词列表和分类结果时，两个方向都要pickle，短中文关键词的序列化耗时与匹配本身相当。
+这里关键词放在关键词库中（内存映射文件或共享内存），分类结果写入共享内存中的int32路径编号数组，
+任务只传递 (起始编号, 结束编号)，返回只有本批新出现的分类路径（数量只与规则有关）：
+
+    主进程                                      子进程（启动时编译一次分类树）
+    关键词库 + 结果数组(SharedMemory)  ──名称──▶  映射关键词库和结果数组
+    submit(start, stop)               ─────────▶  解码[start,stop)的关键词，分类，写入结果数组
+    按子进程合并路径表，换算为全局编号  ◀─────────  (pid, start, stop, 新路径)
+"""
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from . import models
+from .keyword_classifier import KeywordClassifier
+from .keyword_store import KeywordStore, StoreSource
+from .progress import ProgressReporter
+from .workflow_tree import PathTable, WorkFlowTree
+
+# 子进程的状态，由_init_worker设置
+_worker_state: Dict = {}
+
+
+def _init_worker(workflow_rules: models.WorkFlowRules, case_sensitive: bool, separator: str,
+                 store_source: StoreSource, result_name: str, count: int):
+    _worker_state.update(
+        tree=WorkFlowTree(workflow_rules, KeywordClassifier(case_sensitive=case_sensitive, separator=separator)),
+        paths=PathTable(),
+        reported=0,
+        store_source=store_source,
+        result_name=result_name,
+        count=count,
+    )
+
+
+def _classify_range(start: int, stop: int) -> Tuple[int, int, int, int, List[tuple]]:
+    """分类编号在[start,stop)内的关键词，路径编号（子进程内的编号）直接写入共享结果数组
+
+    Returns:
+        (pid, start, stop, 新路径在子进程路径表中的起始编号, 新路径)
+    """
+    state = _worker_state
+    # 每个任务重新映射，任务之间不保留对共享内存的引用
+    with KeywordStore.open(state['store_source']) as store:
+        keywords = store.keywords(start, stop)
+    path_ids = state['tree'].classify_path_ids(keywords, state['paths'])
+    memory = shared_memory.SharedMemory(name=state['result_name'])
+    try:
+        result = np.ndarray((state['count'],), dtype=np.int32, buffer=memory.buf)
+        result[start:stop] = path_ids
+        del result
+    finally:
+        memory.close()
+    offset = state['reported']
+    new_paths = state['paths'].paths[offset:]
+    state['reported'] = len(state['paths'])
+    return os.getpid(), start, stop, offset, new_paths
+
+
+def classify_store_parallel(store: KeywordStore, workflow_rules: models.WorkFlowRules, workers: int,
+                            chunk_size: int, case_sensitive: bool = False, separator: str = '&',
+                            progress: Optional[ProgressReporter] = None) -> Tuple[np.ndarray, PathTable]:
+    """多进程按编号分类关键词库，结果与WorkFlowTree.classify_path_ids逐批分类相同
+
+    Args:
+        store: 关键词库，子进程按source重新打开
+        workers: 进程数
+        chunk_size: 每个任务的关键词数
+        progress: 每完成一个任务报告一次进度，等待期间检查取消
+
+    Returns:
+        (每个关键词的路径编号，int32数组, 路径表)
+    """
+    count = len(store)
+    progress = progress or ProgressReporter()
+    result_memory = shared_memory.SharedMemory(create=True, size=max(count, 1) * np.dtype(np.int32).itemsize)
+    try:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                       initargs=(workflow_rules, case_sensitive, separator, store.source,
+                                                 result_memory.name, count))
+        worker_paths: Dict[int, List[tuple]] = {}
+        ranges: List[Tuple[int, int, int]] = []
+        try:
+            pending = {executor.submit(_classify_range, start, min(start + chunk_size, count))
+                       for start in range(0, count, chunk_size)}
+            while pending:
+                done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                progress.check_cancelled()
+                for future in done:
+                    pid, start, stop, offset, new_paths = future.result()
+                    paths = worker_paths.setdefault(pid, [])
+                    if len(paths) < offset + len(new_paths):
+                        paths.extend([None] * (offset + len(new_paths) - len(paths)))
+                    paths[offset:offset + len(new_paths)] = new_paths
+                    ranges.append((pid, start, stop))
+                    progress.advance(keywords=stop - start, group=f'第{start // chunk_size + 1}批')
+        except BaseException:
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+        executor.shutdown(wait=True)
+
+        # 各子进程的路径编号换算为全局路径表的编号
+        path_table = PathTable()
+        remaps = {pid: np.array([path_table.intern(path) for path in paths], dtype=np.int32)
+                  for pid, paths in worker_paths.items()}
+        local_ids = np.ndarray((count,), dtype=np.int32, buffer=result_memory.buf)
+        path_ids = np.empty(count, dtype=np.int32)
+        for pid, start, stop in ranges:
+            path_ids[start:stop] = remaps[pid][local_ids[start:stop]]
+        del local_ids
+        return path_ids, path_table
+    finally:
+        result_memory.close()
+        result_memory.unlink()
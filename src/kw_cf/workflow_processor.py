@@ -1,12 +1,22 @@
 from pathlib import Path
 
 from .keyword_classifier import KeywordClassifier
-from .excel_handler import ExcelHandler
+from .excel_handler import ExcelHandler, EXCEL_MAX_ROWS, OUTPUT_FORMATS, KEYWORD_BATCH_SIZE
+from .workflow_tree import PathTable, WorkFlowTree, UNMATCHED_NAME, expand_all_rules, rule_catalog
+from .keyword_store import KEYWORD_STORE_SUFFIX, KeywordStore, is_keyword_store
+from .worker_transport import classify_store_parallel
 from .logger_config import logger
-from typing import List,Dict,TypedDict,Optional,Callable,cast
+from .tracing import Tracer
+from .progress import CancellationToken, ProgressEvent, ProgressReporter, WorkflowCancelled
+from typing import Any,Iterator,List,Dict,Tuple,TypedDict,Optional,Callable,Literal,cast
 from . import models
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
 import pandas as pd
 import datetime
+import multiprocessing
+import os
+import time
 
 
 class StageOneRestsultTypeDict(TypedDict):
@@ -26,30 +36,115 @@ class StageHighResultTypeDict(TypedDict):
 class Stage2OutputNameDict(TypedDict):
     file_path:str
     classified_sheet_name:List[str]
-    
-    
+
+
+def _group_indices(keys: np.ndarray, group_count: int) -> List[np.ndarray]:
+    """按组编号(0..group_count-1)归并关键词编号，组内保持输入顺序；编号为-1的关键词不属于任何组"""
+    order = np.argsort(keys, kind='stable')
+    bounds = np.cumsum(np.bincount(keys + 1, minlength=group_count + 1))
+    return [order[bounds[group]:bounds[group + 1]] for group in range(group_count)]
+
+
+class SeenKeywordHashes:
+    """跨批次去重用的已出现关键词集合，只保存每个关键词的64位哈希（有序int64数组，每个关键词8字节），不保留字符串
+
+    哈希为进程内的hash(str)；不同关键词哈希相同（千万级关键词的概率约为百万分之三）时，后出现的关键词被视为重复。
+    """
+    def __init__(self):
+        self._hashes = np.empty(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def add_new(self, keywords: List[str]) -> List[str]:
+        """返回未出现过的关键词（保持顺序）并加入集合，keywords需已在批内去重"""
+        if not keywords:
+            return []
+        hashes = np.fromiter(map(hash, keywords), dtype=np.int64, count=len(keywords))
+        if len(self._hashes):
+            positions = np.minimum(np.searchsorted(self._hashes, hashes), len(self._hashes) - 1)
+            seen = self._hashes[positions] == hashes
+        else:
+            seen = np.zeros(len(hashes), dtype=bool)
+        # 新哈希不在集合中，合并后排序即可，比union1d快
+        self._hashes = np.sort(np.concatenate((self._hashes, np.unique(hashes[~seen]))))
+        return [keyword for keyword, is_seen in zip(keywords, seen.tolist()) if not is_seen]
+
+
+class StageColumnWritePlan:
+    """阶段列写入计划
+
+    收集每个工作簿每个sheet需要新增的列（如'阶段3'、'阶段4'），
+    之后按工作簿一次性读取、追加全部列并保存，避免每个sheet/父规则都重新打开整个工作簿。
+    """
+    def __init__(self):
+        # Dict[excel_path,Dict[sheet_name,Dict[new_column_name,Dict[keyword,matched_rule]]]]
+        self.plans:Dict[Path,Dict[str,Dict[str,Dict[str,str]]]] = {}
+
+    def add(self,excel_path:Path|str,sheet_name:str,new_column_name:str,keyword_to_rule:Dict[str,str]):
+        """登记一列写入，同一sheet同一列的多次登记会合并映射（如多个父规则写入同一'阶段N'列）"""
+        column_mappings = self.plans.setdefault(Path(excel_path),{}).setdefault(sheet_name,{})
+        column_mappings.setdefault(new_column_name,{}).update(keyword_to_rule)
+
+    def items(self):
+        return self.plans.items()
+
+    def __bool__(self)->bool:
+        return bool(self.plans)
+
 
 class WorkFlowProcessor:
     def __init__(self,
                  excel_handler: ExcelHandler | None = None,
                  keyword_classifier: KeywordClassifier | None = None,
-                 error_callback: Optional[Callable] = None
+                 error_callback: Optional[Callable] = None,
+                 max_workers: Optional[int] = None,
+                 output_format: str = 'xlsx',
+                 chunk_size: int = KEYWORD_BATCH_SIZE,
+                 output_dir: Path | str | None = None,
+                 tracer: Tracer | None = None,
+                 progress_callback: Optional[Callable[[ProgressEvent], None]] = None,
+                 cancel_token: CancellationToken | None = None,
+                 keyword_store: bool = False
                  ):
         """初始化工作流处理器
         
         Args:
             classifier: 关键词分类器实例，如果为None则创建新实例
             excel_handler: Excel处理器实例，如果为None则创建新实例
+            max_workers: 阶段2及以后并行处理输出文件的进程数，单次遍历时为并行分类的进程数；None为CPU核数，1为单进程顺序处理
+            output_format: 结果格式，xlsx/csv/csv.gz/tsv/tsv.gz/parquet，非xlsx格式每个结果文件为一个目录，每个sheet一个文件
+            chunk_size: 第一阶段分块读取、分类、写入的关键词数
+            output_dir: 结果目录，默认为./工作流结果
+            tracer: 记录各阶段、分组、读取、分类、写入耗时的Tracer，None时不记录；可导出JSON指标和Chrome trace
+            progress_callback: 进度回调，参数为ProgressEvent（阶段、分组、已处理关键词数、吞吐量、预计剩余时间）
+            cancel_token: 取消标记，在分块、分组、阶段之间检查，取消后抛出WorkflowCancelled，未写完的结果文件被丢弃
+            keyword_store: 单次遍历时先将待分类文件转存为内存映射的关键词库，按编号分类和分组，每个关键词只保存一个路径编号；
+                待分类文件本身是.kwstore关键词库时总是按编号处理
         """
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"不支持的输出格式: {output_format}，可选: {', '.join(OUTPUT_FORMATS)}")
         self.excel_handler:ExcelHandler = excel_handler or ExcelHandler(error_callback)
         self.classifier:KeywordClassifier = keyword_classifier or KeywordClassifier(error_callback=error_callback)
         self.error_callback:Optional[Callable] = error_callback
+        self.tracer:Tracer = tracer if tracer is not None else Tracer(enabled=False)
+        self.excel_handler.tracer = self.tracer
+        self.cancel_token:Optional[CancellationToken] = cancel_token
+        self.progress:ProgressReporter = ProgressReporter([progress_callback] if progress_callback else [], cancel_token)
+        self.max_workers:Optional[int] = max_workers
+        self.output_format:str = output_format
+        self.chunk_size:int = chunk_size
+        self.keyword_store:bool = keyword_store
         self.workflow_rules:Optional[models.WorkFlowRules] = None
         self.process_result_file:Optional[Dict[str,pd.DataFrame]] = None
         self.process_result_classified_file:Optional[Dict[str,Dict[str,List[str]|str]]] = None
 
-        self.output_dir = Path('./工作流结果')
+        self.output_dir = Path(output_dir) if output_dir is not None else Path('./工作流结果')
         self.output_dir.mkdir(parents=True, exist_ok=True)
+
+    def _new_output_file(self, output_name: str) -> Path:
+        """按输出格式生成带时间戳的结果文件路径"""
+        return self.output_dir / f'{output_name}_{datetime.datetime.now().strftime("%Y%m%d%H%M%S")}.{self.output_format}'
     
     
     def _transfrom_unmathced_keywords(self,unmatched_keywords:List[models.UnMatchedKeyword])->pd.DataFrame:
@@ -85,54 +180,60 @@ class WorkFlowProcessor:
         return map_func[type(data[0])](data)
         
         
+    def _transform_frame_to_df(self,df:pd.DataFrame,match_type:Literal['match','unmatch']='match')->pd.DataFrame:
+        """将ClassifiedResult的列式数据转换为输出用的DataFrame"""
+        if match_type == 'match':
+            result = pd.DataFrame({'关键词':df['keyword'].to_numpy(),'匹配的规则':df['matched_rule'].to_numpy()})
+        else:
+            result = pd.DataFrame({'关键词':df['keyword'].to_numpy(),'分类层级':df['level'].to_numpy()})
+        if df['parent_rule'].notna().any():
+            result['父级规则'] = df['parent_rule'].to_numpy()
+        return result
+
     def _trans_words_to_cassified_result(self,classify_result:List[models.ClassifiedWord],mapping_dict:dict)->Optional[models.ClassifiedResult]:
-        classified_keywords = []
+        classified_columns = {column:[] for column in models.ClassifiedResult.CLASSIFIED_COLUMNS}
         unclassified_keywords = []
         try:
-            # 处理分类结果
+            level = mapping_dict['level']
+            # 处理分类结果，按列收集
             for temp in classify_result:
-                keyword = temp.keyword
                 matched_rules = temp.matched_rule
-                temp_dict = {}
                 if matched_rules:
-                    temp_dict = {
-                        'level':mapping_dict['level'],
-                        'keyword':keyword,
-                        'matched_rule':matched_rules,
-                        'output_name':mapping_dict[matched_rules].get('output_name'),
-                        'classified_sheet_name':mapping_dict[matched_rules].get('classified_sheet_name'),
-                        'parent_rule':mapping_dict[matched_rules].get('parent_rule')
-                    }
-                    classified_keywords.append(
-                        models.ClassifiedKeyword(**temp_dict))
+                    target = mapping_dict[matched_rules]
+                    classified_columns['level'].append(level)
+                    classified_columns['keyword'].append(temp.keyword)
+                    classified_columns['matched_rule'].append(matched_rules)
+                    classified_columns['output_name'].append(target.get('output_name'))
+                    classified_columns['classified_sheet_name'].append(target.get('classified_sheet_name'))
+                    classified_columns['parent_rule'].append(target.get('parent_rule'))
                 else:
-                    if mapping_dict.get('level') == 1:
-                        temp_dict = {
-                            'level':mapping_dict['level'],
-                            'keyword':keyword,
-                            'output_name':'未匹配关键词',
-                            'classified_sheet_name':'Sheet1'
-                        }
+                    unclassified_keywords.append(temp.keyword)
+            if not classified_columns['keyword']:
+                return None
+            for column in ('rule_tag','parent_rule_columon','rule_tag_columon'):
+                classified_columns[column] = [None] * len(classified_columns['keyword'])
 
-                    else:
-                        output_name = list(mapping_dict.values())[1].get('output_name')
-                        for key,value in mapping_dict.items():
-                            if isinstance(value,dict):
-                                if output_name != value.get('output_name'):
-                                    msg = f'异常情况，传入的隐射关系存在多个来源文件夹,请检查规则映射关系{mapping_dict},output_name:{output_name},value:{value.get("output_name")}'
-                                    raise Exception(msg)
-                        temp_dict = {
-                            'level':mapping_dict['level'],
-                            'keyword':keyword,
-                            'output_name':output_name,
-                            'classified_sheet_name':'未匹配关键词'
-                        }
-                    unclassified_keywords.append(
-                            models.UnMatchedKeyword( **temp_dict))
-            if classified_keywords:
-                return models.ClassifiedResult(classified_keywords=classified_keywords,unclassified_keywords=unclassified_keywords)
+            # 处理未分类关键词
+            output_name = '未匹配关键词'
+            classified_sheet_name = 'Sheet1'
+            if unclassified_keywords and level != 1:
+                output_name = list(mapping_dict.values())[1].get('output_name')
+                for key,value in mapping_dict.items():
+                    if isinstance(value,dict):
+                        if output_name != value.get('output_name'):
+                            msg = f'异常情况，传入的隐射关系存在多个来源文件夹,请检查规则映射关系{mapping_dict},output_name:{output_name},value:{value.get("output_name")}'
+                            raise Exception(msg)
+                classified_sheet_name = '未匹配关键词'
+            unclassified_count = len(unclassified_keywords)
+            unclassified_columns = {
+                'keyword':unclassified_keywords,
+                'output_name':[output_name] * unclassified_count,
+                'classified_sheet_name':[classified_sheet_name] * unclassified_count,
+                'level':[level] * unclassified_count,
+            }
+            return models.ClassifiedResult.from_frames(pd.DataFrame(classified_columns),pd.DataFrame(unclassified_columns))
         except Exception as e:
-            msg = f"分类结果转换出错: {e},\nmapping_dict: {mapping_dict},\nclassified_keywords:{classified_keywords},\nunclassified_keywords:{unclassified_keywords}"
+            msg = f"分类结果转换出错: {e},\nmapping_dict: {mapping_dict},\nclassified_keywords:{len(classified_columns['keyword'])},\nunclassified_keywords:{len(unclassified_keywords)}"
             raise Exception(msg)
     def _create_mapping_dict(self,workflow_rules:models.WorkFlowRules,level:int)->dict:
         mapping_dict = {}
@@ -157,25 +258,28 @@ class WorkFlowProcessor:
         Returns:
             ClassifiedResult:分类结果
         """
-        # 创建规则与输出映射字典
-        mapping_dict = self._create_mapping_dict(workflow_rules,level)
-        
-        # 获取分类规则列表，方便后续处理
-        rules = workflow_rules.to_rules_list()
-        
-        # 设置分类规则
-        self.classifier.set_rules(models.SourceRules(data=rules,error_callback=error_callback))
-        
-        # 分类关键词
-        classify_result = self.classifier.classify_keywords(unclassified_keywords)
-        
-        # 转换分类结果
-        classified_reuslt =  self._trans_words_to_cassified_result(classify_result,mapping_dict)
+        with self.tracer.span('classify','classify',level=level,keyword_count=len(unclassified_keywords.data)) as span_args:
+            # 创建规则与输出映射字典
+            mapping_dict = self._create_mapping_dict(workflow_rules,level)
+            
+            # 获取分类规则列表，方便后续处理
+            rules = workflow_rules.to_rules_list()
+            span_args['rule_count'] = len(rules)
+            
+            # 设置分类规则
+            self.classifier.set_rules(models.SourceRules(data=rules,error_callback=error_callback))
+            
+            # 分类关键词
+            classify_result = self.classifier.classify_keywords(unclassified_keywords)
+            
+            # 转换分类结果
+            classified_reuslt =  self._trans_words_to_cassified_result(classify_result,mapping_dict)
+            span_args['matched_count'] = 0 if classified_reuslt is None else len(classified_reuslt.classified)
         
         return classified_reuslt
         
     def _process_stage_df(self,pipeline_data:Dict[str,pd.DataFrame],level:int,**kwargs)->models.UnclassifiedKeywords:
-        mask = None
+        """取出阶段2、阶段3的待分类关键词；阶段4及以后按父规则分组，见_partition_stage_df"""
         try:
             error_callback = kwargs.get('error_callback')
             if level == 2:
@@ -193,51 +297,39 @@ class WorkFlowProcessor:
                         error_callback(msg)
                     raise Exception(msg)
                 return models.UnclassifiedKeywords(data=cast(List[str],pipeline_data[kwargs['classified_sheet_name']]['关键词'].astype(str).tolist()),error_callback=error_callback)
-            elif level >3:
-                # 检查 level > 3 时是否传入了必要参数
-                required_args = ["classified_sheet_name", "parent_rule"]
-                missing_args = [arg for arg in required_args if arg not in kwargs]
-                if missing_args:
-                    raise ValueError(
-                        f"当 level > 3 时，必须传入以下参数: {', '.join(missing_args)}"
-                    )
-                parent_rule_columon_name = '阶段'+str(level-1)
-                if parent_rule_columon_name not in pipeline_data[kwargs['classified_sheet_name']].columns:
-                    err_msg = f'classified_sheet_name:{kwargs['classified_sheet_name']},parent_rule_columon_name:{parent_rule_columon_name}不存在，无法进行匹配，pipeline_data[kwargs["classified_sheet_name"]].columns:{pipeline_data[kwargs["classified_sheet_name"]].columns}'
-                    if error_callback:
-                        error_callback(err_msg)
-                    logger.error(err_msg)
-                    raise Exception(err_msg)
-                logger.debug(f'pipeline_data[kwargs["classified_sheet_name"]]:{pipeline_data[kwargs["classified_sheet_name"]]}')
-                logger.debug(f'kwargs["parent_rule"]:{kwargs["parent_rule"]}')
-                logger.debug(f'pipeline_data[kwargs["classified_sheet_name"]][parent_rule_columon_name]:{pipeline_data[kwargs["classified_sheet_name"]][parent_rule_columon_name]}')
-                logger.debug(f'set(kwargs["parent_rule"]):{set(kwargs["parent_rule"])}')
-                if isinstance(kwargs['parent_rule'],str):
-                    match_parent_rule:List[str] = [kwargs['parent_rule']]
-                elif isinstance(kwargs['parent_rule'],list):
-                    match_parent_rule:List[str] = kwargs['parent_rule']
-                else:
-                    raise Exception(f'parent_rule:{kwargs["parent_rule"]}类型错误')
-
-
-                mask =  pipeline_data[kwargs['classified_sheet_name']][parent_rule_columon_name].isin(list(set(match_parent_rule)))
-                filtered_df  = pipeline_data[kwargs['classified_sheet_name']][mask].copy()
-                logger.debug(f'filtered_df:{filtered_df}')
-                if filtered_df.empty:
-                    return models.UnclassifiedKeywords(data=[],error_callback=self.error_callback)
-                return models.UnclassifiedKeywords(data=cast(List[str],filtered_df['关键词'].astype(str).tolist()),error_callback=self.error_callback)
             else:
-                msg = f'第{level}尚未实现相关功能！'
+                msg = f'_process_stage_df只处理阶段2、阶段3，第{level}阶段请使用_partition_stage_df'
                 if error_callback:
                     error_callback(msg)
                 raise Exception(msg)            
         except Exception as e:
-            if mask is not None:
-                logger.debug(f'err_mask:{mask}')
             msg = f"处理阶段性分词结果到待分类关键词：{e}"
             if kwargs.get('error_callback'):
                 kwargs['error_callback'](msg)
             raise Exception(msg)
+
+    def _partition_stage_df(self,pipeline_data:Dict[str,pd.DataFrame],level:int,classified_sheet_name:str)->Dict[str,models.UnclassifiedKeywords]:
+        """按上一阶段列(父规则)对sheet一次分组，只返回非空分组
+        Args:
+            pipeline_data: 上一阶段分类结果 Dict[sheet_name,pd.DataFrame]
+            level: 分类级别，需大于3
+            classified_sheet_name: 分类sheet名称
+        Returns:
+            Dict[parent_rule,UnclassifiedKeywords]
+        """
+        parent_rule_columon_name = '阶段'+str(level-1)
+        df = pipeline_data.get(classified_sheet_name)
+        if df is None or parent_rule_columon_name not in df.columns:
+            # 未匹配关键词等sheet没有上一阶段列，不参与本阶段分类
+            logger.debug('classified_sheet_name:%s不存在%s列，跳过',classified_sheet_name,parent_rule_columon_name)
+            return {}
+        parent_rules = df[parent_rule_columon_name].astype('category')
+        partitions = {}
+        for parent_rule, keywords in df['关键词'].groupby(parent_rules,observed=True,sort=False):
+            if keywords.empty:
+                continue
+            partitions[parent_rule] = models.UnclassifiedKeywords(data=cast(List[str],keywords.astype(str).tolist()),error_callback=self.error_callback)
+        return partitions
         
 
     def _special_rules_match_process(self,workflow_rules:models.WorkFlowRules,stage_results:Dict,
@@ -267,7 +359,8 @@ class WorkFlowProcessor:
             special_classified_sheet_name_rules = temp_rules.filter_rules(classified_sheet_name = "全")
             if special_classified_sheet_name_rules:
                 for rule in special_classified_sheet_name_rules.rules:
-                    for classified_sheet_name in classified_sheet_name_dict[rule.output_name]:
+                    # 只处理本次传入的输出文件，其余输出文件的规则由各自的处理链展开
+                    for classified_sheet_name in classified_sheet_name_dict.get(rule.output_name,[]):
                         temp_list.append(rule.model_copy(update={'classified_sheet_name':classified_sheet_name}))
                 special_classified_sheet_name_rules = models.WorkFlowRules(rules=temp_list)
             return special_classified_sheet_name_rules
@@ -282,8 +375,9 @@ class WorkFlowProcessor:
             classified_sheet_name_dict = {}
             for key,value in stage_results.items():
                 output_name_list.append(key)
-                classified_sheet_name_list:List = value.get('classified_sheet_name')
-                if len(classified_sheet_name_list) > 1:
+                # 复制一份，避免修改stage_results中的sheet列表
+                classified_sheet_name_list:List = list(value.get('classified_sheet_name'))
+                if len(classified_sheet_name_list) > 1 and 'Sheet1' in classified_sheet_name_list:
                     classified_sheet_name_list.remove('Sheet1')
                 if classified_sheet_name_dict.get(key) is None:
                     classified_sheet_name_dict[key] = classified_sheet_name_list
@@ -305,7 +399,8 @@ class WorkFlowProcessor:
             special_classified_sheet_name_rules = temp_rules.filter_rules(classified_sheet_name = "全")
             if special_classified_sheet_name_rules:
                 for rule in special_classified_sheet_name_rules.rules:
-                    for classified_sheet_name in classified_sheet_name_dict[rule.output_name]:
+                    # 只处理本次传入的输出文件，其余输出文件的规则由各自的处理链展开
+                    for classified_sheet_name in classified_sheet_name_dict.get(rule.output_name,[]):
                         temp_list.append(rule.model_copy(update={'classified_sheet_name':classified_sheet_name}))
                 special_classified_sheet_name_rules = models.WorkFlowRules(rules=temp_list)
             return special_classified_sheet_name_rules
@@ -401,8 +496,59 @@ class WorkFlowProcessor:
             err_msg = f'add_matched_rules_with_pandas 保存文件失败: {str(e)}'
             if self.error_callback:
                 self.error_callback(err_msg)
-            raise Exception(err_msg)      
-            
+            raise Exception(err_msg)
+
+    def add_matched_columns_to_workbook(
+        self,
+        excel_path: Path|str,
+        sheet_column_mappings: Dict[str, Dict[str, Dict[str, str]]],
+        keyword_column: str = "关键词"
+    ) -> bool:
+        """
+        一次读取工作簿中涉及的全部sheet，追加所有新列后一次性保存
+
+        Args:
+            excel_path: Excel 文件路径
+            sheet_column_mappings: Dict[sheet_name,Dict[新列名,Dict[关键词,规则]]]
+            keyword_column: 用于匹配的关键词列名，默认为"关键词"
+
+        Returns:
+            bool: 操作是否成功
+        """
+        try:
+            if not sheet_column_mappings:
+                return True
+            # 一次解析读取全部sheet，本阶段读取过的工作簿直接使用缓存
+            sheet_dfs = self.excel_handler.read_workbook(excel_path)
+            missing_sheets = [sheet_name for sheet_name in sheet_column_mappings if sheet_name not in sheet_dfs]
+            if missing_sheets:
+                raise ValueError(f"工作簿中不存在sheet: {', '.join(missing_sheets)}")
+
+            for sheet_name, column_mappings in sheet_column_mappings.items():
+                df = sheet_dfs[sheet_name]
+                if keyword_column not in df.columns:
+                    raise ValueError(f"Sheet '{sheet_name}' 中不存在指定的关键词列: {keyword_column}")
+                for new_column, rule_map in column_mappings.items():
+                    df[new_column] = df[keyword_column].map(rule_map)
+
+            # 整体流式重写工作簿，不以追加模式重新打开
+            self.excel_handler.save_sheets(sheet_dfs, excel_path)
+            return True
+        except Exception as e:
+            err_msg = f'add_matched_columns_to_workbook 保存文件失败: {str(e)}'
+            if self.error_callback:
+                self.error_callback(err_msg)
+            raise Exception(err_msg)
+
+    def apply_column_write_plan(self, plan: StageColumnWritePlan) -> bool:
+        """按工作簿执行列写入计划，每个工作簿只打开、保存一次"""
+        for excel_path, sheet_column_mappings in plan.items():
+            self.progress.check_cancelled()
+            logger.debug('写入工作簿:%s,sheet数量:%d',excel_path,len(sheet_column_mappings))
+            self.add_matched_columns_to_workbook(excel_path, sheet_column_mappings)
+            self.progress.advance(group=Path(excel_path).name)
+        return True
+
     def get_level_rules(self,workflow_rules:models.WorkFlowRules,stage_results:Dict,
                                       error_callback=None)->models.WorkFlowRules:
         
@@ -466,15 +612,15 @@ class WorkFlowProcessor:
         success_file_paths:Dict[str,Path] = {}
         try:
             # 获取分类结果
-            unmatched_keywords = classified_result.get_grouped_keywords(group_by='output_name',match_type='unmatch')
-            matched_keywords = classified_result.get_grouped_keywords(group_by='output_name',match_type='match')
+            unmatched_keywords = classified_result.group_frames(group_by='output_name',match_type='unmatch')
+            matched_keywords = classified_result.group_frames(group_by='output_name',match_type='match')
             
             try:
                 # 保存分类失败的关键词
                 if unmatched_keywords:
-                    for output_name, unclassify_keyword_list in unmatched_keywords.items():
-                        output_file = self.output_dir / f'{output_name}_{datetime.datetime.now().strftime("%Y%m%d%H%M%S")}.xlsx'
-                        df = self._transform_to_df(unclassify_keyword_list)
+                    for output_name, unclassify_keyword_df in unmatched_keywords.items():
+                        output_file = self._new_output_file(output_name)
+                        df = self._transform_frame_to_df(unclassify_keyword_df,'unmatch')
                         self.excel_handler.save_results(df, output_file,sheet_name='Sheet1')
             except Exception as e:
                 err_msg = f'保存分类失败的关键词失败：{e}'
@@ -484,9 +630,9 @@ class WorkFlowProcessor:
             
             try:
                 if matched_keywords:
-                    for output_name, matched_keyword_list in matched_keywords.items():
-                        output_file:Path = self.output_dir / f'{output_name}_{datetime.datetime.now().strftime("%Y%m%d%H%M%S")}.xlsx'
-                        df = self._transform_to_df(matched_keyword_list)
+                    for output_name, matched_keyword_df in matched_keywords.items():
+                        output_file:Path = self._new_output_file(output_name)
+                        df = self._transform_frame_to_df(matched_keyword_df,'match')
                         self.excel_handler.save_results(df, output_file,sheet_name='Sheet1')
                         success_file_paths[cast(str,output_name)] = output_file
                     return success_file_paths
@@ -502,6 +648,89 @@ class WorkFlowProcessor:
             raise Exception(f"获取分类结果失败：{e}")
     
 
+    def process_stage1_streaming(self, classification_file: Path, workflow_rules: models.WorkFlowRules,
+                                 error_callback=None) -> Dict[str,Path]:
+        """分块读取待分类文件，逐批完成第一阶段分类并追加写入各结果文件
+        
+        与process_stage1 + save_stage1_results的结果相同。关键词、分类结果和写入的DataFrame只保留当前一批，
+        与self.chunk_size有关；跨批次去重另外保留已出现关键词的64位哈希（SeenKeywordHashes），每个不同的关键词8字节，
+        千万级关键词约80MB，不保留关键词字符串。
+        
+        Args:
+            classification_file: 待分类文件路径
+            workflow_rules: 工作流规则
+            error_callback: 错误回调函数
+            
+        Returns:
+            Dict[output_name,文件路径]，只包含有匹配结果的输出文件
+        """
+        stage1_rules = workflow_rules.get_rules_by_level(1)
+        if stage1_rules is None:
+            msg = '第一阶段关键词分类规则为空'
+            if error_callback:
+                error_callback(msg)
+            raise Exception(msg)
+        # 规则只解析一次，所有批次共用
+        mapping_dict = self._create_mapping_dict(stage1_rules,1)
+        self.classifier.set_rules(models.SourceRules(data=stage1_rules.to_rules_list(),error_callback=error_callback))
+
+        writers = {}
+        success_file_paths:Dict[str,Path] = {}
+        seen_keywords = SeenKeywordHashes()
+        self.progress.start_stage('stage1',1)
+
+        def write_frame(output_name:str, df:pd.DataFrame):
+            if output_name not in writers:
+                writers[output_name] = self.excel_handler.open_sheet_writer(self._new_output_file(output_name), 'Sheet1')
+            writers[output_name].write(df)
+
+        batches = self.tracer.trace_iter(self.excel_handler.iter_keyword_batches(classification_file, self.chunk_size),
+                                         'read_keywords', 'read', file=Path(classification_file).name)
+        try:
+            for batch_index, raw_keywords in enumerate(batches):
+                self.progress.check_cancelled()
+                # 预处理后跨批次保序去重，与一次读入全部关键词时一致
+                keywords = models.UnclassifiedKeywords(data=raw_keywords,error_callback=error_callback)
+                new_keywords = seen_keywords.add_new(keywords.data)
+                if not new_keywords:
+                    continue
+                keywords.data = new_keywords
+                logger.debug('第一阶段第%d批，关键词数:%d',batch_index + 1,len(new_keywords))
+
+                with self.tracer.span('classify','classify',level=1,batch=batch_index,keyword_count=len(new_keywords),
+                                      rule_count=len(self.classifier.parsed_rules)) as span_args:
+                    classified_result = self._trans_words_to_cassified_result(self.classifier.classify_keywords(keywords),mapping_dict)
+                    span_args['matched_count'] = 0 if classified_result is None else len(classified_result.classified)
+                if classified_result is None:
+                    # 本批没有任何匹配，全部写入未匹配关键词
+                    write_frame(UNMATCHED_NAME, pd.DataFrame({'关键词':new_keywords,'分类层级':1}))
+                else:
+                    for output_name, df in classified_result.group_frames(group_by='output_name',match_type='unmatch').items():
+                        write_frame(output_name, self._transform_frame_to_df(df,'unmatch'))
+                    for output_name, df in classified_result.group_frames(group_by='output_name',match_type='match').items():
+                        write_frame(output_name, self._transform_frame_to_df(df,'match'))
+                        success_file_paths.setdefault(cast(str,output_name), writers[output_name].output_file)
+                self.progress.advance(keywords=len(new_keywords),group=f'第{batch_index + 1}批')
+        except BaseException as e:
+            # 失败或取消时丢弃未写完的结果文件
+            for writer in writers.values():
+                writer.abort()
+            if isinstance(e, (WorkflowCancelled, KeyboardInterrupt)):
+                raise
+            msg = f"第一阶段分块分类失败：{e}"
+            if error_callback:
+                error_callback(msg)
+            raise Exception(msg) from e
+        for writer in writers.values():
+            writer.close()
+
+        if not success_file_paths:
+            msg = '第一阶段关键词分类结果为空'
+            if error_callback:
+                error_callback(msg)
+            raise Exception(msg)
+        return success_file_paths
+
     def process_stage2(self, stage1_files: Dict[str, Path], workflow_rules: models.WorkFlowRules, 
                       error_callback=None) -> Dict[str, models.ClassifiedResult]:
         """处理阶段2：分层处理（Sheet2处理）
@@ -519,17 +748,19 @@ class WorkFlowProcessor:
             msg = '找不到Sheet2规则，已经返回'
             if error_callback:
                 error_callback(msg)
-            return msg
+            return {}
         
         try:
             # 获取分类流程2的规则
             sheet2_rules = workflow_rules.filter_rules(source_sheet_name='Sheet2')
             stage2_results = {}
+            self.progress.start_stage('stage2',2,groups_total=len(stage1_files))
             
             # 处理每个阶段1文件
             for output_name, file_path in stage1_files.items():
+                self.progress.check_cancelled()
                 # 读取阶段1文件
-                stage1_df = self.excel_handler.read_stage_results(file_path)
+                stage1_df = self.excel_handler.read_stage_results(file_path,columns=['关键词'])
                 
                 #获取需要分类的关键词
                 unclassified_keyword = self._process_stage_df(stage1_df,2,error_callback=error_callback)
@@ -538,13 +769,17 @@ class WorkFlowProcessor:
                 output_name_rules = sheet2_rules.filter_rules(output_name=output_name)
                 
                 if output_name_rules:
-                    classified_result = self._get_classified_results(unclassified_keyword,output_name_rules,2,error_callback=error_callback)
+                    with self.tracer.span('group','group',level=2,output_name=output_name):
+                        classified_result = self._get_classified_results(unclassified_keyword,output_name_rules,2,error_callback=error_callback)
                     stage2_results[output_name] = classified_result
                 else:
                     msg = f'找不到{output_name}的Sheet2规则，已经返回'
                     if error_callback:
                         error_callback(msg)
+                self.progress.advance(keywords=len(unclassified_keyword.data),group=output_name)
             return stage2_results
+        except WorkflowCancelled:
+            raise
         except Exception as e:
             raise Exception(f"处理阶段2失败: {str(e)}")
     
@@ -561,27 +796,30 @@ class WorkFlowProcessor:
         """
         try:
             stage2_result = {}
+            self.progress.start_stage('save_stage2',2,groups_total=len(classified_result))
             for key,values in classified_result.items():
+                self.progress.check_cancelled()
                 file_path = stage1_files[key]
-                # 使用Excel写入器追加新Sheet
-                with pd.ExcelWriter(file_path, engine='openpyxl', mode='a') as writer:
-                    stage2_result[key] = {'file_path': file_path, 'classified_sheet_name': []}
-                    if values is None:
-                        logger.warning(f'{key}没有分类结果')
-                        continue
-                    for key, classified_keyword_list in values.group_by_output_name_and_sheet(match_type='match').items():
-                        output_name,classified_sheet_name = key
-                        df = self._transform_to_df(classified_keyword_list)
-                        df.to_excel(writer, sheet_name=classified_sheet_name, index=False)
-                        stage2_result[output_name]['classified_sheet_name'].append(classified_sheet_name)
-                    for key, unclassified_keyword_list in values.group_by_output_name_and_sheet(match_type='unmatch').items():
-                        output_name,classified_sheet_name = key
-                        df = self._transform_to_df(unclassified_keyword_list)
-                        df.to_excel(writer, sheet_name=classified_sheet_name, index=False)
-                        
+                stage2_result[key] = {'file_path': file_path, 'classified_sheet_name': []}
+                if values is None:
+                    logger.warning('%s没有分类结果',key)
+                    continue
+                # 在阶段1的sheet后加入新Sheet，整体重写工作簿
+                sheets = self.excel_handler.read_workbook(file_path)
+                for sheet_key, classified_keyword_df in values.group_frames(group_by='sheet',match_type='match').items():
+                    output_name,classified_sheet_name = sheet_key
+                    sheets[classified_sheet_name] = self._transform_frame_to_df(classified_keyword_df,'match')
+                    stage2_result[output_name]['classified_sheet_name'].append(classified_sheet_name)
+                for sheet_key, unclassified_keyword_df in values.group_frames(group_by='sheet',match_type='unmatch').items():
+                    output_name,classified_sheet_name = sheet_key
+                    sheets[classified_sheet_name] = self._transform_frame_to_df(unclassified_keyword_df,'unmatch')
+                self.excel_handler.save_sheets(sheets, file_path)
+                self.progress.advance(group=key)
                 
             return stage2_result
 
+        except WorkflowCancelled:
+            raise
         except Exception as e:
             err_msg = f'保存分类成功的关键词失败：{e}'
             if error_callback:
@@ -611,6 +849,7 @@ class WorkFlowProcessor:
             sheet3_rules = workflow_rules.filter_rules(source_sheet_name='Sheet3')
             sheet3_rules = self.get_level_rules(sheet3_rules,stage2_results,error_callback)
             stage3_results = {}
+            self.progress.start_stage('stage3',3,groups_total=sum(len(values.get('classified_sheet_name') or []) for values in stage2_results.values()))
             
             # 处理每个阶段1文件
             for output_name, values in stage2_results.items():
@@ -619,9 +858,10 @@ class WorkFlowProcessor:
                     continue
                 classified_sheet_name_list = values['classified_sheet_name']
                 # 读取阶段2文件
-                stage2_df = self.excel_handler.read_stage_results(file_path)
+                stage2_df = self.excel_handler.read_stage_results(file_path,columns=['关键词'])
                 
                 for classified_sheet_name in classified_sheet_name_list:
+                    self.progress.check_cancelled()
                     
                     #获取需要分类的关键词
                     unclassified_keyword = self._process_stage_df(stage2_df,3,classified_sheet_name = classified_sheet_name,error_callback=error_callback)
@@ -631,7 +871,8 @@ class WorkFlowProcessor:
                     output_name_rules = sheet3_rules.filter_rules(output_name=output_name,classified_sheet_name=classified_sheet_name)
 
                     if output_name_rules:
-                        classified_result = self._get_classified_results(unclassified_keyword,output_name_rules,3,error_callback=error_callback)
+                        with self.tracer.span('group','group',level=3,output_name=output_name,classified_sheet_name=classified_sheet_name):
+                            classified_result = self._get_classified_results(unclassified_keyword,output_name_rules,3,error_callback=error_callback)
                         # if stage3_results == {}:
                         #     stage3_results[output_name] = {}
                         # elif stage3_results.get(output_name) is None:
@@ -645,7 +886,10 @@ class WorkFlowProcessor:
                         msg = f'找不到{output_name}的Sheet2规则，已经返回'
                         if error_callback:
                             error_callback(msg)
+                    self.progress.advance(keywords=len(unclassified_keyword.data),group=f'{output_name}/{classified_sheet_name}')
             return stage3_results
+        except WorkflowCancelled:
+            raise
         except Exception as e:
             raise Exception(f"处理阶段3失败: {str(e)}")
     
@@ -665,26 +909,26 @@ class WorkFlowProcessor:
             return stage2_file
 
         try:
+            write_plan = StageColumnWritePlan()
+            self.progress.start_stage('save_stage3',3,groups_total=len(stage3_results))
             for output_name,result_dict in stage3_results.items():
                 if result_dict == {}:
                     continue
                 file_path = stage2_file[output_name]['file_path']
-                logger.debug(f'file_path:{file_path}')
+                logger.debug('file_path:%s',file_path)
                 
                 for classified_sheet_name,classified_result in result_dict.items():
                     if classified_result is None:
                         continue
                     # 构建 keyword 到 matched_rule 的映射
-                    keyword_to_rule = {
-                        kw.keyword: kw.matched_rule 
-                        for kw in classified_result.filter(classified_conditions={'classified_sheet_name':classified_sheet_name}).classified_keywords
-                    }
-                    self.add_matched_rule_with_pandas(excel_path = file_path,
-                                                      sheet_name = classified_sheet_name,
-                                                      keyword_to_rule = keyword_to_rule,
-                                                      new_column_name = '阶段3'
-                                                      )
+                    filtered_df = classified_result.filter(classified_conditions={'classified_sheet_name':classified_sheet_name}).classified
+                    keyword_to_rule = dict(zip(filtered_df['keyword'],filtered_df['matched_rule']))
+                    write_plan.add(file_path,classified_sheet_name,'阶段3',keyword_to_rule)
+            # 每个工作簿只打开、保存一次
+            self.apply_column_write_plan(write_plan)
             return stage2_file
+        except WorkflowCancelled:
+            raise
         except  Exception as e:
             err_msg = f'保存阶段三分类结果失败：{e}'
             if error_callback:
@@ -708,13 +952,16 @@ class WorkFlowProcessor:
         try:
             # 获取分类流程的规则
             level_rules = self.workflow_rules.filter_rules(level=level)
-            logger.debug(f'level_before:{level_rules}')
+            logger.debug('level:%d,筛选前规则数:%d',level,len(level_rules.rules))
             level_rules = self.get_level_rules_v1(level_rules,self.process_result_classified_file)
-            parent_rule_name_list = list(set(level_rules.get_parent_rules_name_by_level(level)))
-            logger.debug(f'level:{level}')
-            logger.debug(f'level_rules_after:{level_rules}')
-            logger.debug(f'parent_rule_name_list:{parent_rule_name_list}')
+            # 按 (输出文件, sheet, 父规则) 预先索引规则，避免每个分组重复筛选
+            indexed_rules:Dict[tuple,List[models.WorkFlowRule]] = {}
+            for rule in level_rules.rules:
+                if rule.parent_rule:
+                    indexed_rules.setdefault((rule.output_name,rule.classified_sheet_name,rule.parent_rule),[]).append(rule)
+            logger.debug('level:%d,展开后规则数:%d',level,len(level_rules.rules))
             level_results = {}
+            self.progress.start_stage(f'stage{level}',level)
             
             # 处理每个阶段1文件
             for output_name, values in self.process_result_classified_file.items():
@@ -723,35 +970,28 @@ class WorkFlowProcessor:
                     continue
                 classified_sheet_name_list = values['classified_sheet_name']
                 # 读取前一阶段分类文件
-                pr_level_dict = self.excel_handler.read_stage_results(file_path)
+                pr_level_dict = self.excel_handler.read_stage_results(file_path,columns=['关键词','阶段'+str(level-1)])
 
                 for classified_sheet_name in classified_sheet_name_list:
-                    for parent_rule_name in parent_rule_name_list:
-                        #获取需要分类的关键词
-                        
-                        unclassified_keyword = self._process_stage_df(pr_level_dict,level,classified_sheet_name = classified_sheet_name,parent_rule=parent_rule_name)
-                        logger.debug(f'classified_sheet_name:{classified_sheet_name},parent_rule_name:{parent_rule_name},level:{level}，unclassified_keyword:{unclassified_keyword}')
-                        if unclassified_keyword is None:
+                    # 每个sheet只按父规则分组一次，只处理非空分组
+                    partitions = self._partition_stage_df(pr_level_dict,level,classified_sheet_name)
+                    for parent_rule_name, unclassified_keyword in partitions.items():
+                        self.progress.check_cancelled()
+                        rules = indexed_rules.get((output_name,classified_sheet_name,parent_rule_name))
+                        if not rules:
                             continue
-
-                        # 获取分类规则
-
-                        output_name_rules = level_rules.filter_rules(output_name=output_name,classified_sheet_name=classified_sheet_name,parent_rule=parent_rule_name)
-
-                        if output_name_rules:
+                        logger.debug('classified_sheet_name:%s,parent_rule_name:%s,level:%d，keyword_count:%d',
+                                     classified_sheet_name,parent_rule_name,level,len(unclassified_keyword.data))
+                        output_name_rules = models.WorkFlowRules(rules=rules)
+                        with self.tracer.span('group','group',level=level,output_name=output_name,
+                                              classified_sheet_name=classified_sheet_name,parent_rule=parent_rule_name):
                             classified_result = self._get_classified_results(unclassified_keyword,output_name_rules,level)
-                            # if stage3_results == {}:
-                            #     stage3_results[output_name] = {}
-                            # elif stage3_results.get(output_name) is None:
-                            #     stage3_results[output_name] = {}
-                            # else:
-                            #     stage3_results[output_name][classified_sheet_name] = classified_result
-                            level_results.setdefault(output_name, {}).setdefault(classified_sheet_name, {})[parent_rule_name] = classified_result
-                        else:
-                            msg = f'找不到{output_name}的Sheet2规则，已经返回'
-                            if self.error_callback:
-                                self.error_callback(msg)
+                        level_results.setdefault(output_name, {}).setdefault(classified_sheet_name, {})[parent_rule_name] = classified_result
+                        self.progress.advance(keywords=len(unclassified_keyword.data),
+                                              group=f'{output_name}/{classified_sheet_name}/{parent_rule_name}')
             return level_results
+        except WorkflowCancelled:
+            raise
         except Exception as e:
             raise Exception(f"处理阶段3失败: {str(e)}")
 
@@ -768,6 +1008,8 @@ class WorkFlowProcessor:
         """
         try:
             classified_result:Optional[models.ClassifiedResult] = None
+            write_plan = StageColumnWritePlan()
+            self.progress.start_stage(f'save_stage{level}',level,groups_total=len(self.process_result_classified_file))
             for output_name,result_dict in self.process_result_classified_file.items():
                 if result_dict == {}:
                     continue
@@ -776,92 +1018,886 @@ class WorkFlowProcessor:
                 
                 for classified_sheet_name,parent_result in stage_high_result.get(output_name,{}).items():
                     for parent_rule_name,classified_result in parent_result.items():
-                        logger.debug(f'\n\nclassified_sheet_name: {classified_sheet_name}\n\n')
-                        logger.debug(f'\n\nparent_rule_name: {parent_rule_name}\n\n')
-                        logger.debug(f'\n\nclassified_result: {classified_result}\n\n')
                         if classified_result is None:
                             continue
                         # 构建 keyword 到 matched_rule 的映射
                         filtered_result = classified_result.filter(classified_conditions={'classified_sheet_name':classified_sheet_name,'parent_rule':parent_rule_name})
-                        if filtered_result is None:
-                            continue
-                        keyword_to_rule = {
-                            kw.keyword: kw.matched_rule 
-                            for kw in filtered_result.classified_keywords
-                        }
-                        logger.debug(f'\n\nkeyword_to_rule: {keyword_to_rule}\n\n')
-                        self.add_matched_rule_with_pandas(excel_path = file_path,
-                                                        sheet_name = classified_sheet_name,
-                                                        keyword_to_rule = keyword_to_rule,
-                                                        new_column_name = '阶段'+str(level)
-                                                        )
+                        keyword_to_rule = dict(zip(filtered_result.classified['keyword'],filtered_result.classified['matched_rule']))
+                        logger.debug('classified_sheet_name:%s,parent_rule_name:%s,写入关键词数:%d',
+                                     classified_sheet_name,parent_rule_name,len(keyword_to_rule))
+                        # 同一sheet下各父规则的结果合并到同一'阶段N'列
+                        write_plan.add(file_path,classified_sheet_name,'阶段'+str(level),keyword_to_rule)
+            # 每个工作簿只打开、保存一次
+            self.apply_column_write_plan(write_plan)
             return True
+        except WorkflowCancelled:
+            raise
         except  Exception as e:
             err_msg = f'保存阶段三分类结果失败：{e}'
             if self.error_callback:
                 self.error_callback(err_msg)
             raise Exception(err_msg)
 
-    def process_workflow(self, rules_file: Path, classification_file: Path, error_callback=None):
+    def process_output_files_chain(self, stage1_files: Dict[str, Path], workflow_rules: models.WorkFlowRules,
+                                   max_level: int, error_callback=None) -> dict:
+        """对阶段1生成的文件执行阶段2到阶段N的处理链
+
+        Args:
+            stage1_files: 阶段1生成的文件路径字典，可以只包含部分输出文件
+            workflow_rules: 工作流规则
+            max_level: 最大工作流层级
+            error_callback: 错误回调函数
+
+        Returns:
+            {'stage':最后处理的阶段,'result':该阶段的保存结果}
+        """
+        self.workflow_rules = workflow_rules
+        self.process_result_file = stage1_files
+        result = {'stage':1,'result':stage1_files}
+        stage = 2
+        output_names = list(stage1_files)
+        if stage <= max_level:
+            # 处理阶段2：将分类细分到各sheet
+            with self.tracer.span('process_stage2','stage',level=2,output_names=output_names):
+                stage2_results = self.process_stage2(stage1_files, workflow_rules, error_callback)
+            # 保存阶段2结果
+            with self.tracer.span('save_stage2','stage',level=2,output_names=output_names):
+                stage2_files = self.save_stage2_results(stage1_files, stage2_results, error_callback)
+            result = {'stage':2,'result':stage2_files}
+            stage += 1
+            logger.debug('当前工作流层级: %d,max_level: %d',stage,max_level)
+        if stage <= max_level:
+            self.process_result_classified_file = self.excel_handler.read_stage_classified_sheet_name(self.process_result_file)
+            logger.debug('self.process_result_classified_file:%s',self.process_result_classified_file)
+            # 处理阶段3：分类后处理（Sheet3处理）
+            with self.tracer.span('process_stage3','stage',level=3,output_names=output_names):
+                stage3_results = self.process_stage3(stage2_files, workflow_rules, error_callback)
+            
+            with self.tracer.span('save_stage3','stage',level=3,output_names=output_names):
+                stage3_file = self.save_stage3_results(stage2_file=stage2_files,stage3_results=stage3_results,error_callback=error_callback)
+            result = {'stage':3,'result':stage3_file}
+            stage += 1
+            logger.debug('当前工作流层级: %d,max_level: %d',stage,max_level)
+        while stage <= max_level:
+            with self.tracer.span(f'process_stage{stage}','stage',level=stage,output_names=output_names):
+                stage_result = self.process_stage_high(stage)
+            with self.tracer.span(f'save_stage{stage}','stage',level=stage,output_names=output_names):
+                stage_save_result = self.save_stage_high_results(stage,stage_result)
+            result = {'stage':stage,'result':stage_save_result}
+            stage += 1
+            logger.debug('阶段%d完成，输出文件数:%d',stage - 1,len(stage_result or {}))
+        return result
+
+    def _merge_chain_results(self, stage1_files: Dict[str, Path], chain_results: Dict[str, dict]) -> dict:
+        """按阶段1文件顺序合并各输出文件处理链的结果"""
+        ordered_results = [chain_results[output_name] for output_name in stage1_files if output_name in chain_results]
+        stage = max(chain_result['stage'] for chain_result in ordered_results)
+        stage_results = [chain_result['result'] for chain_result in ordered_results]
+        if all(isinstance(stage_result, dict) for stage_result in stage_results):
+            merged = {}
+            for stage_result in stage_results:
+                merged.update(stage_result)
+            return {'stage':stage,'result':merged}
+        return {'stage':stage,'result':all(stage_results)}
+
+    def process_output_files(self, stage1_files: Dict[str, Path], workflow_rules: models.WorkFlowRules,
+                             max_level: int, error_callback=None) -> dict:
+        """并行处理各输出文件的阶段2到阶段N
+
+        每个输出文件的文件和规则子集互不相关，按文件大小从大到小提交到进程池，
+        缩短整体耗时；只有一个文件或max_workers为1时在当前进程内顺序处理。
+
+        Returns:
+            与process_output_files_chain相同结构的合并结果
+        """
+        workers = min(self.max_workers or os.cpu_count() or 1, len(stage1_files))
+        if workers <= 1:
+            with self.tracer.span('output_chain','group',output_names=list(stage1_files),max_level=max_level):
+                return self.process_output_files_chain(stage1_files, workflow_rules, max_level, error_callback)
+
+        # 大文件优先，避免最后只剩一个大文件在单独运行
+        ordered_files = sorted(stage1_files.items(), key=lambda item: self.excel_handler.workbook_size(item[1]), reverse=True)
+        chain_results = {}
+        classified_files = {}
+        # 有取消标记时通过Manager的Event通知子进程，子进程在分组之间检查
+        manager = multiprocessing.Manager() if self.cancel_token is not None else None
+        cancel_event = manager.Event() if manager is not None else None
+        executor = ProcessPoolExecutor(max_workers=workers)
+        try:
+            futures = {
+                executor.submit(_run_output_file_chain, {
+                    'output_name':output_name,
+                    'file_path':file_path,
+                    'workflow_rules':workflow_rules,
+                    'max_level':max_level,
+                    'case_sensitive':self.classifier.case_sensitive,
+                    'separator':self.classifier.separator,
+                    'handler_config':self.excel_handler.config(),
+                    'output_format':self.output_format,
+                    'output_dir':self.output_dir,
+                    'trace':self.tracer.enabled,
+                    'cancel_event':cancel_event,
+                }): output_name
+                for output_name, file_path in ordered_files
+            }
+            self.progress.start_stage('output_files',2,groups_total=len(futures))
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=0.5 if cancel_event is not None else None, return_when=FIRST_COMPLETED)
+                if self.cancel_token is not None and self.cancel_token.cancelled:
+                    cancel_event.set()
+                    self.progress.check_cancelled()
+                for future in done:
+                    output_name = futures[future]
+                    chain_result, classified_file, trace_events = future.result()
+                    # 子进程记录的区间合并到主进程的时间轴
+                    self.tracer.extend(trace_events)
+                    chain_results[output_name] = chain_result
+                    if classified_file:
+                        classified_files.update(classified_file)
+                    logger.info('%s 阶段2到阶段%d处理完成',output_name,max_level)
+                    self.progress.advance(group=output_name)
+        except BaseException as e:
+            if cancel_event is not None:
+                cancel_event.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+            if isinstance(e, (WorkflowCancelled, KeyboardInterrupt)):
+                raise
+            err_msg = f'并行处理输出文件失败：{e}'
+            if error_callback:
+                error_callback(err_msg)
+            raise Exception(err_msg)
+        finally:
+            if manager is not None:
+                manager.shutdown()
+        executor.shutdown(wait=True)
+
+        self.workflow_rules = workflow_rules
+        self.process_result_file = stage1_files
+        if classified_files:
+            self.process_result_classified_file = {
+                output_name:classified_files[output_name] for output_name in stage1_files if output_name in classified_files
+            }
+        return self._merge_chain_results(stage1_files, chain_results)
+
+    def _sample_keywords(self, classification_file: Path, sample_size: int, error_callback=None) -> Tuple[int, List[str]]:
+        """分块读取待分类文件，一遍得到去重后的关键词数和均匀抽样（蓄水池抽样，固定随机种子）
+
+        与read_keyword_file一致地预处理和跨批次去重；内存占用为一批关键词、抽样和已出现关键词的哈希。
+        """
+        rng = np.random.default_rng(0)
+        seen_keywords = SeenKeywordHashes()
+        sample: List[str] = []
+        total = 0
+        for raw_keywords in self.excel_handler.iter_keyword_batches(classification_file, self.chunk_size):
+            self.progress.check_cancelled()
+            keywords = seen_keywords.add_new(models.UnclassifiedKeywords(data=raw_keywords,error_callback=error_callback).data)
+            # 先填满蓄水池，之后第t个关键词以 sample_size/t 的概率替换随机一个位置；按顺序替换，后出现的覆盖先出现的
+            fill = min(max(sample_size - len(sample), 0), len(keywords))
+            sample.extend(keywords[:fill])
+            rest = len(keywords) - fill
+            if rest:
+                positions = np.arange(total + fill + 1, total + len(keywords) + 1)
+                indices = (rng.random(rest) * positions).astype(np.int64)
+                for offset in np.flatnonzero(indices < sample_size).tolist():
+                    sample[indices[offset]] = keywords[fill + offset]
+            total += len(keywords)
+        return total, sample
+
+    def _plan_classify(self, keywords: List[str], workflow_rules: models.WorkFlowRules,
+                       level: int) -> tuple[Optional[models.ClassifiedResult], float]:
+        """对抽样关键词执行一次分类，返回分类结果和耗时(秒)"""
+        if not keywords:
+            return None, 0.0
+        start = time.perf_counter()
+        classified_result = self._get_classified_results(
+            models.UnclassifiedKeywords(data=keywords), workflow_rules, level
+        )
+        return classified_result, time.perf_counter() - start
+
+    def _plan_group(self, level: int, sample_keywords: List[str], workflow_rules: models.WorkFlowRules,
+                    scale: float, projected_samples: Dict[str, int], seconds: float,
+                    check_excel_rows: bool = False, **group_keys) -> models.WorkFlowPlanGroup:
+        """将抽样统计按比例换算为分组执行计划"""
+        projected_outputs = {name: round(count * scale) for name, count in projected_samples.items()}
+        oversized_outputs = []
+        if check_excel_rows:
+            # 表头占用一行
+            oversized_outputs = [name for name, rows in projected_outputs.items() if rows > EXCEL_MAX_ROWS - 1]
+        return models.WorkFlowPlanGroup(
+            level=level,
+            keyword_count=round(len(sample_keywords) * scale),
+            sample_keyword_count=len(sample_keywords),
+            rule_count=len(workflow_rules.rules),
+            estimated_seconds=seconds * scale,
+            projected_outputs=projected_outputs,
+            oversized_outputs=oversized_outputs,
+            **group_keys
+        )
+
+    def plan_workflow(self, rules_file: Path, classification_file: Path, sample_size: int = 2000,
+                      error_callback=None) -> models.WorkFlowPlan:
+        """预演工作流，估算各层级各分组的规模和耗时，不写入任何文件
+
+        只读取规则文件，分块读取一遍待分类文件统计关键词数并蓄水池抽样，在内存中对抽样关键词逐层分类，
+        再按 总关键词数/抽样数 的比例推算关键词数、输出规模和耗时，
+        并标记预计超出Excel行数上限的输出文件和sheet。
+
+        Args:
+            rules_file: 工作流规则文件路径
+            classification_file: 待分类文件路径
+            sample_size: 抽样关键词数量
+            error_callback: 错误回调函数
+
+        Returns:
+            WorkFlowPlan: 执行计划
+        """
+        try:
+            workflow_rules = self.excel_handler.read_workflow_rules(rules_file)
+            total_keywords, sample = self._sample_keywords(classification_file, sample_size, error_callback)
+            max_level = workflow_rules.get_max_level()
+            scale = total_keywords / len(sample) if sample else 0.0
+            groups: List[models.WorkFlowPlanGroup] = []
+
+            # 阶段1：全部关键词对全部一阶段规则
+            stage1_rules = workflow_rules.get_rules_by_level(1)
+            if stage1_rules is None:
+                raise Exception('第一阶段关键词分类规则为空')
+            classified_result, seconds = self._plan_classify(sample, stage1_rules, 1)
+            output_keywords: Dict[str, List[str]] = {}
+            unmatched_count = 0
+            if classified_result is not None:
+                for output_name, output_df in classified_result.group_frames(group_by='output_name',match_type='match').items():
+                    output_keywords[output_name] = output_df['keyword'].tolist()
+                unmatched_count = len(classified_result.unclassified)
+            elif sample:
+                unmatched_count = len(sample)
+            projected_samples = {name: len(keyword_list) for name, keyword_list in output_keywords.items()}
+            if unmatched_count:
+                projected_samples['未匹配关键词'] = unmatched_count
+            groups.append(self._plan_group(1, sample, stage1_rules, scale, projected_samples, seconds, check_excel_rows=True))
+
+            # 阶段2：各输出文件的关键词对该文件的二阶段规则
+            sheet_keywords: Dict[str, Dict[str, List[str]]] = {}
+            stage2_rules = workflow_rules.get_rules_by_level(2) if max_level >= 2 else None
+            for output_name, keyword_list in output_keywords.items():
+                output_name_rules = stage2_rules.filter_rules(output_name=output_name) if stage2_rules else None
+                if output_name_rules is None:
+                    continue
+                classified_result, seconds = self._plan_classify(keyword_list, output_name_rules, 2)
+                projected_samples = {'Sheet1': len(keyword_list)}
+                sheet_keywords[output_name] = {}
+                if classified_result is not None:
+                    for (_, sheet_name), sheet_df in classified_result.group_frames(group_by='sheet',match_type='match').items():
+                        sheet_keywords[output_name][sheet_name] = sheet_df['keyword'].tolist()
+                        projected_samples[sheet_name] = len(sheet_df)
+                    if not classified_result.unclassified.empty:
+                        projected_samples['未匹配关键词'] = len(classified_result.unclassified)
+                groups.append(self._plan_group(2, keyword_list, output_name_rules, scale, projected_samples, seconds,
+                                               check_excel_rows=True, output_name=output_name))
+
+            # 阶段3及以上：新增'阶段N'列，不产生新的行
+            # '全'按规则目录展开（与WorkFlowTree相同），不依赖抽样命中了哪些sheet
+            output_names, sheet_names = rule_catalog(workflow_rules)
+            previous_stage: Dict[tuple[str, str], Dict[str, str]] = {}
+            for level in range(3, max_level + 1):
+                level_rules = workflow_rules.get_rules_by_level(level)
+                if level_rules is None or not sheet_keywords:
+                    break
+                level_rules = models.WorkFlowRules(rules=expand_all_rules(level_rules.rules, output_names, sheet_names))
+                current_stage: Dict[tuple[str, str], Dict[str, str]] = {}
+                for output_name, sheets in sheet_keywords.items():
+                    for sheet_name, keyword_list in sheets.items():
+                        if level == 3:
+                            parent_groups = {None: keyword_list}
+                        else:
+                            parent_groups = {}
+                            for keyword, matched_rule in previous_stage.get((output_name, sheet_name), {}).items():
+                                parent_groups.setdefault(matched_rule, []).append(keyword)
+                        for parent_rule, group_keywords in parent_groups.items():
+                            conditions = {'output_name': output_name, 'classified_sheet_name': sheet_name}
+                            if parent_rule is not None:
+                                conditions['parent_rule'] = parent_rule
+                            group_rules = level_rules.filter_rules(**conditions)
+                            if group_rules is None:
+                                continue
+                            classified_result, seconds = self._plan_classify(group_keywords, group_rules, level)
+                            projected_samples = {}
+                            if classified_result is not None:
+                                classified_df = classified_result.classified
+                                current_stage.setdefault((output_name, sheet_name), {}).update(zip(classified_df['keyword'], classified_df['matched_rule']))
+                                projected_samples = classified_df['matched_rule'].value_counts(sort=False).to_dict()
+                            groups.append(self._plan_group(level, group_keywords, group_rules, scale, projected_samples, seconds,
+                                                           output_name=output_name, classified_sheet_name=sheet_name,
+                                                           parent_rule=parent_rule))
+                previous_stage = current_stage
+
+            plan = models.WorkFlowPlan(
+                total_keywords=total_keywords,
+                sample_size=len(sample),
+                max_level=max_level,
+                max_excel_rows=EXCEL_MAX_ROWS - 1,
+                groups=groups
+            )
+            logger.info('工作流预演完成：关键词%d个，抽样%d个，分组%d个，预计分类耗时%.1f秒',
+                        plan.total_keywords,plan.sample_size,len(plan.groups),plan.estimated_seconds)
+            for group in plan.oversized_groups:
+                logger.warning('第%d阶段 %s 预计超出Excel行数上限: %s',group.level,group.output_name or "待分类文件",group.oversized_outputs)
+            return plan
+        except Exception as e:
+            err_msg = f'预演工作流失败：{e}'
+            if error_callback:
+                error_callback(err_msg)
+            raise Exception(err_msg)
+
+    def compile_workflow(self, workflow_rules: models.WorkFlowRules, error_callback=None) -> WorkFlowTree:
+        """按当前分类器的大小写敏感和分隔符设置，将工作流规则编译为分类树"""
+        return WorkFlowTree(
+            workflow_rules,
+            KeywordClassifier(
+                case_sensitive=self.classifier.case_sensitive,
+                separator=self.classifier.separator,
+                error_callback=error_callback
+            ),
+            error_callback=error_callback
+        )
+
+    def save_single_pass_results(self, classified_df: pd.DataFrame, workflow_tree: WorkFlowTree,
+                                 error_callback=None) -> Dict[str, Stage2OutputNameDict]:
+        """将单次遍历的分类路径落盘为与分步流程相同布局的Excel文件，每个文件只写入一次
+
+        Args:
+            classified_df: WorkFlowTree.classify_keywords 的结果
+            workflow_tree: 分类树
+            error_callback: 错误回调函数
+
+        Returns:
+            Dict[output_name,{'file_path':文件路径,'classified_sheet_name':[分类sheet名称]}]
+        """
+        try:
+            result = {}
+            stage_columns = [f'阶段{level}' for level in range(3, workflow_tree.max_level + 1)]
+            unmatched_mask = classified_df['阶段1'].isna()
+
+            # 一阶段未匹配的关键词
+            if unmatched_mask.any():
+                output_file = self._new_output_file(UNMATCHED_NAME)
+                unmatched_df = pd.DataFrame({'关键词': classified_df.loc[unmatched_mask, '关键词'].to_numpy(), '分类层级': 1})
+                self.excel_handler.save_sheets({'Sheet1': unmatched_df}, output_file)
+
+            for output_name, output_df in classified_df[~unmatched_mask].groupby('结果文件名称', sort=False):
+                output_file = self._new_output_file(output_name)
+                sheets = {
+                    'Sheet1': pd.DataFrame({'关键词': output_df['关键词'].to_numpy(), '匹配的规则': output_df['阶段1'].to_numpy()})
+                }
+                classified_sheet_names = []
+                if workflow_tree.max_level >= 2 and output_df['阶段2'].notna().any():
+                    for sheet_name, sheet_df in output_df[output_df['阶段2'].notna()].groupby('分类sheet名称', sort=False):
+                        sheet = pd.DataFrame({'关键词': sheet_df['关键词'].to_numpy(), '匹配的规则': sheet_df['阶段2'].to_numpy()})
+                        # 与分步流程一致，只有存在匹配结果的'阶段N'列才写入
+                        for column in stage_columns:
+                            if sheet_df[column].notna().any():
+                                sheet[column] = sheet_df[column].to_numpy()
+                        sheets[sheet_name] = sheet
+                        classified_sheet_names.append(sheet_name)
+                    stage2_unmatched = output_df['分类sheet名称'] == UNMATCHED_NAME
+                    if stage2_unmatched.any():
+                        sheets[UNMATCHED_NAME] = pd.DataFrame({'关键词': output_df.loc[stage2_unmatched, '关键词'].to_numpy(), '分类层级': 2})
+                self.excel_handler.save_sheets(sheets, output_file)
+                result[output_name] = {'file_path': output_file, 'classified_sheet_name': classified_sheet_names}
+            return result
+        except Exception as e:
+            err_msg = f'保存单次遍历分类结果失败：{e}'
+            if error_callback:
+                error_callback(err_msg)
+            raise Exception(err_msg)
+
+    def _open_keyword_store(self, classification_file: Path, error_callback=None) -> Tuple[KeywordStore, bool]:
+        """打开关键词库，待分类文件不是关键词库时转存到结果目录下的临时关键词库
+
+        Returns:
+            (关键词库, 是否为临时转存，处理完成后删除)
+        """
+        classification_file = Path(classification_file)
+        if is_keyword_store(classification_file):
+            return KeywordStore(classification_file), False
+        store_file = self.output_dir / f'.{classification_file.name.split(".", 1)[0]}{KEYWORD_STORE_SUFFIX}'
+        store = KeywordStore.from_keyword_file(classification_file, store_file, self.excel_handler, self.chunk_size,
+                                               error_callback)
+        return store, True
+
+    def _single_pass_workers(self, keyword_count: int) -> int:
+        """单次遍历分类的进程数，不超过分块数"""
+        return max(min(self.max_workers or os.cpu_count() or 1, -(-keyword_count // self.chunk_size)), 1)
+
+    def classify_keyword_store(self, store: KeywordStore, workflow_tree: WorkFlowTree) -> Tuple[np.ndarray, PathTable]:
+        """按编号分块分类关键词库，分块之间报告进度、检查取消
+
+        多于一个分块且max_workers允许时使用进程池：子进程映射同一个关键词库，路径编号写入共享内存，
+        任务和结果只传递编号范围和新出现的分类路径。
+
+        Returns:
+            (每个关键词的路径编号，int32数组, 路径表)
+        """
+        self.progress.start_stage('single_pass',workflow_tree.max_level,keywords_total=len(store))
+        workers = self._single_pass_workers(len(store))
+        if workers > 1:
+            logger.debug('单次遍历并行分类，进程数:%d', workers)
+            return classify_store_parallel(store, workflow_tree.workflow_rules, workers, self.chunk_size,
+                                           workflow_tree.case_sensitive, workflow_tree.separator, self.progress)
+        path_table = PathTable()
+        path_ids = np.empty(len(store), dtype=np.int32)
+        for start, keywords in store.iter_batches(self.chunk_size):
+            self.progress.check_cancelled()
+            path_ids[start:start + len(keywords)] = workflow_tree.classify_path_ids(keywords, path_table)
+            self.progress.advance(keywords=len(keywords),group=f'第{start // self.chunk_size + 1}批')
+        return path_ids, path_table
+
+    def _store_frames(self, store: KeywordStore, indices: np.ndarray,
+                      columns: Callable[[np.ndarray], Dict[str, Any]]) -> Iterator[pd.DataFrame]:
+        """按chunk_size分块从关键词库取出关键词组成DataFrame，写入时才解码"""
+        for start in range(0, len(indices), self.chunk_size):
+            chunk = indices[start:start + self.chunk_size]
+            yield pd.DataFrame({'关键词': store.take(chunk), **columns(chunk)})
+
+    def save_keyword_store_results(self, store: KeywordStore, path_ids: np.ndarray, path_table: PathTable,
+                                   workflow_tree: WorkFlowTree, error_callback=None) -> Dict[str, Stage2OutputNameDict]:
+        """按路径编号分组落盘，结果与save_single_pass_results相同
+
+        每个结果文件、sheet的关键词编号由一次稳定排序得到（组内保持输入顺序），
+        写入时按块从关键词库解码，不需要保存全部关键词和分类路径的字符串。
+        """
+        try:
+            result = {}
+            max_level = workflow_tree.max_level
+            paths = path_table.paths
+            # 路径的列：0结果文件名称，1分类sheet名称，2起为阶段1...阶段N
+            path_array = np.empty((len(paths), 2 + max_level), dtype=object)
+            path_array[:] = paths
+            stage_columns = {f'阶段{level}': 1 + level for level in range(3, max_level + 1)}
+
+            def column(index):
+                return lambda chunk: path_array[path_ids[chunk], index]
+
+            # 路径编号 -> 结果文件编号、sheet编号，一阶段未匹配的路径为-1
+            output_codes: Dict[str, int] = {}
+            sheet_codes: Dict[Tuple[str, str, bool], int] = {}
+            output_of_path = np.full(len(paths), -1, dtype=np.int64)
+            sheet_of_path = np.full(len(paths), -1, dtype=np.int64)
+            for path_id, path in enumerate(paths):
+                if path[2] is None:
+                    continue
+                output_of_path[path_id] = output_codes.setdefault(path[0], len(output_codes))
+                if max_level >= 2 and path[3] is not None:
+                    sheet_of_path[path_id] = sheet_codes.setdefault((path[0], path[1], False), len(sheet_codes))
+                elif path[1] == UNMATCHED_NAME:
+                    sheet_of_path[path_id] = sheet_codes.setdefault((path[0], UNMATCHED_NAME, True), len(sheet_codes))
+
+            # 一阶段未匹配的关键词
+            unmatched_indices = np.flatnonzero(output_of_path[path_ids] == -1)
+            if len(unmatched_indices):
+                output_file = self._new_output_file(UNMATCHED_NAME)
+                self.excel_handler.save_sheets(
+                    {'Sheet1': self._store_frames(store, unmatched_indices, lambda chunk: {'分类层级': 1})}, output_file
+                )
+
+            output_groups = _group_indices(output_of_path[path_ids], len(output_codes))
+            sheet_groups = dict(zip(sheet_codes, _group_indices(sheet_of_path[path_ids], len(sheet_codes))))
+            # 与DataFrame分组一致，结果文件和sheet按第一个关键词出现的顺序
+            for output_name, output_indices in sorted(zip(output_codes, output_groups), key=lambda item: item[1][0]):
+                output_file = self._new_output_file(output_name)
+                sheets = {'Sheet1': self._store_frames(store, output_indices, lambda chunk: {'匹配的规则': column(2)(chunk)})}
+                classified_sheets = sorted(
+                    ((key[1], indices) for key, indices in sheet_groups.items() if key[0] == output_name and not key[2]),
+                    key=lambda item: item[1][0]
+                )
+                classified_sheet_names = []
+                for sheet_name, sheet_indices in classified_sheets:
+                    sheet_paths = np.unique(path_ids[sheet_indices])
+                    # 与分步流程一致，只有存在匹配结果的'阶段N'列才写入
+                    present_columns = {name: index for name, index in stage_columns.items()
+                                       if any(value is not None for value in path_array[sheet_paths, index])}
+
+                    def sheet_columns(chunk, present_columns=present_columns):
+                        return {'匹配的规则': column(3)(chunk),
+                                **{name: column(index)(chunk) for name, index in present_columns.items()}}
+
+                    sheets[sheet_name] = self._store_frames(store, sheet_indices, sheet_columns)
+                    classified_sheet_names.append(sheet_name)
+                stage2_unmatched = sheet_groups.get((output_name, UNMATCHED_NAME, True))
+                if classified_sheets and stage2_unmatched is not None:
+                    sheets[UNMATCHED_NAME] = self._store_frames(store, stage2_unmatched, lambda chunk: {'分类层级': 2})
+                self.excel_handler.save_sheets(sheets, output_file)
+                result[output_name] = {'file_path': output_file, 'classified_sheet_name': classified_sheet_names}
+            return result
+        except Exception as e:
+            err_msg = f'保存关键词库分类结果失败：{e}'
+            if error_callback:
+                error_callback(err_msg)
+            raise Exception(err_msg)
+
+    def process_workflow_single_pass(self, rules_file: Path, classification_file: Path, error_callback=None,
+                                     workflow_tree: Optional[WorkFlowTree] = None):
+        """单次遍历处理完整工作流
+
+        规则编译为分类树后，每个关键词一次下探得到 阶段1...阶段N 的完整路径，
+        不再逐阶段写入、读回Excel；全部分类完成后每个输出文件只写入一次。
+
+        keyword_store为True或待分类文件为.kwstore关键词库时，关键词从内存映射的关键词库按编号读取，
+        分类结果只保存每个关键词的路径编号。
+
+        Args:
+            rules_file: 工作流规则文件路径
+            classification_file: 待分类文件路径
+            error_callback: 错误回调函数
+            workflow_tree: 已编译的分类树，指定时不再读取和编译规则文件（批量处理时多个文件共用）
+
+        Returns:
+            {'stage':最大层级,'result':Dict[output_name,{'file_path','classified_sheet_name'}]}
+        """
+        store:Optional[KeywordStore] = None
+        staged_store = False
+        try:
+            self.progress.start_workflow()
+            with self.tracer.span('process_workflow_single_pass','workflow',rules_file=Path(rules_file).name,
+                                  classification_file=Path(classification_file).name) as workflow_args:
+                if workflow_tree is not None:
+                    workflow_rules = workflow_tree.workflow_rules
+                else:
+                    with self.tracer.span('read_workflow_rules','read',file=Path(rules_file).name) as span_args:
+                        workflow_rules = self.excel_handler.read_workflow_rules(rules_file)
+                        span_args['rule_count'] = len(workflow_rules.rules)
+                self.workflow_rules = workflow_rules
+                with self.tracer.span('read_keywords','read',file=Path(classification_file).name) as span_args:
+                    if self.keyword_store or is_keyword_store(classification_file):
+                        store, staged_store = self._open_keyword_store(classification_file, error_callback)
+                        keyword_count = span_args['keyword_count'] = len(store)
+                    else:
+                        unclassified_keywords = self.excel_handler.read_keyword_file(classification_file)
+                        keyword_count = span_args['keyword_count'] = len(unclassified_keywords.data)
+                        if self._single_pass_workers(keyword_count) > 1:
+                            # 多进程分类时关键词放入共享内存，子进程按编号读取，不再pickle关键词列表
+                            store = KeywordStore.build_shared(unclassified_keywords.data)
+                if workflow_tree is None:
+                    with self.tracer.span('compile_workflow','classify',rule_count=len(workflow_rules.rules)):
+                        workflow_tree = self.compile_workflow(workflow_rules, error_callback)
+                with self.tracer.span('classify','classify',level=workflow_tree.max_level,
+                                      keyword_count=keyword_count,rule_count=len(workflow_rules.rules)) as span_args:
+                    if store is not None:
+                        path_ids, path_table = self.classify_keyword_store(store, workflow_tree)
+                        stage1_matched = np.array([path[2] is not None for path in path_table.paths], dtype=bool)
+                        matched_count = int(stage1_matched[path_ids].sum()) if len(path_table) else 0
+                    else:
+                        # 按chunk_size分块下探，分块之间报告进度、检查取消
+                        keywords = unclassified_keywords.data
+                        self.progress.start_stage('single_pass',workflow_tree.max_level,keywords_total=len(keywords))
+                        rows = []
+                        for start in range(0, len(keywords), self.chunk_size):
+                            self.progress.check_cancelled()
+                            chunk = keywords[start:start + self.chunk_size]
+                            rows.extend(workflow_tree.classify_keyword(keyword) for keyword in chunk)
+                            self.progress.advance(keywords=len(chunk),group=f'第{start // self.chunk_size + 1}批')
+                        classified_df = pd.DataFrame(rows, columns=workflow_tree.columns)
+                        matched_count = int(classified_df['阶段1'].notna().sum())
+                    span_args['matched_count'] = matched_count
+                if matched_count == 0:
+                    raise Exception('第一阶段关键词分类结果为空')
+                self.progress.start_stage('save_single_pass',workflow_tree.max_level)
+                with self.tracer.span('save_single_pass','stage',level=workflow_tree.max_level):
+                    if store is not None:
+                        output_files = self.save_keyword_store_results(store, path_ids, path_table, workflow_tree, error_callback)
+                    else:
+                        output_files = self.save_single_pass_results(classified_df, workflow_tree, error_callback)
+                self.process_result_file = {output_name: values['file_path'] for output_name, values in output_files.items()}
+                workflow_args['max_level'] = workflow_tree.max_level
+            self.progress.finish('工作流处理完成')
+            return {'stage':workflow_tree.max_level,'result':output_files}
+        except WorkflowCancelled:
+            logger.info('工作流已取消')
+            raise
+        except Exception as e:
+            err_msg = f'单次遍历处理工作流失败：{e}'
+            if error_callback:
+                error_callback(err_msg)
+            raise Exception(err_msg)
+        finally:
+            if store is not None:
+                store.close()
+                if staged_store:
+                    store.file_path.unlink(missing_ok=True)
+
+    def process_workflow(self, rules_file: Path, classification_file: Path, error_callback=None,
+                         workflow_rules: Optional[models.WorkFlowRules] = None):
         """处理完整工作流
         
         Args:
             rules_file: 工作流规则文件路径
             classification_file: 待分类文件路径
             error_callback: 错误回调函数
+            workflow_rules: 已读取的工作流规则，指定时不再读取规则文件（批量处理时多个文件共用）
             
         Returns:
             生成的文件路径字典
         """
         try:
             result = {}
-            stage = 1
-            # 读取工作流规则
-            workflow_rules = self.excel_handler.read_workflow_rules(rules_file)
-            self.workflow_rules = workflow_rules
-            logger.debug(f'self.workflow_rules: {self.workflow_rules}')    
-            # 读取待分类文件
-            unclassified_keywords = self.excel_handler.read_keyword_file(classification_file)
-            # 处理阶段1：基础分类,将词分类到各xlsx文件中
-            stage1_results = self.process_stage1(unclassified_keywords, workflow_rules, error_callback)
-            
-            # 保存阶段1结果
-            stage1_files = self.save_stage1_results(stage1_results)
-            self.process_result_file = stage1_files
-            result = {'stage':1,'result':stage1_files}
-            stage += 1
-            max_level = workflow_rules.get_max_level()
-            logger.debug(f'max_level: {max_level}')
-            if stage <= max_level:
-                # 处理阶段2：将分类细分到各sheet
-                stage2_results = self.process_stage2(stage1_files, workflow_rules, error_callback)
-                # 保存阶段2结果
-                stage2_files = self.save_stage2_results(stage1_files, stage2_results, error_callback)
-                result = {'stage':2,'result':stage2_files}
-                stage += 1
-                logger.debug(f'当前工作流层级: {stage},max_level: {max_level}')
-            if stage <= max_level:
-                self.process_result_classified_file = self.excel_handler.read_stage_classified_sheet_name(self.process_result_file)
-                logger.debug(f'self.process_result_classified_file:{self.process_result_classified_file}')
-                # 处理阶段3：分类后处理（Sheet3处理）
-                stage3_results = self.process_stage3(stage2_files, workflow_rules, error_callback)
-                
-                stage3_file = self.save_stage3_results(stage2_file=stage2_files,stage3_results=stage3_results,error_callback=error_callback)
-                result = {'stage':3,'result':stage3_file}
-                stage += 1
-                logger.debug(f'当前工作流层级: {stage},max_level: {max_level}')
-            while stage <= max_level:
-                stage_result = self.process_stage_high(stage)
-                stage_save_result = self.save_stage_high_results(stage,stage_result)
-                result = {'stage':stage,'result':stage_save_result}
-                stage += 1
-                logger.debug(f'stage_result:{stage_result}')
-            logger.debug(f'result:{result}')
+            self.progress.start_workflow()
+            with self.tracer.span('process_workflow','workflow',rules_file=Path(rules_file).name,
+                                  classification_file=Path(classification_file).name) as workflow_args:
+                # 读取工作流规则
+                if workflow_rules is None:
+                    with self.tracer.span('read_workflow_rules','read',file=Path(rules_file).name) as span_args:
+                        workflow_rules = self.excel_handler.read_workflow_rules(rules_file)
+                        span_args['rule_count'] = len(workflow_rules.rules)
+                self.workflow_rules = workflow_rules
+                logger.debug('工作流规则数:%d',len(self.workflow_rules.rules))
+                # 处理阶段1：分块读取待分类文件，逐批分类并写入各结果文件
+                with self.tracer.span('process_stage1','stage',level=1):
+                    stage1_files = self.process_stage1_streaming(classification_file, workflow_rules, error_callback)
+                self.process_result_file = stage1_files
+                result = {'stage':1,'result':stage1_files}
+                max_level = workflow_rules.get_max_level()
+                workflow_args['max_level'] = max_level
+                logger.debug('max_level: %d',max_level)
+                if max_level > 1:
+                    # 处理阶段2到阶段N：各输出文件相互独立，并行处理
+                    result = self.process_output_files(stage1_files, workflow_rules, max_level, error_callback)
+                logger.debug('result:%s',result)
+            self.progress.finish('工作流处理完成')
             return result
             
 
+        except WorkflowCancelled:
+            logger.info('工作流已取消')
+            raise
         except Exception as e:
             err_msg = f'处理完整工作流失败：{e}'
             if error_callback:
                 error_callback(err_msg)
             raise Exception(f"处理完整工作流失败：{e}")
+
+
+    def _uses_single_pass(self, classification_file: Path, single_pass: bool) -> bool:
+        return single_pass or self.keyword_store or is_keyword_store(classification_file)
+
+    def process_workflow_batch(self, rules_file: Path, classification_files: List[Path], single_pass: bool = False,
+                               error_callback=None) -> List[Dict[str, Any]]:
+        """批量处理多个待分类文件，规则文件只读取、编译一次，所有文件共用
+
+        每个文件的结果放在output_dir下以其文件名命名的子目录中（只有一个文件时直接放在output_dir）。
+        多个文件且max_workers大于1时按文件并行：子进程启动时编译一次规则，依次处理分配到的文件，
+        文件内不再开进程池；否则在当前进程内依次处理，另外报告每个文件内各阶段的进度。
+        两种方式都在每个文件完成时报告一次batch_files阶段的进度，最后报告done。
+        单个文件失败只记录在该文件的结果中，不影响其他文件；取消时抛出WorkflowCancelled。
+
+        Args:
+            rules_file: 工作流规则文件路径
+            classification_files: 待分类文件路径列表
+            single_pass: 使用单次遍历处理；keyword_store为True或待分类文件为.kwstore关键词库时总是单次遍历
+            error_callback: 错误回调函数
+
+        Returns:
+            按输入顺序每个文件一个字典：keywords、status('ok'/'error')、output_dir、stage和outputs或error、elapsed_seconds
+        """
+        classification_files = [Path(file) for file in classification_files]
+        with self.tracer.span('read_workflow_rules','read',file=Path(rules_file).name) as span_args:
+            workflow_rules = self.excel_handler.read_workflow_rules(rules_file)
+            span_args['rule_count'] = len(workflow_rules.rules)
+        self.workflow_rules = workflow_rules
+        tasks = [
+            {'classification_file':classification_file,'output_dir':output_dir,
+             'single_pass':self._uses_single_pass(classification_file, single_pass)}
+            for classification_file, output_dir in zip(classification_files, batch_output_dirs(self.output_dir, classification_files))
+        ]
+        compile_tree = any(task['single_pass'] for task in tasks)
+        workers = min(self.max_workers or os.cpu_count() or 1, len(tasks))
+        if workers <= 1:
+            workflow_tree = None
+            if compile_tree:
+                with self.tracer.span('compile_workflow','classify',rule_count=len(workflow_rules.rules)):
+                    workflow_tree = self.compile_workflow(workflow_rules, error_callback)
+            entries = []
+            self.progress.start_stage('batch_files',1,groups_total=len(tasks))
+            for task in tasks:
+                self.progress.check_cancelled()
+                processor = WorkFlowProcessor(
+                    excel_handler=ExcelHandler.from_config(self.excel_handler.config(), error_callback),
+                    keyword_classifier=KeywordClassifier(case_sensitive=self.classifier.case_sensitive,
+                                                         separator=self.classifier.separator, error_callback=error_callback),
+                    max_workers=self.max_workers,
+                    output_format=self.output_format,
+                    chunk_size=self.chunk_size,
+                    output_dir=task['output_dir'],
+                    tracer=self.tracer,
+                    cancel_token=self.cancel_token,
+                    keyword_store=self.keyword_store
+                )
+                # 顺序处理时每个文件报告各自阶段的进度
+                processor.progress = ProgressReporter(self.progress.callbacks, self.cancel_token)
+                entries.append(_process_batch_file(processor, rules_file, task, workflow_rules, workflow_tree, error_callback))
+                self.progress.advance(group=task['classification_file'].name)
+            self.progress.finish('批量处理完成')
+            return entries
+
+        # 大文件优先，避免最后只剩一个大文件在单独运行
+        ordered_tasks = sorted(range(len(tasks)), key=lambda index: tasks[index]['classification_file'].stat().st_size, reverse=True)
+        entries: List[Optional[Dict[str, Any]]] = [None] * len(tasks)
+        manager = multiprocessing.Manager() if self.cancel_token is not None else None
+        cancel_event = manager.Event() if manager is not None else None
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker,
+                                       initargs=(workflow_rules, self.classifier.case_sensitive, self.classifier.separator, compile_tree,
+                                                 self.excel_handler.config()))
+        try:
+            futures = {
+                executor.submit(_run_batch_file, {
+                    **tasks[index],
+                    'rules_file':Path(rules_file),
+                    'output_format':self.output_format,
+                    'chunk_size':self.chunk_size,
+                    'keyword_store':self.keyword_store,
+                    'trace':self.tracer.enabled,
+                    'cancel_event':cancel_event,
+                }): index
+                for index in ordered_tasks
+            }
+            self.progress.start_stage('batch_files',1,groups_total=len(futures))
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=0.5 if cancel_event is not None else None, return_when=FIRST_COMPLETED)
+                if self.cancel_token is not None and self.cancel_token.cancelled:
+                    cancel_event.set()
+                    self.progress.check_cancelled()
+                for future in done:
+                    index = futures[future]
+                    try:
+                        entry, trace_events = future.result()
+                    except WorkflowCancelled:
+                        raise
+                    except Exception as e:
+                        # 子进程异常退出等，文件本身的处理错误已记录在entry中
+                        entry, trace_events = {'keywords':str(tasks[index]['classification_file']),
+                                               'output_dir':str(tasks[index]['output_dir']),
+                                               'status':'error','error':str(e)}, []
+                        if error_callback:
+                            error_callback(f"{tasks[index]['classification_file']} 处理失败：{e}")
+                    self.tracer.extend(trace_events)
+                    entries[index] = entry
+                    logger.info('%s 处理完成，状态:%s',entry['keywords'],entry['status'])
+                    self.progress.advance(group=tasks[index]['classification_file'].name)
+        except BaseException:
+            if cancel_event is not None:
+                cancel_event.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+        finally:
+            if manager is not None:
+                manager.shutdown()
+        executor.shutdown(wait=True)
+        self.progress.finish('批量处理完成')
+        return cast(List[Dict[str, Any]], entries)
+
+
+def _run_output_file_chain(task: dict) -> Tuple[dict, Optional[Dict[str, Dict[str, List[str]|str]]], List[Dict[str, Any]]]:
+    """进程池任务：在子进程中对单个输出文件执行阶段2到阶段N的处理链
+
+    Returns:
+        (process_output_files_chain的结果, 子进程的process_result_classified_file, 子进程Tracer记录的区间)
+    """
+    processor = WorkFlowProcessor(
+        excel_handler=ExcelHandler.from_config(task['handler_config']),
+        keyword_classifier=KeywordClassifier(case_sensitive=task['case_sensitive'], separator=task['separator']),
+        max_workers=1,
+        output_format=task['output_format'],
+        output_dir=task['output_dir'],
+        tracer=Tracer(enabled=task['trace']),
+        cancel_token=CancellationToken(task['cancel_event']) if task['cancel_event'] is not None else None
+    )
+    with processor.tracer.span('output_chain','group',output_names=[task['output_name']],max_level=task['max_level']):
+        chain_result = processor.process_output_files_chain(
+            {task['output_name']: task['file_path']}, task['workflow_rules'], task['max_level']
+        )
+    return chain_result, processor.process_result_classified_file, processor.tracer.events
+
+
+def batch_output_dirs(output_dir: Path, classification_files: List[Path]) -> List[Path]:
+    """多个待分类文件时按文件名（去掉全部扩展名）划分子目录，避免同名结果文件互相覆盖"""
+    output_dir = Path(output_dir)
+    if len(classification_files) == 1:
+        return [output_dir]
+    output_dirs = []
+    used_names = set()
+    for classification_file in classification_files:
+        base_name = name = Path(classification_file).name.split('.', 1)[0]
+        index = 1
+        while name in used_names:
+            index += 1
+            name = f'{base_name}_{index}'
+        used_names.add(name)
+        output_dirs.append(output_dir / name)
+    return output_dirs
+
+
+def _result_outputs(processor: WorkFlowProcessor, result: dict) -> Dict[str, Dict[str, List[str]|str]]:
+    """统一为 Dict[output_name,{'file_path':...,'classified_sheet_name':[...]}]"""
+    if processor.process_result_classified_file:
+        return processor.process_result_classified_file
+    outputs = result.get('result')
+    if not isinstance(outputs, dict):
+        return {}
+    return {name: value if isinstance(value, dict) else {'file_path': value} for name, value in outputs.items()}
+
+
+def _process_batch_file(processor: WorkFlowProcessor, rules_file: Path, task: dict, workflow_rules: models.WorkFlowRules,
+                        workflow_tree: Optional[WorkFlowTree], error_callback=None) -> Dict[str, Any]:
+    """用已读取的规则（单次遍历时为已编译的分类树）处理一个待分类文件，处理失败记录在返回的字典中"""
+    started = time.perf_counter()
+    entry: Dict[str, Any] = {'keywords':str(task['classification_file']),'output_dir':str(processor.output_dir)}
+    try:
+        if task['single_pass']:
+            result = processor.process_workflow_single_pass(rules_file, task['classification_file'], error_callback,
+                                                            workflow_tree=workflow_tree)
+        else:
+            result = processor.process_workflow(rules_file, task['classification_file'], error_callback,
+                                                workflow_rules=workflow_rules)
+        entry.update({'status':'ok','stage':result.get('stage'),'outputs':_result_outputs(processor, result)})
+    except WorkflowCancelled:
+        raise
+    except Exception as e:
+        entry.update({'status':'error','error':str(e)})
+    entry['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+    return entry
+
+
+# 批量处理子进程的状态，由_init_batch_worker设置
+_batch_worker_state: Dict[str, Any] = {}
+
+
+def _init_batch_worker(workflow_rules: models.WorkFlowRules, case_sensitive: bool, separator: str, compile_tree: bool,
+                       handler_config: Dict[str, Any]):
+    """子进程启动时编译一次分类树，之后分配到的文件共用；handler_config为ExcelHandler.config()的结果"""
+    classifier = KeywordClassifier(case_sensitive=case_sensitive, separator=separator)
+    _batch_worker_state.update(
+        workflow_rules=workflow_rules,
+        workflow_tree=WorkFlowTree(workflow_rules, classifier) if compile_tree else None,
+        case_sensitive=case_sensitive,
+        separator=separator,
+        handler_config=handler_config,
+    )
+
+
+def _run_batch_file(task: dict) -> tuple[Dict[str, Any], list]:
+    """进程池任务：在子进程中用启动时编译的规则处理一个待分类文件"""
+    state = _batch_worker_state
+    processor = WorkFlowProcessor(
+        excel_handler=ExcelHandler.from_config(state['handler_config']),
+        keyword_classifier=KeywordClassifier(case_sensitive=state['case_sensitive'], separator=state['separator']),
+        max_workers=1,
+        output_format=task['output_format'],
+        chunk_size=task['chunk_size'],
+        output_dir=task['output_dir'],
+        tracer=Tracer(enabled=task['trace']),
+        cancel_token=CancellationToken(task['cancel_event']) if task['cancel_event'] is not None else None,
+        keyword_store=task['keyword_store']
+    )
+    entry = _process_batch_file(processor, task['rules_file'], task, state['workflow_rules'], state['workflow_tree'])
+    return entry, processor.tracer.events
@@ -0,0 +1,253 @@
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from . import models
+from .keyword_classifier import KeywordClassifier
+from .logger_config import logger
+
+__all__ = [
+    'PathTable',
+    'RuleGroup',
+    'WorkFlowTree',
+    'UNMATCHED_NAME',
+    'expand_all_rules',
+    'rule_catalog',
+]
+
+# 未匹配关键词的输出文件名称/sheet名称
+UNMATCHED_NAME = '未匹配关键词'
+# 规则中表示全部输出文件/全部sheet的特殊值
+ALL_NAME = '全'
+
+
+def _clean_rule(text: str) -> str:
+    """与SourceRules一致的规则预处理：清除不可见字符并去除首尾空格"""
+    return models._preprocess_text(str(text)).strip()
+
+
+def rule_catalog(workflow_rules: models.WorkFlowRules) -> Tuple[List[str], Dict[str, List[str]]]:
+    """规则中的输出文件名称（一阶段规则的顺序）和各输出文件的sheet名称（二阶段规则的顺序），用于展开'全'"""
+    level1_rules = workflow_rules.get_rules_by_level(1)
+    if level1_rules is None:
+        raise ValueError('第一阶段关键词分类规则为空')
+    output_names = list(dict.fromkeys(rule.output_name for rule in level1_rules.rules))
+    sheet_names: Dict[str, List[str]] = {}
+    level2_rules = workflow_rules.get_rules_by_level(2)
+    if level2_rules is not None:
+        for output_name in output_names:
+            output_name_rules = level2_rules.filter_rules(output_name=output_name)
+            if output_name_rules is None:
+                continue
+            sheet_names[output_name] = list(dict.fromkeys(
+                rule.classified_sheet_name for rule in output_name_rules.rules if rule.classified_sheet_name
+            ))
+    return output_names, sheet_names
+
+
+def expand_all_rules(rules: List[models.WorkFlowRule], output_names: List[str],
+                     sheet_names: Dict[str, List[str]]) -> List[models.WorkFlowRule]:
+    """按rule_catalog的结果展开'全'，与分步流程一致：普通规则在前，展开后的规则在后"""
+    normal_rules = [rule for rule in rules if rule.output_name != ALL_NAME and rule.classified_sheet_name != ALL_NAME]
+    special_rules = []
+    for rule in rules:
+        if rule.output_name != ALL_NAME and rule.classified_sheet_name != ALL_NAME:
+            continue
+        for output_name in (output_names if rule.output_name == ALL_NAME else [rule.output_name]):
+            if rule.classified_sheet_name == ALL_NAME:
+                rule_sheet_names = sheet_names.get(output_name, [])
+            else:
+                rule_sheet_names = [rule.classified_sheet_name]
+            for sheet_name in rule_sheet_names:
+                special_rules.append(rule.model_copy(update={'output_name': output_name, 'classified_sheet_name': sheet_name}))
+    return normal_rules + special_rules
+
+
+class RuleGroup:
+    """一组按顺序匹配、首条命中即返回的规则，对应分步流程中的一次classify_keywords调用
+
+    args:
+        level:工作流层级
+        parsed_rules:[(规则文本,匹配函数)]，规则文本已预处理、保序去重
+        targets:规则文本 -> 工作流规则，同一规则文本重复出现时以最后一条为准
+    """
+
+    def __init__(self, level: int, rules: List[models.WorkFlowRule], matchers: Dict[str, Callable]):
+        self.level = level
+        self.targets: Dict[str, models.WorkFlowRule] = {}
+        self.parsed_rules: List[Tuple[str, Callable]] = []
+        for rule in rules:
+            rule_text = _clean_rule(rule.rule)
+            if not rule_text:
+                continue
+            if rule_text not in self.targets and rule_text in matchers:
+                self.parsed_rules.append((rule_text, matchers[rule_text]))
+            self.targets[rule_text] = rule
+
+    def __len__(self) -> int:
+        return len(self.parsed_rules)
+
+    def match(self, keyword: str) -> Optional[str]:
+        """返回第一条命中的规则文本，未命中返回None"""
+        for rule_text, rule_matcher in self.parsed_rules:
+            try:
+                if rule_matcher(keyword):
+                    return rule_text
+            except Exception as e:
+                logger.debug("应用规则 '%s' 到关键词 '%s' 时出错: %s", rule_text, keyword, e)
+        return None
+
+
+class PathTable:
+    """分类路径（结果文件名称, 分类sheet名称, 阶段1...阶段N）到整数编号的映射
+
+    不同的分类路径数量只与规则有关，每个关键词只需保存一个路径编号，分组时按编号归并。
+    """
+
+    def __init__(self):
+        self.paths: List[tuple] = []
+        self._ids: Dict[tuple, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def intern(self, path: tuple) -> int:
+        path_id = self._ids.get(path)
+        if path_id is None:
+            path_id = self._ids[path] = len(self.paths)
+            self.paths.append(path)
+        return path_id
+
+
+class WorkFlowTree:
+    """将工作流规则编译为分类树
+
+    一阶段规则 -> 输出文件 -> 二阶段规则 -> sheet -> 三阶段规则 -> 按父规则索引的更高阶段规则，
+    每个关键词沿树一次下探即可得到完整的 阶段1...阶段N 路径。
+
+    规则中'全'的结果文件名称/分类sheet名称按规则文件中声明的输出文件和sheet展开。
+    """
+
+    def __init__(self, workflow_rules: models.WorkFlowRules, classifier: Optional[KeywordClassifier] = None,
+                 error_callback: Optional[Callable] = None):
+        self.workflow_rules = workflow_rules
+        self.max_level = workflow_rules.get_max_level()
+        self.error_callback = error_callback
+        self.parse_errors: List[str] = []
+
+        classifier = classifier or KeywordClassifier(error_callback=error_callback)
+        self.case_sensitive = classifier.case_sensitive
+        self.separator = classifier.separator
+        matchers = self._parse_all_rules(classifier)
+
+        # 一阶段：全部关键词使用同一组规则
+        level1_rules = workflow_rules.get_rules_by_level(1)
+        if level1_rules is None:
+            raise ValueError('第一阶段关键词分类规则为空')
+        self.root = RuleGroup(1, level1_rules.rules, matchers)
+        self.output_names, self.sheet_names = rule_catalog(workflow_rules)
+
+        # 二阶段：按输出文件分组
+        self.output_groups: Dict[str, RuleGroup] = {}
+        level2_rules = workflow_rules.get_rules_by_level(2)
+        if level2_rules is not None:
+            for output_name in self.sheet_names:
+                self.output_groups[output_name] = RuleGroup(2, level2_rules.filter_rules(output_name=output_name).rules, matchers)
+
+        # 三阶段及以上：按 (输出文件, sheet) 或 (输出文件, sheet, 父规则) 分组
+        self.sheet_groups: Dict[int, Dict[Tuple[str, str], RuleGroup]] = {}
+        self.parent_groups: Dict[int, Dict[Tuple[str, str, str], RuleGroup]] = {}
+        for level in range(3, self.max_level + 1):
+            level_rules = workflow_rules.get_rules_by_level(level)
+            if level_rules is None:
+                continue
+            grouped_rules: Dict[tuple, List[models.WorkFlowRule]] = {}
+            for rule in self._expand_rules(level_rules.rules):
+                if level == 3:
+                    key = (rule.output_name, rule.classified_sheet_name)
+                elif rule.parent_rule:
+                    key = (rule.output_name, rule.classified_sheet_name, _clean_rule(rule.parent_rule))
+                else:
+                    continue
+                grouped_rules.setdefault(key, []).append(rule)
+            groups = {key: RuleGroup(level, rules, matchers) for key, rules in grouped_rules.items()}
+            if level == 3:
+                self.sheet_groups[level] = groups
+            else:
+                self.parent_groups[level] = groups
+
+    def _parse_all_rules(self, classifier: KeywordClassifier) -> Dict[str, Callable]:
+        """一次性解析全部规则文本，同一规则文本在多个分组中只解析一次"""
+        rule_texts = [rule.rule for rule in self.workflow_rules.rules]
+        self.parse_errors = classifier.set_rules(
+            models.SourceRules(data=rule_texts, error_callback=self.error_callback),
+            error_callback=self.error_callback
+        )
+        return dict(classifier.parsed_rules)
+
+    def _expand_rules(self, rules: List[models.WorkFlowRule]) -> List[models.WorkFlowRule]:
+        """展开'全'，与分步流程一致：普通规则在前，展开后的规则在后"""
+        return expand_all_rules(rules, self.output_names, self.sheet_names)
+
+    @property
+    def columns(self) -> List[str]:
+        """classify_keywords返回的列"""
+        return ['关键词', '结果文件名称', '分类sheet名称'] + [f'阶段{level}' for level in range(1, self.max_level + 1)]
+
+    def classify_keyword(self, keyword: str) -> tuple:
+        """单个关键词沿分类树下探
+
+        Returns:
+            (关键词, 结果文件名称, 分类sheet名称, 阶段1, ..., 阶段N)，未命中的阶段为None
+        """
+        path: List[Optional[str]] = [None] * self.max_level
+        matched_rule = self.root.match(keyword)
+        if matched_rule is None:
+            return (keyword, UNMATCHED_NAME, None, *path)
+        path[0] = matched_rule
+        output_name = self.root.targets[matched_rule].output_name
+
+        output_group = self.output_groups.get(output_name)
+        if output_group is None:
+            return (keyword, output_name, None, *path)
+        matched_rule = output_group.match(keyword)
+        if matched_rule is None:
+            return (keyword, output_name, UNMATCHED_NAME, *path)
+        path[1] = matched_rule
+        sheet_name = output_group.targets[matched_rule].classified_sheet_name
+
+        for level in range(3, self.max_level + 1):
+            if level == 3:
+                group = self.sheet_groups.get(3, {}).get((output_name, sheet_name))
+            else:
+                group = self.parent_groups.get(level, {}).get((output_name, sheet_name, path[level - 2]))
+            if group is None:
+                break
+            matched_rule = group.match(keyword)
+            if matched_rule is None:
+                break
+            path[level - 1] = matched_rule
+        return (keyword, output_name, sheet_name, *path)
+
+    def classify_text(self, keyword: str) -> tuple:
+        """与UnclassifiedKeywords一致地清除不可见字符和首尾空格后分类，空关键词不分类，各阶段为None
+
+        不去重，每个输入对应一个结果，用于逐条分类的接口（管道、asyncio）
+        """
+        cleaned = models._preprocess_text(keyword).strip()
+        if not cleaned:
+            return (cleaned,) + (None,) * (len(self.columns) - 1)
+        return self.classify_keyword(cleaned)
+
+    def classify_keywords(self, keywords: models.UnclassifiedKeywords) -> pd.DataFrame:
+        """一次遍历得到全部关键词的完整分类路径
+
+        Returns:
+            pd.DataFrame: 列为 关键词、结果文件名称、分类sheet名称、阶段1...阶段N
+        """
+        return pd.DataFrame([self.classify_keyword(keyword) for keyword in keywords.data], columns=self.columns)
+
+    def classify_path_ids(self, keywords: Iterable[str], path_table: PathTable) -> List[int]:
+        """分类并返回每个关键词的路径编号，路径为classify_keyword的结果去掉关键词"""
+        intern = path_table.intern
+        return [intern(self.classify_keyword(keyword)[1:]) for keyword in keywords]
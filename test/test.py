@@ -51,6 +51,98 @@ class Test:
         processor = WorkFlowProcessor()
         result = processor.process_workflow(self.work_flowr_file,self.keyword_file)
         return result
+
+    def test_workflow_single_pass(self):
+        processor = WorkFlowProcessor()
+        result = processor.process_workflow_single_pass(self.work_flowr_file,self.keyword_file)
+        return result
+
+    def test_workflow_keyword_store(self):
+        processor = WorkFlowProcessor(keyword_store=True)
+        result = processor.process_workflow_single_pass(self.work_flowr_file,self.keyword_file)
+        return result
+
+    def test_plan_workflow(self):
+        processor = WorkFlowProcessor()
+        plan = processor.plan_workflow(self.work_flowr_file,self.keyword_file)
+        for group in plan.groups:
+            print(f'level:{group.level},output_name:{group.output_name},classified_sheet_name:{group.classified_sheet_name},'
+                  f'keyword_count:{group.keyword_count},rule_count:{group.rule_count},estimated_seconds:{group.estimated_seconds:.2f}')
+        print(f'estimated_seconds:{plan.estimated_seconds:.2f},oversized_groups:{plan.oversized_groups}')
+        return plan
+
+    def test_service(self):
+        import json
+        import threading
+        import urllib.error
+        import urllib.request
+        from src.kw_cf.service import create_server
+        server = create_server(self.work_flowr_file, port=0, reload_interval=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            keywords = self.excel_handler.read_keywords(self.keyword_file)[:100]
+            request = urllib.request.Request(f'{server.url}/classify', data=json.dumps({'keywords': keywords}).encode('utf-8'),
+                                             headers={'Content-Type': 'application/json'})
+            result = json.load(urllib.request.urlopen(request))
+            for row in result['results']:
+                print(row)
+            request = urllib.request.Request(f'{server.url}/classify', data=json.dumps({'keywords': ['北京', None]}).encode('utf-8'),
+                                             headers={'Content-Type': 'application/json'})
+            try:
+                urllib.request.urlopen(request)
+                raise AssertionError('null关键词应返回400')
+            except urllib.error.HTTPError as e:
+                assert e.code == 400, e.code
+                print(json.load(e))
+            return result
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_async_classify(self):
+        import asyncio
+        from src.kw_cf.aio import AsyncClassifier
+
+        async def classify():
+            keywords = self.excel_handler.read_keywords(self.keyword_file)
+            async with await AsyncClassifier.create(self.work_flowr_file, max_concurrency=2) as classifier:
+                return await classifier.classify_batch(keywords)
+
+        result = asyncio.run(classify())
+        print(f'classified:{len(result)}')
+        return result
+
+    def test_async_classify_batch_size(self):
+        import asyncio
+        from src.kw_cf.aio import AsyncClassifier
+
+        async def classify(batch_size):
+            async with await AsyncClassifier.create(self.work_flowr_file, batch_size=batch_size) as classifier:
+                return await classifier.classify_batch(keywords)
+
+        keywords = ['a','a','a','a','',' ',None]
+        for batch_size in (1, 2, 1000):
+            result = asyncio.run(classify(batch_size))
+            assert len(result) == len(keywords), f'batch_size:{batch_size},rows:{len(result)}'
+            assert [row['关键词'] for row in result] == ['a','a','a','a','','','']
+        return result
+
+    def test_stream_classify(self):
+        from src.kw_cf.stream import LineClassifier
+        from src.kw_cf.workflow_tree import WorkFlowTree
+        tree = WorkFlowTree(self.excel_handler.read_workflow_rules(self.work_flowr_file), self.keyword_classifier)
+        lines = [f'{keyword}\n' for keyword in self.excel_handler.read_keywords(self.keyword_file)]
+        line_classifier = LineClassifier(tree)
+        for output in line_classifier.classify_lines(lines):
+            print(''.join(output), end='')
+        return line_classifier
+
+    def test_workflow_batch(self):
+        processor = WorkFlowProcessor(output_dir=self.output_dir)
+        entries = processor.process_workflow_batch(self.work_flowr_file,[self.keyword_file,self.keyword_file],single_pass=True)
+        for entry in entries:
+            print(f"keywords:{entry['keywords']},status:{entry['status']},output_dir:{entry['output_dir']},elapsed_seconds:{entry['elapsed_seconds']}")
+        return entries
     
 
 def main():